@@ -19,10 +19,8 @@ import time
 import datetime
 from datetime import date
 import subprocess
-import shlex
 import re
 import configparser
-import shutil
 
 from PySide2.QtCore import *
 from PySide2.QtGui import *
@@ -37,13 +35,25 @@ from threading import Thread, Timer
 import logging
 import os
 from typing import Optional
-import qrcode
-from PIL import Image
+import functools
 
 from utils.network_interface_priority import *
 from utils.device_runner import DeviceRunner
 from utils.getIP import CreateIpAddress
 from utils.handle_recover import HandleRecoverDevices
+from utils.device_registry import DeviceRegistry
+from utils.running_devices import RunningDeviceRegistry
+from utils.identity_allocator import IdentityAllocator
+from utils.atomic_file import AtomicFile
+from utils.app_config import AppConfig
+from utils.interface_state import InterfaceStateCache
+from utils.rpc_port_allocator import RpcPortAllocator
+from utils.traffic_capture import TrafficCapture
+from utils.mdns_browser import MdnsBrowser
+from utils.fleet_provisioner import FleetManifest, FleetProvisioner
+from utils.onboarding_sheet import OnboardingSheet
+from utils.log_retention import LogRetentionService
+from utils.storage_consistency import StorageConsistencyChecker
 from constants import *
 
 # Import lighting device types
@@ -74,7 +84,8 @@ from device_types_ui.HVAC.fan import Fan
 from device_types_ui.HVAC.thermostat import Thermostat
 from device_types_ui.HVAC.heating_cooling_unit import HeatingCooling
 from device_types_ui.HVAC.air_purifier import AirPurifier
-from credentials.development.gen_dac_cert import GenDacTool
+from credentials.development.gen_dac_cert import GenDacTool, vid as DAC_VID
+from credentials.development.dac_cache import DacCache
 
 from device_types_ui.appliances.laundry_washer import LaundryWasher
 from device_types_ui.appliances.room_air_conditioner import RoomAirConditioner
@@ -88,8 +99,6 @@ from setup_payload.generate_setup_payload import CommissioningFlow, SetupPayload
 
 SOURCE_PATH = os.path.dirname(os.path.realpath(__file__))
 RESOURCE_PATH = os.path.join(SOURCE_PATH, "res/")
-CONFIG_FILE_PATH = os.path.join(SOURCE_PATH, CONFIG_FILE)
-DEVICE_LIST_PATH = os.path.join(SOURCE_PATH, "res/config/deviceList.dat")
 NETWORK_INFO_PATH = SOURCE_PATH + LOG_PATH
 
 
@@ -172,6 +181,47 @@ class Worker(QThread):
         self.wait()
 
 
+class DacJobSignals(QObject):
+    """
+    DacJobSignals class definition for the signals of a DacJob.
+    """
+    progress = Signal(str, int)
+    finished = Signal(str, bool)
+
+
+class DacJob(QRunnable):
+    """
+    DacJob class definition for creating the DAC files of a device in the
+    DAC thread pool.
+    """
+
+    def __init__(self, targetid):
+        """
+        Initialize a DacJob instance.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+        """
+        super().__init__()
+        self.targetId = targetid
+        self.signals = DacJobSignals()
+
+    def run(self):
+        """
+        Create the DAC files and emit finished(target id, is done).
+        """
+        self.signals.progress.emit(self.targetId, STT_DAC_GENERATE_STARTING)
+        startTime = time.perf_counter()
+        try:
+            is_gen_dac_done = GenDacTool(self.targetId).gen_dac_cert()
+        except SystemExit:
+            # GenDacTool exits when chip-cert reports an error
+            is_gen_dac_done = False
+        logging.info("DAC of {} done: {} after {:.2f} seconds".format(
+            self.targetId, is_gen_dac_done, time.perf_counter() - startTime))
+        self.signals.finished.emit(self.targetId, is_gen_dac_done)
+
+
 class ULongValidator(QValidator):
     """
     ULongValidator class definition for validating the input data
@@ -224,6 +274,9 @@ class MainWindow(QMainWindow):
     list_tab = []
     list_status_device = []
 
+    # Shared by all tabs, several devices can get their DAC at the same time
+    dac_pool = None
+
     def __init__(self):
         """
         Initialize a MainWindow instance.
@@ -244,6 +297,7 @@ class MainWindow(QMainWindow):
 
         # get IP
         self.ip_value = None
+        self.is_paused = False
         self.ipv4 = ""
         self.ipv6 = ""
         self.targetId = ""
@@ -259,6 +313,7 @@ class MainWindow(QMainWindow):
         self.today = date.today()
         self.handle_recover_devices = HandleRecoverDevices()
         self.payloads = SetupPayload()
+        self.dac_job = None
 
         # Bind event
         self.resizeEvent = self.on_resize_event
@@ -387,8 +442,11 @@ class MainWindow(QMainWindow):
         self.ui.txt_serial_number.setText(str(self.generate_serial_number()))
         self.ui.txt_vendorid.setText(settings.value("txt_vendorid", "65521"))
         self.ui.txt_productid.setText(settings.value("txt_productid", "32788"))
-        self.ui.txt_discriminator.setText(settings.value("txt_discriminator", "3840"))
-        self.ui.txt_pincode.setText(settings.value("txt_pincode", "20202021"))
+        discriminator, pincode = self.allocate_identity(
+            settings.value("txt_discriminator", "3840"),
+            settings.value("txt_pincode", "20202021"))
+        self.ui.txt_discriminator.setText(str(discriminator))
+        self.ui.txt_pincode.setText(str(pincode))
 
         # Accept number only
         validator = ULongValidator(MAX_SERIAL_NUMBER)
@@ -410,17 +468,53 @@ class MainWindow(QMainWindow):
             "Please select device type for commissioning.",
             BLACK)
 
+    def allocate_identity(self, discriminator, pincode):
+        """
+        Return a discriminator and a pin code no other tab or stored device
+        uses, the given ones when they are free.
+
+        Arguments:
+            discriminator {str} -- the preferred discriminator
+            pincode {str} -- the preferred pin code
+        """
+        self.identity_owner = "tab-{}".format(id(self))
+        try:
+            return IdentityAllocator.allocate(
+                self.identity_owner, int(discriminator), int(pincode))
+        except (OSError, ValueError, KeyError) as err:
+            logging.warning("Can't allocate discriminator and pin code: " + str(err))
+            return discriminator, pincode
+
+    def reserve_identity(self):
+        """
+        Move the discriminator and pin code of the tab to its device.
+        """
+        IdentityAllocator.release(self.identity_owner)
+        try:
+            shared = IdentityAllocator.reserve(
+                self.targetId, int(self.ui.txt_discriminator.text()),
+                int(self.ui.txt_pincode.text()))
+        except (OSError, ValueError, KeyError) as err:
+            logging.warning("Can't reserve discriminator and pin code: " + str(err))
+            return
+        if shared:
+            logging.warning("{} shares its discriminator or pin code with {}".format(
+                self.targetId, ", ".join(shared)))
+
     def generate_serial_number(self):
+        """
+        Return the next serial number which is not used by a running device.
+        """
         settings = QSettings("LGE.HE.TSC", "MatterIoTEmulator")
-        list_running_device = [device.split('-')[-1] for device in self.get_list_device_from_file()]
-        temp_serial = int(settings.value("txt_serial_number", "2021")) + 1
-        if temp_serial > MAX_SERIAL_NUMBER:
-            temp_serial = 1
+        temp_serial = int(settings.value("txt_serial_number", "2021"))
+        while True:
+            temp_serial += 1
+            if temp_serial > MAX_SERIAL_NUMBER:
+                temp_serial = 1
+            if not RunningDeviceRegistry.has_serial(temp_serial):
+                break
         settings.setValue("txt_serial_number", temp_serial)
-        if hex(temp_serial)[2:] not in list_running_device:
-            return temp_serial
-        else:
-            return self.generate_serial_number()
+        return temp_serial
 
     def update_settings(self):
         """
@@ -578,6 +672,24 @@ class MainWindow(QMainWindow):
                 RED,
                 "Please stop and start the device again",
                 BLACK)
+        elif connect_status == STT_UPLINK_DOWN:
+            self.update_status(
+                "Network interface is down.",
+                RED,
+                "Device advertisement is paused",
+                BLACK)
+        elif connect_status == STT_UPLINK_RESTORED:
+            self.update_status(
+                "Network interface is up.",
+                GREEN,
+                "Device advertisement is resumed",
+                BLACK)
+        elif connect_status == STT_UPLINK_MOVED:
+            self.update_status(
+                "Network interface was changed.",
+                RED,
+                "Please stop and start the device again",
+                BLACK)
         elif connect_status == STT_RECOVER_FAIL:
             self.update_status(
                 "IP of this recover device was be used",
@@ -750,36 +862,11 @@ class MainWindow(QMainWindow):
         targetId = VID_PID_Str + '-' + serialNumberStr
         return targetId
 
-    def get_list_device_from_file(self):
-        """
-        Return a list device which is save from a file.
-        """
-        listDevices = []
-        try:
-            file = open(DEVICE_LIST_PATH, "r")
-            listDevices = file.read().split(':')
-            file.close()
-            return listDevices
-        except OSError as err:
-            logging.error(
-                "Fail to open file to get device list: {}".format(err))
-            return listDevices
-
     def remove_targetId(self):
         """
         Remove a device which has a targetid from list devices.
         """
-        listDevices = self.get_list_device_from_file()
-        if self.targetId in listDevices:
-            listDevices.remove(self.targetId)
-            deviceList = ":".join(listDevices)
-            try:
-                fileListDevice = open(DEVICE_LIST_PATH, "w+")
-                fileListDevice.write(deviceList)
-                fileListDevice.close()
-            except OSError as err:
-                logging.error(
-                    "Fail to write device list to file: {}".format(err))
+        RunningDeviceRegistry.remove(self.targetId)
 
     def check_recover_device(self):
         """
@@ -800,16 +887,8 @@ class MainWindow(QMainWindow):
             True: if the device has targetid is existed in list devices
             False: if the device has targetid is not existed in list devices
         """
-        listDevices = self.get_list_device_from_file()
         self.targetId = self.generate_targetId()
-        if len(listDevices) == 0:
-            return True
-        elif (len(listDevices) >= 1) and (listDevices[0] == ''):
-            return True
-        if self.targetId in listDevices:
-            return False
-        else:
-            return True
+        return not RunningDeviceRegistry.contains(self.targetId)
 
     def permit_edit_text(self, isEnable):
         """
@@ -864,7 +943,7 @@ class MainWindow(QMainWindow):
             if (item.get("family") == IP_VERSION4 and
                 item.get("prefixlen") == IP_VERSION4_PREFIXLEN and
                 item.get("scope") == IP_VERSION4_SCOPE and
-                item.get("label") == NETWORK_IF_NAME and
+                item.get("label") == get_network_if_name() and
                     item.get("secondary") != True):
                 ip_ver4 = item['local']
                 logging.info(f"ip_ver4: {ip_ver4}")
@@ -908,8 +987,9 @@ class MainWindow(QMainWindow):
         """
         Return Ip address (ipv4, ipv6) from network config.
         """
+        network_if_name = get_network_if_name()
         logging.info(
-            f"---------------- start load_network_config() -----------Network Interface: {NETWORK_IF_NAME}")
+            f"---------------- start load_network_config() -----------Network Interface: {network_if_name}")
         ip_json = self.load_network_configFromFile()
 
         inet, inet6 = self.get_IPaddresses(ip_json)
@@ -918,24 +998,21 @@ class MainWindow(QMainWindow):
             ipv4_format = inet + "/" + str(IP_VERSION4_PREFIXLEN)
             ipv6_format = inet6 + "/" + str(IP_VERSION6_PREFIXLEN)
 
-            ip_show_cmd = f"ip addr show {NETWORK_IF_NAME}"
-            out_utf8, err_utf8 = self.execute_cmd(ip_show_cmd)
-
-            if err_utf8 != "":
-                logging.error(err_utf8)
-                # sys.exit(1)
-            if out_utf8 != "":
-                if (out_utf8.find(ipv6_format)) == -1:
-                    ipv6_add_cmd = "sudo ip -6 addr add " + ipv6_format + " dev " + NETWORK_IF_NAME
-                    self.execute_cmd(ipv6_add_cmd)
-                    time.sleep(1)
-                elif (out_utf8.find(ipv4_format)) == -1:
-                    ipv4_add_cmd = "sudo ip addr add " + ipv4_format + " dev " + NETWORK_IF_NAME
-                    self.execute_cmd(ipv4_add_cmd)
-                    time.sleep(1)
-                else:
-                    logging.info(
-                        "The primary IP ver4 and ver6 addresses exist. ")
+            if (InterfaceStateCache.get_interface(network_if_name) is None):
+                logging.error(f"Interface {network_if_name} does not exist")
+            elif (not InterfaceStateCache.has_address(network_if_name, inet6, IP_VERSION6_PREFIXLEN)):
+                ipv6_add_cmd = "sudo ip -6 addr add " + ipv6_format + " dev " + network_if_name
+                self.execute_cmd(ipv6_add_cmd)
+                InterfaceStateCache.invalidate()
+                time.sleep(1)
+            elif (not InterfaceStateCache.has_address(network_if_name, inet, IP_VERSION4_PREFIXLEN)):
+                ipv4_add_cmd = "sudo ip addr add " + ipv4_format + " dev " + network_if_name
+                self.execute_cmd(ipv4_add_cmd)
+                InterfaceStateCache.invalidate()
+                time.sleep(1)
+            else:
+                logging.info(
+                    "The primary IP ver4 and ver6 addresses exist. ")
         else:
             logging.info("Skip recover routine.")
         return inet, inet6
@@ -963,17 +1040,9 @@ class MainWindow(QMainWindow):
                     self.time_start = time.strftime("%H-%M-%S", timer)
 
                     can_start_device = self.check_duplicate_device()
+                    self.reserve_identity()
                     self.check_recover_device()
                     self.notify_device_started()
-                    # Update SN config file
-                    self.update_payload_file(
-                        SOURCE_PATH +
-                        self.read_config()['qrtool_subpath'] +
-                        "payload.txt",
-                        self.ui.txt_vendorid.text(),
-                        self.ui.txt_productid.text(),
-                        self.ui.txt_pincode.text(),
-                        self.ui.txt_discriminator.text())
                     self.create_qrcode()
 
                     if (not os.path.exists(SOURCE_PATH + TEMP_PATH + self.targetId)):
@@ -991,15 +1060,11 @@ class MainWindow(QMainWindow):
                         # update factory config file
                         self.update_factory_config_file()
 
-                    # Generate DAC
-                    gen_dac_tool = GenDacTool(self.targetId)
-                    is_gen_dac_done = gen_dac_tool.gen_dac_cert()
                     if can_start_device:
-                        if is_gen_dac_done:
-                            self.permit_edit_text(False)
-                            self.start_device()
-                        else:
-                            self.wkr.connect_status.emit(STT_DAC_GENERATE_FAIL)
+                        # Generate DAC, start_device() when it is done
+                        self.permit_edit_text(False)
+                        self.ui.btn_start_device.setEnabled(False)
+                        self.generate_dac_async()
                     else:
                         self.wkr.connect_status.emit(STT_DEVICE_DUPLICATE)
                 else:
@@ -1016,6 +1081,48 @@ class MainWindow(QMainWindow):
             msgBox.setStandardButtons(QMessageBox.Ok)
             msgBox.exec_()
 
+    def generate_dac_async(self):
+        """
+        Create the DAC files of the device in the DAC thread pool.
+        """
+        if MainWindow.dac_pool is None:
+            MainWindow.dac_pool = QThreadPool()
+            MainWindow.dac_pool.setMaxThreadCount(DAC_WORKERS)
+        # Keep a reference, the signals must live until finished is emitted
+        self.dac_job = DacJob(self.targetId)
+        self.dac_job.signals.progress.connect(self.on_dac_progress)
+        self.dac_job.signals.finished.connect(self.on_dac_finished)
+        MainWindow.dac_pool.start(self.dac_job)
+
+    def on_dac_progress(self, targetid, connect_status):
+        """
+        Show the progress of a DAC job.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+            connect_status {int} -- the STT_DAC_* status
+        """
+        if targetid == self.targetId:
+            self.update_connect_status(connect_status)
+
+    def on_dac_finished(self, targetid, is_gen_dac_done):
+        """
+        Start the device when its DAC files are created.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+            is_gen_dac_done {bool} -- True if the DAC files were created
+        """
+        self.ui.btn_start_device.setEnabled(True)
+        self.dac_job = None
+        if targetid != self.targetId:
+            return
+        if is_gen_dac_done:
+            self.start_device()
+        else:
+            self.permit_edit_text(True)
+            self.wkr.connect_status.emit(STT_DAC_GENERATE_FAIL)
+
     def start_device(self):
         """
         Handle start device.
@@ -1045,6 +1152,8 @@ class MainWindow(QMainWindow):
             self.permit_edit_text(True)
             self.ip_value.removeIpAfterStopDevice()
             self.ip_value.releaseRpcPort(self.rpcPort)
+            TrafficCapture.unregister_device(self.targetId)
+            MdnsBrowser.forget_device(self.targetId)
             self.remove_targetId()
             self.stop_thread()
             if self.connected_device:
@@ -1054,6 +1163,41 @@ class MainWindow(QMainWindow):
             if self.isIPBindFail:
                 self.isIPBindFail = False
 
+    def pause_advertisement(self):
+        """
+        Suspend the running device while the uplink is down.
+        """
+        if (self._runner is not None) and (not self.is_paused):
+            logging.info(f"Pause device {self.targetId}")
+            self._runner.pause()
+            self.is_paused = True
+            self.wkr.connect_status.emit(STT_UPLINK_DOWN)
+
+    def resume_advertisement(self, network_if_name):
+        """
+        Continue the device suspended by pause_advertisement() once its
+        interface is up again, or move its addresses first if the uplink
+        failed over to another interface.
+
+        Arguments:
+            network_if_name {str} -- the interface which is up now
+        """
+        if (self._runner is None) or (self.ip_value is None):
+            return
+        if ((network_if_name != self.ip_value.network_if_name) and
+                (not check_interface_up(self.ip_value.network_if_name))):
+            if (not UPLINK_REHOME_ADDRESSES):
+                self.pause_advertisement()
+                self.wkr.connect_status.emit(STT_UPLINK_MOVED)
+                return
+            self.ip_value.rehome(network_if_name)
+            self.interfaceName = self.ip_value.interface
+        if self.is_paused:
+            logging.info(f"Resume device {self.targetId} on {network_if_name}")
+            self._runner.resume()
+            self.is_paused = False
+            self.wkr.connect_status.emit(STT_UPLINK_RESTORED)
+
     def start_device_running_thread(self):
         """
         Starting device_running thread.
@@ -1083,6 +1227,9 @@ class MainWindow(QMainWindow):
             Exception: if can not stop thread
         """
         logging.debug("Stop thread")
+        if self.is_paused and self._runner is not None:
+            self._runner.resume()
+        self.is_paused = False
         self.ui.btn_start_device.setText("Start Device")
         self.ui.btn_start_device.setIcon(
             QIcon(RESOURCE_PATH + "/icons/start_icon.png"))
@@ -1146,6 +1293,20 @@ class MainWindow(QMainWindow):
             self.is_recover,
             self.ui.txt_vendorid.text(),
             self.unique_id)
+        DeviceRegistry.upsert(self.targetId, {
+            'product-id': self.ui.txt_productid.text(),
+            'serial-num': self.ui.txt_serial_number.text(),
+            'discriminator': self.ui.txt_discriminator.text(),
+            'pin-code': self.ui.txt_pincode.text(),
+            'device-type': self.ui.cbb_device_selection.currentText(),
+            'create-time': self.create_time,
+            'ipv4': self.ipv4,
+            'ipv6': self.ipv6,
+            'rpc-port': self.rpcPort,
+            'interface_index': self.interface_index,
+            'is_recover': self.is_recover,
+            'vendor-id': self.ui.txt_vendorid.text(),
+            'unique-id': self.unique_id or ""})
 
     def re_gennerate_qr(self):
         """
@@ -1158,16 +1319,14 @@ class MainWindow(QMainWindow):
 
     def create_rpc_port(self, rpc_port):
         """
-        Return Rpc port number.
+        Return Rpc port number reserved for this device.
 
         Arguments:
             rpc_port {int} -- a start port number
+        Return:
+            The port number, or None if there is no free port
         """
-        if (rpc_port not in HandleRecoverDevices.list_recover_rpc_port):
-            return rpc_port
-        else:
-            rpc_port = rpc_port + 1
-            return self.create_rpc_port(rpc_port)
+        return RpcPortAllocator.allocate(self.targetId, rpc_port)
 
     def device_running(self):
         """
@@ -1190,7 +1349,13 @@ class MainWindow(QMainWindow):
         # create rpc port if rpc port value is default
         if (self.rpcPort == self.rpc_port_default):
             rpc_port = self.rpc_port_default + 1
-            self.rpcPort = self.create_rpc_port(rpc_port)
+            rpc_port = self.create_rpc_port(rpc_port)
+            if rpc_port is None:
+                self.wkr.connect_status.emit(STT_RPC_INIT_FAIL)
+                return
+            self.rpcPort = rpc_port
+        else:
+            RpcPortAllocator.reserve(self.targetId, int(self.rpcPort))
 
         self.wkr.connect_status.emit(STT_IP_GENERATED)
         time.sleep(1)
@@ -1201,6 +1366,7 @@ class MainWindow(QMainWindow):
         self.wkr.connect_status.emit(STT_DEVICE_STARTING)
         cmd = self.get_running_app_command()
         if cmd is not None:
+            TrafficCapture.register_device(self.targetId, [self.ipv4, self.ipv6])
             self._runner = DeviceRunner(cmd)
             self._runner.execute()
             self.load_network_config()
@@ -1228,10 +1394,15 @@ class MainWindow(QMainWindow):
 
                     elif ((FLAG_DEVICE_STARTED in line) and (not self.isDeviceStarted)):
                         self.isDeviceStarted = True
+                        MdnsBrowser.mark_started(
+                            self.targetId, self.ui.txt_discriminator.text(),
+                            self.ui.cbb_device_selection.currentText(),
+                            [self.ipv4, self.ipv6])
                         if self.check_recover:
                             # If recovering, do not gen qr code
                             if (len(list_status_device) > 0):
                                 list_status_device.remove(1)
+                            MdnsBrowser.mark_connected(self.targetId)
                             time.sleep(3)
                             self.wkr.connect_status.emit(STT_CONNECTED)
                             self.save_deviceConnect(
@@ -1250,6 +1421,7 @@ class MainWindow(QMainWindow):
                         self.wkr.connect_status.emit(STT_CONNECTING)
                     # TODO : Waiting pairing status of virtual device
                     elif (FLAG_CONNECTED in line) and (not self.connected_device):
+                        MdnsBrowser.mark_connected(self.targetId)
                         self.wkr.connect_status.emit(STT_CONNECTED)
                         self.save_deviceConnect(
                             self.ui.cbb_device_selection.currentText())
@@ -1301,7 +1473,9 @@ class MainWindow(QMainWindow):
         file_path = SOURCE_PATH + self.path_log
         with open(file_path, 'a', encoding='utf8') as file:
             file.write(line + "\n")
-            file.close()
+            is_full = file.tell() >= LOG_SEGMENT_MAX_BYTES
+        if is_full:
+            LogRetentionService.rotate(file_path)
 
     def get_running_app_command(self):
         """
@@ -1328,34 +1502,6 @@ class MainWindow(QMainWindow):
             logging.warning("Can't get running app command")
             return None
 
-    def update_payload_file(
-            self,
-            file_path,
-            vendor_id,
-            product_id,
-            setup_code,
-            discriminator):
-        """
-        Update payload file.
-
-        Raises:
-            Exception: if can not open file for updating
-        """
-        try:
-            with open(file_path, 'w+') as file:
-                line_1 = "version 0\n"
-                line_2 = "vendorID {}\n".format(vendor_id)
-                line_3 = "productID {}\n".format(product_id)
-                line_4 = "commissioningFlow 0\n"
-                line_5 = "rendezVousInformation 6\n"
-                line_6 = "setUpPINCode {}\n".format(setup_code)
-                line_7 = "discriminator {}".format(discriminator)
-                file.writelines(
-                    [line_1, line_2, line_3, line_4, line_5, line_6, line_7])
-                file.close()
-        except Exception as e:
-            logging.error("Failed to update payload file: " + str(e))
-
     def create_qrcode(self):
         """
         Handle creating a qrcode.
@@ -1381,7 +1527,7 @@ class MainWindow(QMainWindow):
         if (self.ui.btn_start_device.text() == "Start Device") and (onboarding_payload == "") and (manual_pairing_code == ""):
             self.destroy_timer_qr()
             return
-        pix = QPixmap(self.generate_qr_image(onboarding_payload))
+        pix = QPixmap.fromImage(self.generate_qr_image(onboarding_payload))
         ratio = 1
         pix.setDevicePixelRatio(ratio)
         self.ui.lbl_qr_image.show()
@@ -1393,35 +1539,36 @@ class MainWindow(QMainWindow):
 
     def generate_qr_image(self, qr_payload):
         """
-        Handle generating a qr image.
+        Return the QR code image of a payload, an empty image on error.
 
-        Raises:
-            Exception: if can not generate qr image from payload
+        Arguments:
+            qr_payload {str} -- the QR code payload "MT:..."
         """
         try:
-            # instance QR code
-            qr_instance = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4
-            )
-
-            # QR code add data
-            qr_instance.add_data(self.qrcode)
-            qr_instance.make(fit=True)
-
-            # Convert the QR code to an png image
-            qr_img = qr_instance.make_image(fill="black", back_color="white")
-
-            # Save qr code image to path
-            img_path = SOURCE_PATH + "/setup_payload/qrcode.png"
-            qr_img.save(img_path)
-            logging.info("Generate QR code image success")
-            return img_path
+            return MainWindow.render_qr_image(qr_payload)
         except Exception as ex:
             logging.warning("Can't generate qr image from payload: " + str(ex))
-            return None
+            return QImage()
+
+    @staticmethod
+    @functools.lru_cache(maxsize=QR_IMAGE_CACHE_SIZE)
+    def render_qr_image(qr_payload):
+        """
+        Render a QR code in memory. The result is cached by payload and
+        shared, it must not be modified.
+
+        Arguments:
+            qr_payload {str} -- the QR code payload "MT:..."
+        Return:
+            The QImage, 10 pixels per module with a 4 module border
+        """
+        # One gray byte per module, black when set
+        matrix = OnboardingSheet.get_matrix(qr_payload)
+        size = len(matrix)
+        data = bytes(0 if module else 255 for row in matrix for module in row)
+        image = QImage(data, size, size, size, QImage.Format_Grayscale8).copy()
+        return image.scaled(size * QR_IMAGE_BOX_SIZE, size * QR_IMAGE_BOX_SIZE,
+                            Qt.IgnoreAspectRatio, Qt.FastTransformation)
 
     def get_app_version(self):
         """
@@ -1495,10 +1642,7 @@ class MainWindow(QMainWindow):
         Raises:
             Exception: if can not open config file
         """
-        f = open(CONFIG_FILE_PATH)
-        configs = json.load(f)
-        f.close()
-        return configs
+        return AppConfig.get()
 
     def config_logging(self, logging_mode=TEST_MODE):
         """
@@ -1530,12 +1674,7 @@ class MainWindow(QMainWindow):
         try:
             logging.info("Device name: {}".format(name_device))
             value = name_device.split("(")[1][:-1]
-            device_info = self.read_config()['device_types']
-            result = ""
-            for i in device_info:
-                if i.get('device_id') == value:
-                    result = i
-            return result
+            return AppConfig.get_device_type(value)
         except Exception as e:
             logging.warning("Can't read device Info: " + str(e))
             return None
@@ -1738,19 +1877,11 @@ class MainWindow(QMainWindow):
         try:
             patter = '[\\dx]+'
             value = re.findall(patter, name_device)[-1]
-            with open(CONFIG_FILE, 'r+') as f:
-                data = json.load(f)
-                for device_type in data.get('device_types'):
-                    if device_type.get('device_id') == value:
-                        config_info = device_type['config_info']
-                        config_info['vendor_id'] = vendor
-                        config_info['product_id'] = product
-                        config_info['discriminator'] = discriminator
-                        config_info['pin_code'] = pincode
-                        f.seek(0)
-                        break
-                json.dump(data, f, indent=4)
-                f.truncate()
+            AppConfig.update_device_config_info(value, {
+                'vendor_id': vendor,
+                'product_id': product,
+                'discriminator': discriminator,
+                'pin_code': pincode})
         except Exception as e:
             logging.error("Failed to update payload file: " + str(e))
 
@@ -1771,6 +1902,7 @@ class MainWindow(QMainWindow):
         self.is_recover = False
         # Remove storage folder
         self.handle_recover_devices.remove_storage_folder(self.targetId)
+        IdentityAllocator.release(self.targetId)
         # remove store ip
         if (self.ipv4 in HandleRecoverDevices.list_recover_ipv4):
             HandleRecoverDevices.list_recover_ipv4.remove(self.ipv4)
@@ -1821,12 +1953,22 @@ class MainWindow(QMainWindow):
                     device_state_info["reply"]["fabricInfo"][0]["nodeId"])
                 device_state = "Status: " + device_state_info["status"] + ", FabricID: " + \
                     fabric_id + ", NodeID: " + node_id
+                MdnsBrowser.set_node_id(
+                    self.targetId,
+                    device_state_info["reply"]["fabricInfo"][0]["nodeId"])
             else:
                 if (self.connected_device):
                     self.handle_delete_device()
 
         except Exception as e:
             logging.error(str(device_state_info) + "\n" + str(e))
+        traffic = TrafficCapture.get_device_counters(self.targetId)
+        if (traffic is not None) and (len(device_state) > 0):
+            device_state += ", Traffic: {:.1f} pkt/s, {:.0f} B/s".format(
+                traffic["packets_per_second"], traffic["bytes_per_second"])
+            if traffic["retransmits"] > 0:
+                device_state += ", Retransmits: {}".format(
+                    traffic["retransmits"])
         if (self.isDeviceStarted):
             self.update_status(
                 f"Device is connected succesfully! {self.interfaceName}-{self.ipv4}/{str(self.rpcPort)}",
@@ -1851,14 +1993,21 @@ class Main(QMainWindow):
     """
     Main class definition for creating emulator
     """
+    uplink_changed = Signal(dict)
+    provision_prepared = Signal(object)
+    onboarding_sheet_done = Signal(object, str)
 
     def __init__(self):
         """
         Initialize a Main instance.
         """
         super().__init__()
+        self.uplink_changed.connect(self.handle_uplink_changed)
+        self.provision_prepared.connect(self.handle_provision_prepared)
+        self.onboarding_sheet_done.connect(self.handle_onboarding_sheet_done)
+        UplinkMonitor.add_listener(self.uplink_changed.emit)
+        UplinkMonitor.start()
         self.listTab = []
-        self.listDevice = []
         self.tabWidget = QTabWidget(self)
         self.tabWidget.setTabsClosable(True)
         self.tabWidget.setUsesScrollButtons(True)
@@ -1871,6 +2020,23 @@ class Main(QMainWindow):
         self.infoButton = QPushButton("I \n N \n F \n O", self)
         self.infoButton.setGeometry(20, 40, 30, 100)
         self.infoButton.clicked.connect(self.showOverlay)
+
+        self.fleetButton = QPushButton("F \n L \n E \n E \n T", self)
+        self.fleetButton.setGeometry(20, 140, 30, 120)
+        self.fleetButton.setToolTip("Import a fleet manifest (.csv, .yaml)")
+        self.fleetButton.clicked.connect(self.import_fleet_manifest)
+
+        self.sheetButton = QPushButton("S \n H \n E \n E \n T", self)
+        self.sheetButton.setGeometry(20, 260, 30, 120)
+        self.sheetButton.setToolTip(
+            "Export the QR codes of all devices (.html, .png, .pdf)")
+        self.sheetButton.clicked.connect(self.export_onboarding_sheet)
+        self.provision_queue = []
+        self.provision_started = []
+        self.provision_start_time = 0
+        self.provision_prepare_time = 0
+        self.provision_timer = QTimer(self)
+        self.provision_timer.timeout.connect(self.start_next_provisioned_device)
         self.tab = MainWindow()
 
         self.overlay_widget = OverlayWidget(self)
@@ -1881,28 +2047,121 @@ class Main(QMainWindow):
         self.number_tab = 0
         self.addNewTab()
         self.tabName = ""
-        self.compact_folder_log(self.get_all_dir_log_need_remove())
+        self.log_retention = LogRetentionService(SOURCE_PATH + "/log/")
+        self.log_retention.start()
         base_ipv4, base_ipv6 = self.get_network_config()
         self.releaseIP_when_start_app(base_ipv4, base_ipv6)
 
         self.tcpDump = None
-        tcpDump_thread = Thread(target=self.tcpDumpFunc)
-        tcpDump_thread.start()
+        self.tcpDumpFunc()
+        self.mdns_browser = None
+        self.start_mdns_browser()
 
         # handle recover tab info
         HandleRecoverDevices.remove_un_commissioned_storage_folder()
-        
+        self.storage_checker = StorageConsistencyChecker()
+        self.storage_checker.start()
+        self.dac_cache = DacCache(DAC_VID, GenDacTool.get_issuer())
+        self.update_dac_cache()
+        self.dac_cache.start()
+        self.dac_cache_timer = QTimer(self)
+        self.dac_cache_timer.timeout.connect(self.update_dac_cache)
+        self.dac_cache_timer.start(DAC_CACHE_UPDATE_INTERVAL)
+
         HandleRecoverDevices.handle_recover_devices(
             self.addNewTab, self.listTab)
         self.is_recover_device = HandleRecoverDevices.check_recover()
 
     def tcpDumpFunc(self):
         """
-        TCP dump network data on a interface.
+        Capture the Matter traffic of the uplink and count it per device.
+        """
+        if get_network_if_name() is None:
+            return
+        self.tcpDump = TrafficCapture(get_network_if_name())
+        self.tcpDump.start()
+
+    def update_dac_cache(self):
+        """
+        Hand the next devices and the idle state over to the DAC cache, the
+        GUI state is only read here on the UI thread.
+        """
+        try:
+            self.dac_cache.update(self.get_dac_cache_wanted(), self.is_dac_cache_idle())
+        except Exception as err:
+            logging.error("Fail to update the DAC cache: {}".format(err))
+
+    def get_dac_cache_wanted(self):
+        """
+        Return the [(product id in hex, serial number)] of the next devices:
+        the serial numbers generate_serial_number() hands out next and the
+        serial_number_list of config.json, with the last product id.
         """
-        cmd = f"sudo tcpdump -i {NETWORK_IF_NAME} -n udp port 5540"
-        self.tcpDump = DeviceRunner(cmd)
-        self.tcpDump.execute()
+        settings = QSettings("LGE.HE.TSC", "MatterIoTEmulator")
+        try:
+            product_id = int(settings.value("txt_productid", "32788"))
+            serial = int(settings.value("txt_serial_number", "2021"))
+        except ValueError:
+            return []
+        list_serial = []
+        while len(list_serial) < DAC_CACHE_PREFETCH:
+            serial += 1
+            if serial > MAX_SERIAL_NUMBER:
+                serial = 1
+            if not RunningDeviceRegistry.has_serial(serial):
+                list_serial.append(str(serial))
+        list_serial += [str(item) for item in self.tab.get_serial_number_list()]
+        return [(f'{product_id:x}', item) for item in list_serial]
+
+    def is_dac_cache_idle(self):
+        """
+        Return True when no device is starting and no DAC is being created.
+        """
+        return ((len(list_status_device) == 0) and (not self.provision_queue) and (
+            (MainWindow.dac_pool is None) or (MainWindow.dac_pool.activeThreadCount() == 0)))
+
+    def start_mdns_browser(self):
+        """
+        Watch the DNS-SD advertisements of the devices on the uplink.
+        """
+        if get_network_if_name() is None:
+            return
+        self.mdns_browser = MdnsBrowser(get_network_if_name())
+        try:
+            self.mdns_browser.start()
+        except OSError as err:
+            logging.error("Fail to start mDNS browser: {}".format(err))
+            self.mdns_browser = None
+
+    def stop_mdns_browser(self):
+        """
+        Stop the DNS-SD browser.
+        """
+        if self.mdns_browser is not None:
+            self.mdns_browser.stop()
+            self.mdns_browser = None
+
+    def handle_uplink_changed(self, uplink_state):
+        """
+        Pause or resume the running devices when the uplink changed.
+
+        Arguments:
+            uplink_state {dict} -- the uplink state from UplinkMonitor
+        """
+        for tab in self.listTab:
+            if (tab.ui.btn_start_device.text() == "Stop Device"):
+                if uplink_state["is_up"]:
+                    tab.resume_advertisement(uplink_state["interface"])
+                else:
+                    tab.pause_advertisement()
+        if (uplink_state["interface"] != uplink_state["previous_interface"]):
+            # Follow the new uplink with the capture
+            self.closeTcpDump()
+            self.tcpDumpFunc()
+            self.stop_mdns_browser()
+            self.start_mdns_browser()
+        if self.overlay_widget.isVisible():
+            self.update_lbwidget(len(list_device_connect), self.number_tab)
 
     def showOverlay(self):
         """
@@ -1914,6 +2173,159 @@ class Main(QMainWindow):
             self.list_device_connect = list_device_connect
             self.update_widget()
 
+    def import_fleet_manifest(self):
+        """
+        Validate a fleet manifest and prepare its devices in the background.
+        """
+        if self.provision_timer.isActive():
+            QMessageBox.warning(
+                self, "Fleet manifest", "The previous manifest is still starting")
+            return
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Import fleet manifest", SOURCE_PATH,
+            "Fleet manifest (*.csv *.yaml *.yml)")
+        if not path:
+            return
+        try:
+            devices = FleetManifest.expand(
+                FleetManifest.load(path),
+                self.tab.get_limit_devices_number() - self.number_tab)
+        except (OSError, ValueError) as err:
+            QMessageBox.warning(self, "Fleet manifest", str(err))
+            return
+        self.fleetButton.setEnabled(False)
+        self.provision_start_time = time.perf_counter()
+        Thread(target=self.prepare_fleet, args=(devices,), daemon=True).start()
+
+    def prepare_fleet(self, devices):
+        """
+        Lease the addresses and create the storage folder, DAC, payload and
+        rpc port of the devices.
+
+        Arguments:
+            devices {[dict]} -- the devices from FleetManifest.expand()
+        """
+        results, self.provision_prepare_time = FleetProvisioner.prepare(devices)
+        self.provision_prepared.emit(results)
+
+    def export_onboarding_sheet(self):
+        """
+        Write the onboarding codes of the stored devices in the background.
+        """
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export onboarding sheet", SOURCE_PATH + "/onboarding.html",
+            "HTML page (*.html);;PNG pages (*.png);;PDF document (*.pdf)")
+        if not path:
+            return
+        self.sheetButton.setEnabled(False)
+        Thread(target=self.write_onboarding_sheet, args=(path,), daemon=True).start()
+
+    def write_onboarding_sheet(self, path):
+        """
+        Render the onboarding sheet and emit onboarding_sheet_done.
+
+        Arguments:
+            path {str} -- the output file
+        """
+        try:
+            paths, count = OnboardingSheet.export(path)
+            logging.info("Onboarding sheet of {} devices: {}".format(count, paths))
+            self.onboarding_sheet_done.emit(paths, "")
+        except Exception as err:
+            # Any error must reach the UI thread, which enables the button again
+            logging.error("Fail to write the onboarding sheet: {}".format(err))
+            self.onboarding_sheet_done.emit([], str(err))
+
+    def handle_onboarding_sheet_done(self, paths, error):
+        """
+        Report the written onboarding sheet.
+
+        Arguments:
+            paths {[str]} -- the written files
+            error {str} -- the error, empty on success
+        """
+        self.sheetButton.setEnabled(True)
+        if error:
+            QMessageBox.warning(self, "Onboarding sheet", error)
+            return
+        QMessageBox.information(self, "Onboarding sheet", "\n".join(paths))
+
+    def handle_provision_prepared(self, results):
+        """
+        Open a tab for every prepared device and start them one by one.
+
+        Arguments:
+            results {[dict]} -- the results of FleetProvisioner.prepare()
+        """
+        self.fleetButton.setEnabled(True)
+        failed = [item for item in results if item['error']]
+        for item in results:
+            if item['error']:
+                continue
+            self.addNewTab()
+            tab = self.listTab[-1]
+            tab.ui.cbb_device_selection.setCurrentText(item['device-type'])
+            tab.ui.txt_serial_number.setText(str(item['serial-num']))
+            tab.ui.txt_vendorid.setText(str(item['vendor-id']))
+            tab.ui.txt_productid.setText(str(item['product-id']))
+            tab.ui.txt_discriminator.setText(str(item['discriminator']))
+            tab.ui.txt_pincode.setText(str(item['pin-code']))
+            tab.create_time = item['create-time']
+            # Start with the leased addresses, new devices skip them
+            tab.ipv4 = item['ipv4']
+            tab.ipv6 = item['ipv6']
+            tab.interface_index = item['interface_index']
+            if (item['ipv4'] not in HandleRecoverDevices.list_recover_ipv4):
+                HandleRecoverDevices.list_recover_ipv4.append(item['ipv4'])
+            if (item['ipv6'] not in HandleRecoverDevices.list_recover_ipv6):
+                HandleRecoverDevices.list_recover_ipv6.append(item['ipv6'])
+            if (int(item['interface_index'])
+                    not in HandleRecoverDevices.list_recover_interface_index):
+                HandleRecoverDevices.list_recover_interface_index.append(
+                    int(item['interface_index']))
+            tab.is_recover = ""
+            tab.unique_id = ""
+            self.provision_queue.append(tab)
+        if failed:
+            QMessageBox.warning(
+                self, "Fleet manifest", "Fail to prepare:\n" + "\n".join(
+                    "{}: {}".format(item['targetId'], item['error'])
+                    for item in failed))
+        self.provision_started = []
+        if self.provision_queue:
+            self.provision_timer.start(PROVISION_START_INTERVAL)
+
+    def start_next_provisioned_device(self):
+        """
+        Start the next prepared device once no other device is starting, and
+        report the throughput when all of them are done.
+        """
+        self.provision_queue = [
+            tab for tab in self.provision_queue if tab in self.listTab]
+        if self.provision_queue and (len(list_status_device) < 1):
+            tab = self.provision_queue.pop(0)
+            self.tabWidget.setCurrentIndex(self.listTab.index(tab))
+            tab.on_click_start_device()
+            self.provision_started.append(tab)
+        if self.provision_queue:
+            return
+        started = [tab for tab in self.provision_started
+                   if tab in self.listTab and tab.isDeviceStarted]
+        pending = [tab for tab in self.provision_started
+                   if (tab in self.listTab and not tab.isDeviceStarted and
+                       tab.ui.btn_start_device.text() == "Stop Device")]
+        if pending:
+            return
+        self.provision_timer.stop()
+        elapsed = time.perf_counter() - self.provision_start_time
+        logging.info(
+            "Provisioned {} of {} devices in {:.2f}s (prepare {:.2f}s), "
+            "{:.2f} devices/s".format(
+                len(started), len(self.provision_started), elapsed,
+                self.provision_prepare_time,
+                len(started) / elapsed if elapsed > 0 else 0.0))
+        self.provision_started = []
+
     def update_lbwidget(self, num_connect, num_tab):
         """
         Update content of label widget.
@@ -1922,8 +2334,11 @@ class Main(QMainWindow):
             num_connect {str} -- the current connected devicess
             num_tab {str} -- the open tabs index
         """
+        uplink_state = UplinkMonitor.get_state()
         self.overlay_widget.label_tt.setText(
-            "Current connected Devices / Open Tabs : {}/{}".format(num_connect, num_tab))
+            "Current connected Devices / Open Tabs : {}/{}    Uplink: {} ({})".format(
+                num_connect, num_tab, uplink_state["interface"],
+                "up" if uplink_state["is_up"] else "down"))
 
     def update_widget(self):
         """
@@ -2009,94 +2424,6 @@ class Main(QMainWindow):
             "Robot Vaccum Cleaner(0x0074) : {}".format(
                 list_device_connect.count("0x0074")))
 
-    def get_all_dir_log_need_remove(self):
-        """
-        Get all of log directory need to be remove.
-
-        Raise:
-            Exception: if can not get path of log folder
-        Return:
-            Directory of log folder
-        """
-        self.pathLog = SOURCE_PATH + "/log/"
-        try:
-            list_dir = os.listdir(self.pathLog)
-        except OSError as err:
-            logging.error("Fail to get path of log folder: {}".format(err))
-        dict_dir_time = {}
-        for dir in list_dir:
-            fullPath = self.pathLog + str(dir)
-            if (not os.path.isdir(fullPath)):
-                continue
-            dict_dir_time[str(dir)] = int(
-                self.get_create_folder_time(fullPath))
-        dirs = self.sort_date_time_all_dir(dict_dir_time)
-        return dirs
-
-    def get_create_folder_time(self, path):
-        """
-        Return created time of a folder.
-
-        Arguments:
-            path {str} -- the path of a folder
-        Raise:
-            Exception: if can not get created time of a folder
-        """
-        try:
-            create_time = os.path.getctime(path)
-        except OSError as err:
-            logging.error(
-                "Fail to get create Time of log folder: {}".format(err))
-        return create_time
-
-    def compact_folder_log(self, list_dir):
-        """
-        Remove the path of a folder.
-
-        Arguments:
-            list_dir {str} -- the path of a folder
-        Raise:
-            Exception: if can not remove a folder
-        """
-        for dir in list_dir:
-            try:
-                shutil.rmtree(dir)
-            except OSError as err:
-                logging.error(
-                    "Fail to remove folder {} {}log".format(
-                        dir, err))
-
-    def sort_date_time_all_dir(self, dict_dir_time):
-        """
-        Return a list of folder after sorted.
-
-        Arguments:
-            dict_dir_time {dict} -- the dictionary of path and datetime
-        """
-        list_dir_need_remove = []
-        list_time_value = list(dict_dir_time.values())
-        list_time_value.sort(reverse=True)
-        if (len(list_time_value) > NUMBER_OF_FOLDER_LOG):
-            list_time_value = list_time_value[2:]
-            for val in list_time_value:
-                key = self.get_key_dict(val, dict_dir_time)
-                if ("None" not in key):
-                    list_dir_need_remove.append(self.pathLog + str(key))
-        return list_dir_need_remove
-
-    def get_key_dict(self, val, dict):
-        """
-        Find a key with input value in a dictionary.
-
-        Arguments:
-            val {str} -- the valur need to be search
-            dict {dict} -- the dictionary data
-        """
-        for key, value in dict.items():
-            if val == value:
-                return key
-        return "None"
-
     def show_message_box(self):
         """
         Show message box.
@@ -2118,29 +2445,6 @@ class Main(QMainWindow):
             self.msgBox.accept()
             self.msgBox = None
 
-    def execute_command(self, cmd):
-        """
-        Return the output result after executing the command.
-
-        Arguments:
-            cmd {str} -- the command string
-        """
-        proc = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            shell=True)
-        out, err = proc.communicate()
-        out_utf8 = out.decode('utf-8').strip()
-        err_utf8 = err.decode('utf-8').strip()
-
-        if err_utf8 != "":
-            logging.info("[ERR_UTF8] : " + err_utf8)
-        if out_utf8 != "":
-            pass
-
-        return out_utf8, err_utf8
-
     def store_network_config(self, data):
         """
         Write network cionfig information to file.
@@ -2149,40 +2453,28 @@ class Main(QMainWindow):
             data {str} -- the data string need to write to file
         """
         fullpath = NETWORK_INFO_PATH + NETWORK_INFO_FILENAME
-
-        if os.path.isfile(fullpath):
-            logging.info(fullpath + " exist")
-            os.remove(fullpath)
-
         try:
-            with open(fullpath, 'w') as file:
-                json.dump(data, file, indent=4)
+            AtomicFile.write_json(fullpath, data)
         except Exception as e:
             logging.error("Failed to write network info file: " + str(e))
 
-    def convert_dataFormat(self, input_str):
+    def convert_dataFormat(self, dict_data):
         """
-        Convert input string.
+        Convert interface information.
 
         Arguments:
-            input_str {str} -- input data string need to be converted
+            dict_data {dict} -- the cached interface information, None if the interface does not exist
         Return:
             A tuple of an error add network address informations
         """
         error_value = 0
         addr_info_list = []
 
-        if (input_str == "[]" or input_str == ""):
+        if (dict_data is None):
             logging.info("Cannot get ip info. Connect to a Wi-Fi network.")
             error_value = 1
             # os._exit(0)
         else:
-            # Remove bracket : []
-            str_data = str(input_str)[1:-1]
-
-            # convert str to json(python dict)
-            dict_data = json.loads(str_data)
-
             # store data to file
             self.store_network_config(dict_data)
 
@@ -2212,7 +2504,7 @@ class Main(QMainWindow):
             if (item.get("family") == IP_VERSION4 and
                 item.get("prefixlen") == IP_VERSION4_PREFIXLEN and
                 item.get("scope") == IP_VERSION4_SCOPE and
-                item.get("label") == NETWORK_IF_NAME and
+                item.get("label") == get_network_if_name() and
                     item.get("secondary") != True):
                 ip_ver4 = item['local']
                 logging.info(f"ip_ver4: {ip_ver4}")
@@ -2236,12 +2528,8 @@ class Main(QMainWindow):
         ipver4 = ""
         ipver6 = ""
 
-        get_network_info_cmd = f"ip -j addr show {NETWORK_IF_NAME}"
-        network_info_utf8, network_info_err_utf8 = self.execute_command(
-            get_network_info_cmd)
-
         error_value, addr_info_list = self.convert_dataFormat(
-            network_info_utf8)
+            InterfaceStateCache.get_interface(get_network_if_name()))
 
         if error_value:
             logging.info("Connect to a Wi-Fi network.")
@@ -2266,27 +2554,16 @@ class Main(QMainWindow):
         listCreatedIpv6 = []
         listCreatedIpv4 = []
         self.clear_file()
-        cmd = f"ip addr show {NETWORK_IF_NAME}"
-        argus = shlex.split(cmd)
-        temp = subprocess.Popen(argus, stdout=subprocess.PIPE)
-        # get the output as a string
-        output = str(temp.communicate())
-        wlan0OutputList = output.split('\\n')
-
-        for ipv4 in wlan0OutputList:
-            pattern = fr'inet ([0-9]{{1,3}}\.[0-9]{{1,3}}\.[0-9]{{1,3}}\.[0-9]{{1,3}}).*?scope .*?{NETWORK_IF_NAME}:\d+'
-            createdIpv4 = re.findall(pattern, ipv4)
-            if (len(createdIpv4) > 0):
-                listCreatedIpv4.append(createdIpv4[0])
-        for Ipv6 in wlan0OutputList:
-            createdIpv6 = re.findall('inet6 (.*)/128 scope link', Ipv6)
-            allIpv6 = re.findall('inet6 (.*)/[0-9]{1,3} scope link', Ipv6)
-
-            if (len(allIpv6) > 0):
-                listAllIpv6.append(allIpv6[0])
-
-            if (len(createdIpv6) > 0):
-                listCreatedIpv6.append(createdIpv6[0])
+        network_if_name = get_network_if_name()
+        for item in InterfaceStateCache.get_addr_info(network_if_name):
+            if (item.get("family") == IP_VERSION4 and
+                    re.fullmatch(fr'{network_if_name}:\d+', item.get("label", ""))):
+                listCreatedIpv4.append(item["local"])
+            elif (item.get("family") == IP_VERSION6 and
+                    item.get("scope") == IP_VERSION6_SCOPE):
+                listAllIpv6.append(item["local"])
+                if (item.get("prefixlen") == 128):
+                    listCreatedIpv6.append(item["local"])
 
         # If list ip need to remove contain base ip ->remove it from list
         if (base_ipv4 in listCreatedIpv4):
@@ -2302,14 +2579,15 @@ class Main(QMainWindow):
         if (len(listCreatedIpv4) > 0):
             for ipv4 in listCreatedIpv4:
                 subprocess.run(["sudo", "ip", "addr", "del",
-                               ipv4, "dev", NETWORK_IF_NAME])
+                               ipv4, "dev", network_if_name])
             logging.info("Remove Ipv4 done!!!")
         # remove ipv6
         if (len(listCreatedIpv6) > 0) and (len(listAllIpv6) > 1):
             for ipv6 in listCreatedIpv6:
                 subprocess.run(["sudo", "ip", "addr", "del",
-                               ipv6, "dev", NETWORK_IF_NAME])
+                               ipv6, "dev", network_if_name])
             logging.info("Remove Ipv6 done!!!")
+        InterfaceStateCache.invalidate()
 
     def update_ui_tab(self):
         """
@@ -2392,20 +2670,10 @@ class Main(QMainWindow):
             device_changed)
 
     def clear_file(self):
-        file = open(DEVICE_LIST_PATH, 'w')
-        file.close()
-
-    def save_device_list_file(self):
-        deviceList = ":".join(self.listDevice)
-        fileListDevice = open(DEVICE_LIST_PATH, "w+")
-        fileListDevice.write(deviceList)
-        fileListDevice.close()
+        RunningDeviceRegistry.clear()
 
     def remove_targetId_when_close_tab(self, index):
-        value = self.listTab[index].targetId
-        if (value in self.listDevice):
-            self.listDevice.remove(value)
-            self.save_device_list_file()
+        RunningDeviceRegistry.remove(self.listTab[index].targetId)
 
     def handle_update_name_tab(self, device_changed):
         self.tabWidget.setTabText(
@@ -2413,13 +2681,10 @@ class Main(QMainWindow):
             device_changed)
 
     def handle_remove_targetId_when_stopped(self, deviceID):
-        if (deviceID in self.listDevice):
-            self.listDevice.remove(deviceID)
+        RunningDeviceRegistry.remove(deviceID)
 
     def handle_device_started(self, deviceID):
-        if ((deviceID != "") and (deviceID not in self.listDevice)):
-            self.listDevice.append(deviceID)
-            self.save_device_list_file()
+        RunningDeviceRegistry.add(deviceID)
 
     def closeTab(self, index):
         reply = QMessageBox.question(
@@ -2429,6 +2694,7 @@ class Main(QMainWindow):
             QMessageBox.Yes | QMessageBox.No)
         if reply == QMessageBox.Yes:
             if self.tabWidget.count() >= 1:
+                IdentityAllocator.release(self.listTab[index].identity_owner)
                 if (self.listTab[index].ui.btn_start_device.text()
                         == "Stop Device"):
                     if len(list_status_device) > 0:
@@ -2436,6 +2702,9 @@ class Main(QMainWindow):
                     self.listTab[index].ip_value.removeIpAfterStopDevice()
                     self.listTab[index].ip_value.releaseRpcPort(
                         self.listTab[index].rpcPort)
+                    TrafficCapture.unregister_device(
+                        self.listTab[index].targetId)
+                    MdnsBrowser.forget_device(self.listTab[index].targetId)
                     self.remove_targetId_when_close_tab(index)
                     HandleRecoverDevices.remove_recover_devices(
                         self.listTab[index].targetId)
@@ -2462,14 +2731,11 @@ class Main(QMainWindow):
 
     def closeTcpDump(self):
         """
-        Close TCP dump file.
+        Stop the traffic capture.
         """
-        try:
-            if self.tcpDump is not None:
-                self.tcpDump.stop()
-                self.tcpDump = None
-        except PermissionError:
-            logging.info('Command is already done')
+        if self.tcpDump is not None:
+            self.tcpDump.stop()
+            self.tcpDump = None
 
     def closeEvent(self, event):
         """
@@ -2488,6 +2754,13 @@ class Main(QMainWindow):
         self.tab.load_network_config()
         self.clear_file()
         self.closeTcpDump()
+        self.stop_mdns_browser()
+        self.log_retention.stop()
+        self.storage_checker.stop()
+        self.dac_cache_timer.stop()
+        self.dac_cache.stop()
+        logging.info("mDNS advertisement latency: {}".format(
+            MdnsBrowser.get_latency_report()))
 
         logging.info("Wait a second for closing current works...")
         logging.info(
@@ -16,6 +16,7 @@
 
 
 CONFIG_FILE = 'res/config/config.json'
+CONFIG_RECHECK_INTERVAL = 2
 CHIP_FACTORY_FILE = "chip_factory.ini"
 TEMP_PATH = "/temp/"
 
@@ -27,7 +28,77 @@ IP_VERSION4_SCOPE = "global"
 IP_VERSION6 = "inet6"
 IP_VERSION6_PREFIXLEN = 64
 IP_VERSION6_SCOPE = "link"
-NUMBER_OF_FOLDER_LOG = 2
+# Device log retention (log/<date>/)
+LOG_RETENTION_INTERVAL = 300
+LOG_SEGMENT_MAX_BYTES = 5 * 1024 * 1024
+LOG_DEVICE_MAX_BYTES = 50 * 1024 * 1024
+LOG_TOTAL_MAX_BYTES = 500 * 1024 * 1024
+LOG_MAX_AGE_DAYS = 14
+LOG_IDLE_SECONDS = 600
+# "gzip" or "zstd" (needs the zstandard package, gzip is used without it)
+LOG_COMPRESSION = "gzip"
+LOG_COMPRESSION_LEVEL = 6
+RPC_PORT_RESERVATION_FILE = "res/config/rpcPortList.json"
+DEVICE_REGISTRY_FILE = "res/config/device_registry.db"
+DEVICE_LIST_FILE = "res/config/deviceList.dat"
+DEVICE_LIST_FLUSH_DELAY = 0.2
+SNAPSHOT_PATH = "snapshots"
+# Broken device folders are moved from temp/ to this folder
+STORAGE_QUARANTINE_PATH = "quarantine"
+STORAGE_CHECK_STATE_FILE = "res/config/storage_check.json"
+STORAGE_CHECK_INTERVAL = 60
+# Folders modified less than this many seconds ago are checked later
+STORAGE_CHECK_GRACE = 10
+# Fleet manifest provisioning
+PROVISION_WORKERS = 8
+# Threads of the DAC issuance pool of the application
+DAC_WORKERS = 4
+# QR code images kept in memory, pixels per QR module
+QR_IMAGE_CACHE_SIZE = 64
+QR_IMAGE_BOX_SIZE = 10
+# Onboarding sheet: tiles per page, dots per inch of the PNG/PDF pages
+ONBOARDING_SHEET_COLUMNS = 4
+ONBOARDING_SHEET_ROWS = 5
+ONBOARDING_SHEET_DPI = 150
+# DAC cache: seconds between two passes, DACs issued ahead of time
+DAC_CACHE_INTERVAL = 30
+DAC_CACHE_PREFETCH = 8
+# ms between two hand-overs of the next devices from the UI to the DAC cache
+DAC_CACHE_UPDATE_INTERVAL = 1000
+# Unused DACs kept at most, days an unused DAC is kept
+DAC_CACHE_MAX_UNUSED = 64
+DAC_CACHE_MAX_AGE_DAYS = 30
+# seconds before incomplete DAC files are removed
+DAC_CACHE_INCOMPLETE_GRACE = 60
+# <vid>-<pid>-<sn> per line of the DACs in dac-temp/ which are never evicted
+DAC_CACHE_PIN_FILE = ".pinned"
+# ms between two checks for starting the next provisioned device
+PROVISION_START_INTERVAL = 500
+RPC_PORT_MIN = 33001
+RPC_PORT_MAX = 65535
+# Move the device addresses to the other interface when the uplink fails over.
+# Only enable it when both interfaces are attached to the same network.
+UPLINK_REHOME_ADDRESSES = False
+# Matter traffic capture
+MATTER_UDP_PORT = 5540
+MDNS_UDP_PORT = 5353
+CAPTURE_RATE_WINDOW = 10
+CAPTURE_RETRANSMIT_HISTORY = 256
+CAPTURE_REPORT_INTERVAL = 60
+CAPTURE_PCAP_ENABLED = False
+CAPTURE_PCAP_PATH = "capture"
+CAPTURE_PCAP_FILE_SIZE = 10 * 1024 * 1024
+CAPTURE_PCAP_FILE_COUNT = 5
+# DNS-SD browser
+MDNS_IPV4_GROUP = "224.0.0.251"
+MDNS_IPV6_GROUP = "ff02::fb"
+MDNS_COMMISSIONABLE_SERVICE = "_matterc._udp.local"
+MDNS_OPERATIONAL_SERVICE = "_matter._tcp.local"
+MDNS_QUERY_INTERVAL = 30
+# Seconds a withdrawn advertisement is kept before it is forgotten
+MDNS_WITHDRAWN_RETENTION = 600
+# Advertisement latencies kept per fleet and service, the oldest are dropped
+MDNS_LATENCY_SAMPLES = 1024
 
 # Connect status's color
 RED = "red"
@@ -76,6 +147,9 @@ STT_BIND_IP_FAIL_BACKEND = 15
 STT_WAITING_RUNING_DEVICE = 16
 STT_RPC_INIT_FAIL = 17
 STT_RECOVER_FAIL = 18
+STT_UPLINK_DOWN = 19
+STT_UPLINK_RESTORED = 20
+STT_UPLINK_MOVED = 21
 # Connect flag
 FLAG_DISCONNECTED = ""
 FLAG_COMMISSIONING_FAIL = "Commissioning failed"
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Measure the DAC issuance throughput in devices per second.
+
+Run from the application folder:
+    python3 -m credentials.development.bench_dac_issuer --count 200
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from credentials.development import dac_issuer, gen_dac_cert
+
+
+def bench_in_process(count, work_path):
+    """
+    Issue count DACs with DacIssuer
+    :param count: number of devices, work_path: output folder
+    :return: elapsed seconds
+    """
+    start = time.perf_counter()
+    issuer = dac_issuer.DacIssuer(
+        gen_dac_cert.pai_cert_path, gen_dac_cert.pai_key_path, gen_dac_cert.vid)
+    for sn in range(count):
+        issuer.write(work_path, "8000", str(sn))
+    return time.perf_counter() - start
+
+
+def bench_chip_cert(count, work_path):
+    """
+    Issue count DACs with the chip-cert and openssl commands of GenDacTool
+    :param count: number of devices, work_path: output folder
+    :return: elapsed seconds
+    """
+    start = time.perf_counter()
+    for sn in range(count):
+        dac_path = os.path.join(work_path, "DAC-FFF1-8000-{}".format(sn))
+        subprocess.run([
+            gen_dac_cert.CHIP_CERT_TOOL, "gen-att-cert", "--type", "d",
+            "--subject-cn", "Matter Dev DAC 0xFFF1/0x8000",
+            "--subject-vid", gen_dac_cert.vid, "--subject-pid", "8000",
+            "--valid-from", gen_dac_cert.cert_valid_from,
+            "--lifetime", str(gen_dac_cert.cert_lifetime),
+            "--ca-key", gen_dac_cert.pai_key_path,
+            "--ca-cert", gen_dac_cert.pai_cert_path,
+            "--out-key", dac_path + "-Key.pem", "--out", dac_path + "-Cert.pem"],
+            check=True, capture_output=True)
+        subprocess.run([
+            gen_dac_cert.CHIP_CERT_TOOL, "convert-cert", dac_path + "-Cert.pem",
+            dac_path + "-Cert.der", "--x509-der"], check=True, capture_output=True)
+        for _ in range(3):
+            # od and the two openssl ec -text pipelines
+            subprocess.run("openssl ec -text -noout -in \"{}-Key.pem\" 2>/dev/null "
+                           "| sed 's/:/, /g' > /dev/null".format(dac_path),
+                           shell=True, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    """Print the throughput of each available issuer"""
+    parser = argparse.ArgumentParser(description="DAC issuance benchmark")
+    parser.add_argument("--count", type=int, default=100,
+                        help="number of devices (default 100)")
+    args = parser.parse_args()
+
+    benches = []
+    if dac_issuer.is_available():
+        benches.append(("cryptography", bench_in_process))
+    if os.access(gen_dac_cert.CHIP_CERT_TOOL, os.X_OK):
+        benches.append(("chip-cert", bench_chip_cert))
+    if not benches:
+        print("No DAC issuer available")
+        return 1
+    for name, bench in benches:
+        work_path = tempfile.mkdtemp(prefix="dac-bench-")
+        try:
+            elapsed = bench(args.count, work_path)
+        except (OSError, subprocess.CalledProcessError) as err:
+            print("{:<12} failed: {}".format(name, err))
+            continue
+        finally:
+            shutil.rmtree(work_path, ignore_errors=True)
+        print("{:<12} {} devices in {:.2f}s ({:.1f} devices/s)".format(
+            name, args.count, elapsed, args.count / elapsed))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
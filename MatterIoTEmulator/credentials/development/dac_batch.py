@@ -0,0 +1,132 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from credentials.development import dac_issuer
+from credentials.development.dac_cache import DacCache, DAC_WORK_PATH
+from credentials.development.gen_dac_cert import pai_cert_path, pai_key_path
+
+# Chunks per worker process, more chunks balance the load better
+DAC_BATCH_CHUNKS_PER_WORKER = 4
+
+
+class DacBatchIssuer():
+    """Class for issuing the DACs of many devices with a pool of processes
+
+    The DAC files are written with the same names as GenDacTool writes, so
+    the emulator finds them when the devices start. Each process loads its
+    PAI once and signs a chunk of devices. In the emulator DAC folder the
+    DACs are pinned, the DAC cache does not evict them before their devices
+    are created.
+    """
+
+    @staticmethod
+    def parse_range(text):
+        """
+        Return the (first, last) of "N" or "N-M", decimal or 0x hex
+        :param text: range text
+        """
+        first, _, last = text.partition("-")
+        first = int(first, 0)
+        last = int(last, 0) if last else first
+        if last < first:
+            raise ValueError("Invalid range {}".format(text))
+        return first, last
+
+    @staticmethod
+    def issue_chunk(pai_cert, pai_key, vid, work_path, devices):
+        """
+        Issue the DACs of a chunk of devices in a worker process
+        :param pai_cert: PAI certificate path, pai_key: PAI key path,
+        vid: Vendor ID in hex, work_path: output folder, devices: [(pid, sn)]
+        :return: number of issued DACs
+        """
+        issuer = dac_issuer.DacIssuer(pai_cert, pai_key, vid)
+        for pid, sn in devices:
+            issuer.write(work_path, pid, sn)
+        return len(devices)
+
+    @staticmethod
+    def issue(devices, vid, workers=None, work_path=DAC_WORK_PATH,
+              paa=None, force=False):
+        """
+        Issue the DACs of devices
+        :param devices: [(pid, sn)] with pid in hex, vid: Vendor ID in hex,
+        workers: number of processes (default = number of cores),
+        work_path: output folder, paa: (PAA certificate path, PAA key path) to
+        issue a new PAI per product id, None to use the development PAI,
+        force: issue again the DACs which exist,
+        the DACs are pinned when work_path is the emulator DAC folder
+        :return: report {issued, skipped, pai, elapsed}
+        :raises ValueError: if a PAA is given for the emulator DAC folder
+        """
+        if not dac_issuer.is_available():
+            raise ValueError("The cryptography package is required")
+        is_emulator_path = os.path.realpath(work_path) == os.path.realpath(DAC_WORK_PATH)
+        if (paa is not None) and is_emulator_path:
+            # The emulator attests with the development PAI only
+            raise ValueError("DACs signed by a new PAI fail attestation in the "
+                             "emulator, give another output folder")
+        vid = vid.upper()
+        start = time.perf_counter()
+        os.makedirs(work_path, exist_ok=True)
+        report = {"issued": 0, "skipped": 0, "pai": [], "elapsed": 0.0}
+        if is_emulator_path:
+            DacCache.pin([(vid, pid, sn) for pid, sn in devices])
+            if not force:
+                todo = [(pid, sn) for pid, sn in devices
+                        if not DacCache.contains(vid, pid, sn)]
+                report["skipped"] = len(devices) - len(todo)
+                devices = todo
+
+        # PAI of each product id
+        pai_paths = {}
+        for pid in sorted(set(pid for pid, _ in devices)):
+            if paa is not None:
+                pai_paths[pid] = dac_issuer.DacIssuer.issue_pai(
+                    paa[0], paa[1], vid, pid, work_path)
+                report["pai"].append(pai_paths[pid][0])
+            else:
+                pai_paths[pid] = (pai_cert_path, pai_key_path)
+        if (paa is None) and devices:
+            pai_cert = dac_issuer.DacIssuer.load_pai(pai_cert_path, pai_key_path)[0]
+            pai_vid = dac_issuer.DacIssuer.get_pai_vid(pai_cert)
+            if pai_vid != vid:
+                raise ValueError("The development PAI is for VID {}, give a PAA "
+                                 "to issue a PAI for VID {}".format(pai_vid, vid))
+
+        workers = workers or os.cpu_count() or 1
+        chunk_size = max(1, -(-len(devices) // (workers * DAC_BATCH_CHUNKS_PER_WORKER)))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for pid in pai_paths:
+                pid_devices = [device for device in devices if device[0] == pid]
+                for offset in range(0, len(pid_devices), chunk_size):
+                    futures.append(executor.submit(
+                        DacBatchIssuer.issue_chunk, pai_paths[pid][0], pai_paths[pid][1],
+                        vid, work_path, pid_devices[offset:offset + chunk_size]))
+            for future in futures:
+                report["issued"] += future.result()
+        report["elapsed"] = time.perf_counter() - start
+        logging.info("Issued {} DACs in {:.2f}s ({:.1f} DACs/s) with {} processes".format(
+            report["issued"], report["elapsed"],
+            report["issued"] / report["elapsed"] if report["elapsed"] > 0 else 0.0,
+            workers))
+        return report
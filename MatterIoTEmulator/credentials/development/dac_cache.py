@@ -0,0 +1,360 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import logging
+import os
+import threading
+import time
+from utils.atomic_file import AtomicFile
+from utils.device_registry import DeviceRegistry
+from constants import *
+
+DAC_WORK_PATH = os.path.dirname(os.path.realpath(__file__)) + '/dac-temp/'
+
+# Files of one DAC, "{}" is <vid>-<pid>-<sn>. Cert.pem is written last.
+DAC_FILE_FORMATS = [
+    "DAC-{}-Key.pem",
+    "DAC-{}-Cert.der",
+    "kDevelopmentDAC-Cert-{}.txt",
+    "kDevelopmentDAC-PublicKey-{}.txt",
+    "kDevelopmentDAC-PrivateKey-{}.txt",
+    "DAC-{}-Cert.pem"]
+
+
+class DacCache():
+    """Class for indexing the DAC files in dac-temp/ and issuing the DACs of
+    the next devices ahead of time
+
+    The index maps (vid, pid, sn) to the DAC files found by one scan of
+    dac-temp/, so GenDacTool knows whether a device has its DAC without
+    touching the disk. Issuing goes through ensure(), which lets one thread
+    at a time create the files of a key.
+
+    The background service runs a pass every interval seconds: it rescans
+    dac-temp/, removes the entries no stored device uses and which are not
+    listed in the pin file (DAC_CACHE_PIN_FILE) (incomplete ones
+    after DAC_CACHE_INCOMPLETE_GRACE seconds, complete ones after
+    DAC_CACHE_MAX_AGE_DAYS or beyond DAC_CACHE_MAX_UNUSED), then, while the
+    application is idle, issues the DACs of the serial numbers it will hand
+    out next. The owner of the service hands those and the idle state over
+    with update(), the pass never calls back into the application.
+    """
+
+    lock = threading.Condition()
+    index = None
+    pending = set()
+    hits = 0
+    misses = 0
+
+    def __init__(self, vid, issuer, interval=DAC_CACHE_INTERVAL):
+        """Create a new `DacCache` service.
+        :param vid: Vendor ID in hex of the DACs,
+        issuer: DacIssuer used for pre-issuing, None to only evict,
+        interval: seconds between two passes
+        """
+        self.vid = vid
+        self.issuer = issuer
+        self.interval = interval
+        self.wanted = []
+        self.idle = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def get_base_name(key):
+        """
+        Return the <vid>-<pid>-<sn> part of the file names of a key
+        :param key: (vid, pid, sn)
+        """
+        return "{}-{}-{}".format(*key)
+
+    @staticmethod
+    def parse_name(name):
+        """
+        Return the key of a DAC file name, or None
+        :param name: file name in dac-temp/
+        """
+        for file_format in DAC_FILE_FORMATS:
+            prefix, suffix = file_format.split("{}")
+            if name.startswith(prefix) and name.endswith(suffix):
+                parts = name[len(prefix):len(name) - len(suffix)].split("-")
+                if len(parts) == 3:
+                    return tuple(parts)
+        return None
+
+    @staticmethod
+    def scan():
+        """
+        Return the index {key: {"files": set of names, "mtime": newest mtime}}
+        of dac-temp/
+        """
+        index = {}
+        try:
+            entries = list(os.scandir(DAC_WORK_PATH))
+        except FileNotFoundError:
+            return index
+        for entry in entries:
+            key = DacCache.parse_name(entry.name)
+            if key is None:
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            item = index.setdefault(key, {"files": set(), "mtime": 0})
+            item["files"].add(entry.name)
+            item["mtime"] = max(item["mtime"], mtime)
+        return index
+
+    @staticmethod
+    def is_complete(item):
+        """
+        Check an index entry has all DAC files
+        :param item: index entry
+        """
+        return (item is not None) and (len(item["files"]) == len(DAC_FILE_FORMATS))
+
+    @staticmethod
+    def load_index():
+        """Scan dac-temp/ the first time. The caller must hold the lock."""
+        if DacCache.index is None:
+            DacCache.index = DacCache.scan()
+
+    @staticmethod
+    def contains(vid, pid, sn):
+        """
+        Check all DAC files of a device exist
+        :param vid: Vendor ID in hex, pid: Product ID in hex, sn: Serial number
+        """
+        with DacCache.lock:
+            DacCache.load_index()
+            return DacCache.is_complete(DacCache.index.get((vid, pid, str(sn))))
+
+    @staticmethod
+    def add(vid, pid, sn):
+        """
+        Record that all DAC files of a device were created
+        :param vid: Vendor ID in hex, pid: Product ID in hex, sn: Serial number
+        """
+        key = (vid, pid, str(sn))
+        base_name = DacCache.get_base_name(key)
+        with DacCache.lock:
+            DacCache.load_index()
+            DacCache.index[key] = {
+                "files": set(file_format.format(base_name)
+                             for file_format in DAC_FILE_FORMATS),
+                "mtime": time.time()}
+
+    @staticmethod
+    def ensure(vid, pid, sn, create):
+        """
+        Create the DAC files of a device unless they are in the index
+        :param vid: Vendor ID in hex, pid: Product ID in hex, sn: Serial number,
+        create: function writing the files
+        :return: True if the files were created, False if they were cached
+        """
+        key = (vid, pid, str(sn))
+        with DacCache.lock:
+            DacCache.load_index()
+            while key in DacCache.pending:
+                DacCache.lock.wait()
+            if DacCache.is_complete(DacCache.index.get(key)):
+                DacCache.hits += 1
+                return False
+            DacCache.misses += 1
+            DacCache.pending.add(key)
+        try:
+            create()
+            DacCache.add(vid, pid, sn)
+        finally:
+            with DacCache.lock:
+                DacCache.pending.discard(key)
+                DacCache.lock.notify_all()
+        return True
+
+    @staticmethod
+    def remove(key):
+        """
+        Remove the DAC files of a key. The caller must hold the lock.
+        :param key: (vid, pid, sn)
+        """
+        for name in DacCache.index.pop(key, {"files": ()})["files"]:
+            try:
+                os.unlink(DAC_WORK_PATH + name)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def discard(vid, pid, sn):
+        """
+        Remove what is left of the DAC files of a device
+        :param vid: Vendor ID in hex, pid: Product ID in hex, sn: Serial number
+        """
+        with DacCache.lock:
+            DacCache.load_index()
+            DacCache.remove((vid, pid, str(sn)))
+
+    @staticmethod
+    def get_pinned_keys():
+        """Return the keys listed in the pin file of dac-temp/"""
+        try:
+            with open(DAC_WORK_PATH + DAC_CACHE_PIN_FILE) as file:
+                lines = file.read().split()
+        except FileNotFoundError:
+            return set()
+        return set(tuple(line.split("-")) for line in lines if line.count("-") == 2)
+
+    @staticmethod
+    def pin(keys):
+        """
+        Keep the DACs of keys whether a stored device uses them or not,
+        e.g. the DACs issued by fleet_cli dac for devices created later
+        :param keys: [(vid, pid, sn)]
+        """
+        with DacCache.lock:
+            pinned = DacCache.get_pinned_keys()
+            keys = set((vid, pid, str(sn)) for vid, pid, sn in keys) - pinned
+            if not keys:
+                return
+            os.makedirs(DAC_WORK_PATH, exist_ok=True)
+            AtomicFile.write_text(DAC_WORK_PATH + DAC_CACHE_PIN_FILE, "".join(
+                DacCache.get_base_name(key) + "\n" for key in sorted(pinned | keys)))
+
+    @staticmethod
+    def unpin(keys):
+        """
+        Let the DAC cache evict the DACs of keys again
+        :param keys: [(vid, pid, sn)]
+        """
+        with DacCache.lock:
+            pinned = DacCache.get_pinned_keys()
+            keys = set((vid, pid, str(sn)) for vid, pid, sn in keys) & pinned
+            if keys:
+                AtomicFile.write_text(DAC_WORK_PATH + DAC_CACHE_PIN_FILE, "".join(
+                    DacCache.get_base_name(key) + "\n" for key in sorted(pinned - keys)))
+
+    @staticmethod
+    def get_used_keys(vid):
+        """
+        Return the keys of the devices stored in temp/ and the pinned keys
+        :param vid: Vendor ID in hex of the DACs
+        """
+        used = DacCache.get_pinned_keys()
+        for item in DeviceRegistry.list_devices():
+            try:
+                used.add((vid, f"{int(item['product-id']):x}", str(item['serial-num'])))
+            except (KeyError, TypeError, ValueError):
+                continue
+        return used
+
+    @staticmethod
+    def evict(protected, now):
+        """
+        Remove the unused entries
+        :param protected: keys which must be kept, now: current time
+        :return: number of removed entries
+        """
+        removed = 0
+        with DacCache.lock:
+            DacCache.load_index()
+            unused = [(item["mtime"], key) for key, item in DacCache.index.items()
+                      if (key not in protected) and (key not in DacCache.pending) and
+                      (now - item["mtime"] > DAC_CACHE_INCOMPLETE_GRACE)]
+            unused.sort()
+            count = len(unused)
+            for mtime, key in unused:
+                if ((not DacCache.is_complete(DacCache.index[key])) or
+                        (now - mtime > DAC_CACHE_MAX_AGE_DAYS * 86400) or
+                        (count > DAC_CACHE_MAX_UNUSED)):
+                    DacCache.remove(key)
+                    count -= 1
+                    removed += 1
+        return removed
+
+    def update(self, wanted, idle):
+        """
+        Hand over the devices to pre-issue and whether the application is
+        idle, e.g. from a timer of the UI thread
+        :param wanted: [(pid, sn)] to pre-issue, pid in hex,
+        idle: True when pre-issuing can run
+        """
+        self.wanted = list(wanted)
+        self.idle = idle
+
+    def run_once(self, now=None):
+        """
+        Refresh the index, evict unused entries and pre-issue while idle
+        :param now: current time (default = time.time())
+        :return: report {indexed, removed, issued, hits, misses}
+        """
+        now = time.time() if now is None else now
+        report = {"indexed": 0, "removed": 0, "issued": 0}
+        scan_time = time.time()
+        index = DacCache.scan()
+        with DacCache.lock:
+            for key, item in (DacCache.index or {}).items():
+                # added by ensure() while scanning
+                if item["mtime"] >= scan_time:
+                    index[key] = item
+            DacCache.index = index
+        wanted = [(self.vid, pid, str(sn)) for pid, sn in self.wanted]
+        protected = DacCache.get_used_keys(self.vid) | set(wanted)
+        report["removed"] = DacCache.evict(protected, now)
+
+        if self.issuer is not None:
+            for key in wanted:
+                if self._stop.is_set() or (not self.idle):
+                    break
+                try:
+                    if DacCache.ensure(*key, lambda: self.issuer.write(
+                            DAC_WORK_PATH, key[1], key[2])):
+                        report["issued"] += 1
+                except (OSError, ValueError) as err:
+                    logging.warning("Fail to pre-issue DAC {}: {}".format(
+                        DacCache.get_base_name(key), err))
+                    break
+        with DacCache.lock:
+            report["indexed"] = len(DacCache.index)
+            report["hits"] = DacCache.hits
+            report["misses"] = DacCache.misses
+        return report
+
+    def start(self):
+        """Run the passes in a background thread"""
+        os.makedirs(DAC_WORK_PATH, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="DacCache")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread after the current DAC"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def run(self):
+        """Run a pass every interval seconds until stop() is called"""
+        while not self._stop.wait(self.interval):
+            try:
+                report = self.run_once()
+                if report["removed"] or report["issued"]:
+                    logging.info("DAC cache: {}".format(report))
+            except Exception as err:
+                # Keep the service running
+                logging.error("DAC cache pass failed: {}".format(err))
@@ -0,0 +1,266 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import datetime
+import os
+import secrets
+import threading
+
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID, ObjectIdentifier
+except ImportError:
+    x509 = None
+
+# Matter DN attributes
+OID_MATTER_VID = "1.3.6.1.4.1.37244.2.1"
+OID_MATTER_PID = "1.3.6.1.4.1.37244.2.2"
+
+# Same values as the chip-cert command line of GenDacTool
+DAC_SUBJECT_CN = "Matter Dev DAC 0xFFF1/0x8000"
+DAC_VALID_FROM = datetime.datetime(2022, 2, 5, 0, 0, 0)
+# chip-cert lifetime 4294967295 days: no well-defined expiration date
+DAC_VALID_TO = datetime.datetime(9999, 12, 31, 23, 59, 59)
+
+# openssl ec -text prints 15 bytes per line, od -t x1 16
+EC_TEXT_BYTES_PER_LINE = 15
+OD_BYTES_PER_LINE = 16
+EC_PRIVATE_KEY_LEN = 32
+
+
+def is_available():
+    """Return True if the cryptography package is installed"""
+    return x509 is not None
+
+
+class DacIssuer():
+    """Class for issuing device attestation certificates (DAC) in process
+
+    The certificate has the same content as the one of
+    `chip-cert gen-att-cert --type d` used by GenDacTool: the subject CN,
+    VID and PID as UTF8String, the PAI subject as issuer, notBefore
+    2022-02-05, notAfter 99991231235959Z, a random positive 63-bit serial
+    number and the extensions basicConstraints (critical, CA:FALSE),
+    keyUsage (critical, digitalSignature), subjectKeyIdentifier and
+    authorityKeyIdentifier in that order, signed with ecdsa-with-SHA256.
+    The key and signature are random, so two runs never give the same bytes.
+
+    The .txt files have the bytes the openssl/od/sed pipelines of
+    GenDacTool.generate_txt write (OpenSSL 3 text output).
+    """
+
+    lock = threading.Lock()
+    pai_cache = {}
+
+    def __init__(self, pai_cert_path, pai_key_path, vid="FFF1"):
+        """Create a new `DacIssuer`.
+        :param pai_cert_path: PAI certificate (PEM), pai_key_path: PAI key (PEM),
+        vid: vendor id in upper case hex
+        """
+        if not is_available():
+            raise RuntimeError("The cryptography package is not installed")
+        self.vid = vid
+        self.pai_cert, self.pai_key, self.pai_ski = DacIssuer.load_pai(
+            pai_cert_path, pai_key_path)
+
+    @staticmethod
+    def load_pai(pai_cert_path, pai_key_path):
+        """
+        Load a PAI certificate and key once per process
+        :param pai_cert_path: PAI certificate (PEM), pai_key_path: PAI key (PEM)
+        :return: certificate, private key, subject key identifier
+        """
+        key = (pai_cert_path, pai_key_path)
+        with DacIssuer.lock:
+            if key not in DacIssuer.pai_cache:
+                with open(pai_cert_path, "rb") as file:
+                    pai_cert = x509.load_pem_x509_certificate(file.read())
+                with open(pai_key_path, "rb") as file:
+                    pai_key = serialization.load_pem_private_key(file.read(), None)
+                pai_ski = pai_cert.extensions.get_extension_for_class(
+                    x509.SubjectKeyIdentifier).value
+                DacIssuer.pai_cache[key] = (pai_cert, pai_key, pai_ski)
+            return DacIssuer.pai_cache[key]
+
+    @staticmethod
+    def get_pai_vid(pai_cert):
+        """
+        Return the VID attribute of a PAI subject in upper case, or None
+        :param pai_cert: PAI certificate
+        """
+        attributes = pai_cert.subject.get_attributes_for_oid(ObjectIdentifier(OID_MATTER_VID))
+        return attributes[0].value.upper() if attributes else None
+
+    @staticmethod
+    def issue_pai(paa_cert_path, paa_key_path, vid, pid, work_path):
+        """
+        Issue a PAI for one product and write its files
+        PAI-<vid>-<pid>-Key.pem, PAI-<vid>-<pid>-Cert.pem and PAI-<vid>-<pid>-Cert.der
+        :param paa_cert_path: PAA certificate (PEM), paa_key_path: PAA key (PEM),
+        vid: Vendor ID in hex, pid: Product ID in hex, work_path: output folder
+        :return: PAI certificate path, PAI key path
+        """
+        with open(paa_cert_path, "rb") as file:
+            paa_cert = x509.load_pem_x509_certificate(file.read())
+        with open(paa_key_path, "rb") as file:
+            paa_key = serialization.load_pem_private_key(file.read(), None)
+        paa_ski = paa_cert.extensions.get_extension_for_class(
+            x509.SubjectKeyIdentifier).value
+        private_key = ec.generate_private_key(ec.SECP256R1())
+        public_key = private_key.public_key()
+        subject = x509.Name([
+            x509.NameAttribute(NameOID.COMMON_NAME, "Matter Dev PAI 0x{} 0x{}".format(
+                vid.upper(), pid.upper())),
+            x509.NameAttribute(ObjectIdentifier(OID_MATTER_VID), vid.upper()),
+            x509.NameAttribute(ObjectIdentifier(OID_MATTER_PID), pid.upper().zfill(4))])
+        cert = x509.CertificateBuilder().subject_name(
+            subject).issuer_name(
+            paa_cert.subject).public_key(
+            public_key).serial_number(
+            secrets.randbits(63) or 1).not_valid_before(
+            DAC_VALID_FROM).not_valid_after(
+            DAC_VALID_TO).add_extension(
+            x509.BasicConstraints(ca=True, path_length=0), critical=True).add_extension(
+            x509.KeyUsage(digital_signature=False, content_commitment=False,
+                          key_encipherment=False, data_encipherment=False,
+                          key_agreement=False, key_cert_sign=True, crl_sign=True,
+                          encipher_only=False, decipher_only=False),
+            critical=True).add_extension(
+            x509.SubjectKeyIdentifier.from_public_key(public_key), critical=False).add_extension(
+            x509.AuthorityKeyIdentifier.from_issuer_subject_key_identifier(paa_ski),
+            critical=False).sign(paa_key, hashes.SHA256())
+
+        base_path = os.path.join(work_path, "PAI-{}-{}".format(vid.upper(), pid))
+        files = {
+            base_path + "-Key.pem": private_key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.TraditionalOpenSSL,
+                serialization.NoEncryption()),
+            base_path + "-Cert.der": cert.public_bytes(serialization.Encoding.DER),
+            base_path + "-Cert.pem": cert.public_bytes(serialization.Encoding.PEM)}
+        for path, content in files.items():
+            with open(path + ".tmp", "wb") as file:
+                file.write(content)
+            os.replace(path + ".tmp", path)
+        return base_path + "-Cert.pem", base_path + "-Key.pem"
+
+    def issue(self, pid, sn):
+        """
+        Issue a DAC
+        :param pid: Product ID in hex as written in the file names, sn: Serial number
+        :return: dictionary of file name to file content (bytes)
+        """
+        private_key = ec.generate_private_key(ec.SECP256R1())
+        public_key = private_key.public_key()
+        subject = x509.Name([
+            x509.NameAttribute(NameOID.COMMON_NAME, DAC_SUBJECT_CN),
+            x509.NameAttribute(ObjectIdentifier(OID_MATTER_VID), self.vid.upper()),
+            x509.NameAttribute(ObjectIdentifier(OID_MATTER_PID), pid.upper().zfill(4))])
+        cert = x509.CertificateBuilder().subject_name(
+            subject).issuer_name(
+            self.pai_cert.subject).public_key(
+            public_key).serial_number(
+            secrets.randbits(63) or 1).not_valid_before(
+            DAC_VALID_FROM).not_valid_after(
+            DAC_VALID_TO).add_extension(
+            x509.BasicConstraints(ca=False, path_length=None), critical=True).add_extension(
+            x509.KeyUsage(digital_signature=True, content_commitment=False,
+                          key_encipherment=False, data_encipherment=False,
+                          key_agreement=False, key_cert_sign=False, crl_sign=False,
+                          encipher_only=False, decipher_only=False),
+            critical=True).add_extension(
+            x509.SubjectKeyIdentifier.from_public_key(public_key), critical=False).add_extension(
+            x509.AuthorityKeyIdentifier.from_issuer_subject_key_identifier(self.pai_ski),
+            critical=False).sign(self.pai_key, hashes.SHA256())
+
+        cert_der = cert.public_bytes(serialization.Encoding.DER)
+        private_value = private_key.private_numbers().private_value.to_bytes(
+            EC_PRIVATE_KEY_LEN, "big")
+        public_point = public_key.public_bytes(
+            serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint)
+
+        base_name = "{}-{}-{}".format(self.vid, pid, sn)
+        return {
+            "DAC-{}-Key.pem".format(base_name): private_key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.TraditionalOpenSSL,
+                serialization.NoEncryption()),
+            "DAC-{}-Cert.der".format(base_name): cert_der,
+            "kDevelopmentDAC-Cert-{}.txt".format(base_name):
+                DacIssuer.format_od_array(cert_der),
+            "kDevelopmentDAC-PublicKey-{}.txt".format(base_name):
+                DacIssuer.format_ec_array(public_point),
+            "kDevelopmentDAC-PrivateKey-{}.txt".format(base_name):
+                DacIssuer.format_ec_array(private_value),
+            # Last: GenDacTool skips the device when this file exists
+            "DAC-{}-Cert.pem".format(base_name): cert.public_bytes(
+                serialization.Encoding.PEM)}
+
+    @staticmethod
+    def format_od_array(data):
+        """
+        Return the text of `od -t x1 -An | sed 's/\\</0x/g' | sed 's/\\>/,/g' | sed 's/^/   /g'`
+        :param data: bytes
+        """
+        lines = []
+        previous = None
+        is_repeated = False
+        for offset in range(0, len(data), OD_BYTES_PER_LINE):
+            chunk = data[offset:offset + OD_BYTES_PER_LINE]
+            # od prints "*" once for identical consecutive full lines
+            if chunk == previous and len(chunk) == OD_BYTES_PER_LINE:
+                if not is_repeated:
+                    lines.append("   *")
+                    is_repeated = True
+                continue
+            previous = chunk
+            is_repeated = False
+            lines.append("   " + "".join(" 0x{:02x},".format(byte) for byte in chunk))
+        return ("\n".join(lines) + "\n").encode("ascii")
+
+    @staticmethod
+    def format_ec_array(data):
+        """
+        Return the text of a priv: or pub: block of `openssl ec -text` after
+        `sed 's/\\([0-9a-fA-F][0-9a-fA-F]\\)/0x\\1/g' | sed 's/:/, /g'`
+        :param data: bytes
+        """
+        lines = []
+        for offset in range(0, len(data), EC_TEXT_BYTES_PER_LINE):
+            chunk = data[offset:offset + EC_TEXT_BYTES_PER_LINE]
+            is_last = offset + EC_TEXT_BYTES_PER_LINE >= len(data)
+            line = "    " + ", ".join("0x{:02x}".format(byte) for byte in chunk)
+            lines.append(line if is_last else line + ", ")
+        return ("\n".join(lines) + "\n").encode("ascii")
+
+    def write(self, work_path, pid, sn):
+        """
+        Issue a DAC and write its files
+        :param work_path: DAC folder, pid: Product ID in hex, sn: Serial number
+        :return: list of written file paths
+        """
+        paths = []
+        for name, content in self.issue(pid, sn).items():
+            path = os.path.join(work_path, name)
+            temp_path = path + ".tmp"
+            with open(temp_path, "wb") as file:
+                file.write(content)
+            os.replace(temp_path, path)
+            paths.append(path)
+        return paths
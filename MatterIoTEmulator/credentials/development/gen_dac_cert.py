@@ -26,6 +26,8 @@ import configparser
 import time
 import glob
 from constants import CHIP_FACTORY_FILE
+from credentials.development import dac_issuer
+from credentials.development.dac_cache import DacCache
 
 # Last Update
 SCRIPT_VERSION_INFO = "2024/05/06"
@@ -126,8 +128,6 @@ class GenDacTool():
         config_file = self.CHIP_CONFIG_PATH + CHIP_FACTORY_FILE
         Log.info("Read Config File : %s", config_file)
 
-        self.execute_cmd("cat " + config_file)
-
         try:
             with open(config_file) as file:
                 config = configparser.ConfigParser()
@@ -204,9 +204,11 @@ class GenDacTool():
         dac_cert_path = WORK_PATH + dac_cert_file
 
         no_need_to_next_step = False
-        if (self.check_file_isExist("{}.pem".format(dac_cert_path))):
+        if DacCache.contains(vid, pid, sn):
             no_need_to_next_step = True
             return no_need_to_next_step, dac_key_path, dac_cert_path
+        # generate_txt() appends, start from no file
+        DacCache.discard(vid, pid, sn)
         # Log.info("pid : %s", pid)
         gen_cmd = CHIP_CERT_TOOL + " gen-att-cert" + " --type d " + \
             " --subject-cn \"Matter Dev DAC 0xFFF1/0x8000\"" + \
@@ -220,12 +222,27 @@ class GenDacTool():
             " --out         \"{}.pem\"".format(dac_cert_path)
         self.execute_cmd(gen_cmd)
 
-        display_cmd = "openssl x509 -noout -text -in " + \
-            "{}.pem".format(dac_cert_path)
+        return no_need_to_next_step, dac_key_path, dac_cert_path
 
-        self.execute_cmd(display_cmd)
+    def issue_DAC(self, pid, sn):
+        """
+        Generate all device attestation files with the cryptography package
+        :param pid: Product ID, sn: Serial number
+        :return: True if the files were created, False if they already exist
+        """
+        os.makedirs(WORK_PATH, exist_ok=True)
+        issuer = GenDacTool.get_issuer()
+        return DacCache.ensure(
+            vid, pid, sn, lambda: issuer.write(WORK_PATH, pid, sn))
 
-        return no_need_to_next_step, dac_key_path, dac_cert_path
+    @staticmethod
+    def get_issuer():
+        """
+        Return the in process DAC issuer, None without the cryptography package
+        """
+        if not dac_issuer.is_available():
+            return None
+        return dac_issuer.DacIssuer(pai_cert_path, pai_key_path, vid)
 
     def convert_DAC(self, dac_cert_path):
         """
@@ -305,6 +322,11 @@ class GenDacTool():
             pid, sn = self.read_config()
 
             # step 3) Generate DAC
+            if dac_issuer.is_available():
+                # Sign in process, no chip-cert/openssl processes
+                self.issue_DAC(pid, sn)
+                Log.info("The DAC files were successfully created.")
+                return True
             no_need_to_next_step, dac_key_path, dac_cert_path = self.generate_DAC(
                 pid, sn)
 
@@ -317,6 +339,7 @@ class GenDacTool():
 
                 # step 6) Display file list
                 self.display_filelist(WORK_PATH)
+                DacCache.add(vid, pid, sn)
             # step 7) Result message
             Log.info("The DAC files were successfully created.")
             return True
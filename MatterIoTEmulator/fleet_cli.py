@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import argparse
+import csv
+import logging
+import os
+import sys
+import time
+from credentials.development.dac_batch import DacBatchIssuer
+from credentials.development.dac_cache import DAC_WORK_PATH
+from setup_payload.generate_setup_payload import format_payload_file, generate_bulk
+from setup_payload.parse_setup_payload import parse
+from utils.atomic_file import AtomicFile
+from utils.device_clone import DeviceCloner, LINK_MODES
+from utils.device_registry import DeviceRegistry
+from utils.fleet_archive import FleetArchive, READDRESS_MODES
+from utils.fleet_provisioner import FleetManifest, FleetProvisioner
+from utils.identity_allocator import IdentityAllocator
+from utils.onboarding_sheet import OnboardingSheet, SHEET_FORMATS
+from constants import DAC_CACHE_PIN_FILE, PROVISION_WORKERS, QR_IMAGE_BOX_SIZE
+
+
+def cmd_snapshot(args):
+    """
+    Capture a commissioned device.
+
+    Arguments:
+        args {Namespace} -- the parsed arguments
+    """
+    path = DeviceCloner.snapshot(args.targetid, args.name, args.mode)
+    print(path)
+    return 0
+
+
+def cmd_clone(args):
+    """
+    Create commissioned devices from a snapshot.
+
+    Arguments:
+        args {Namespace} -- the parsed arguments
+    """
+    start = time.perf_counter()
+    list_targetid = DeviceCloner.clone(
+        args.snapshot, args.count, args.start_serial, args.mode,
+        args.shared_identity)
+    elapsed = time.perf_counter() - start
+    for targetid in list_targetid:
+        print(targetid)
+    logging.info("{} devices in {:.2f}s".format(len(list_targetid), elapsed))
+    return 0
+
+
+def cmd_provision(args):
+    """
+    Validate a fleet manifest, optionally prepare its devices, and print
+    their identities and onboarding codes.
+
+    Arguments:
+        args {Namespace} -- the parsed arguments
+    """
+    devices = FleetManifest.expand(FleetManifest.load(args.manifest), args.limit)
+    if args.prepare:
+        results, elapsed = FleetProvisioner.prepare(devices, args.workers)
+    else:
+        codes = generate_bulk([(device['pin-code'], device['discriminator'],
+                                device['vendor-id'], device['product-id'])
+                               for device in devices])
+        results = [dict(device, error="", qrcode=qrcode, **{'manual-code': manual_code})
+                   for device, (qrcode, manual_code) in zip(devices, codes)]
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["targetId", "device-type", "serial-num", "discriminator",
+                     "pin-code", "qrcode", "manual-code", "error"])
+    for result in results:
+        writer.writerow([result['targetId'], result['device-type'],
+                         result['serial-num'], result['discriminator'],
+                         result['pin-code'], result.get('qrcode', ""),
+                         result.get('manual-code', ""), result['error']])
+    return 1 if any(result['error'] for result in results) else 0
+
+
+def cmd_export(args):
+    """
+    Write commissioned devices to a fleet archive.
+
+    Arguments:
+        args {Namespace} -- the parsed arguments
+    """
+    start = time.perf_counter()
+    if args.output == "-":
+        list_targetid = FleetArchive.export_fleet(
+            sys.stdout.buffer, args.targetid, args.gzip)
+    else:
+        with open(args.output, "wb") as file:
+            list_targetid = FleetArchive.export_fleet(file, args.targetid, args.gzip)
+    logging.info("{} devices in {:.2f}s".format(
+        len(list_targetid), time.perf_counter() - start))
+    return 0
+
+
+def cmd_import(args):
+    """
+    Restore the devices of a fleet archive.
+
+    Arguments:
+        args {Namespace} -- the parsed arguments
+    """
+    start = time.perf_counter()
+    if args.input == "-":
+        list_targetid = FleetArchive.import_fleet(
+            sys.stdin.buffer, args.readdress, args.replace)
+    else:
+        with open(args.input, "rb") as file:
+            list_targetid = FleetArchive.import_fleet(file, args.readdress, args.replace)
+    for targetid in list_targetid:
+        print(targetid)
+    logging.info("{} devices in {:.2f}s".format(
+        len(list_targetid), time.perf_counter() - start))
+    return 0
+
+
+def cmd_dac(args):
+    """
+    Issue the DACs of a product id and serial range or of a fleet manifest.
+
+    Arguments:
+        args {Namespace} -- the parsed arguments
+    """
+    if args.manifest:
+        devices = [(f"{device['product-id']:x}", str(device['serial-num']))
+                   for device in FleetManifest.expand(
+                       FleetManifest.load(args.manifest), sys.maxsize)]
+    elif args.pid and args.serial:
+        first_pid, last_pid = DacBatchIssuer.parse_range(args.pid)
+        first_serial, last_serial = DacBatchIssuer.parse_range(args.serial)
+        devices = [(f"{pid:x}", str(serial))
+                   for pid in range(first_pid, last_pid + 1)
+                   for serial in range(first_serial, last_serial + 1)]
+    else:
+        raise ValueError("Give --manifest, or --pid and --serial")
+    if bool(args.paa_cert) != bool(args.paa_key):
+        raise ValueError("--paa-cert and --paa-key go together")
+    paa = (args.paa_cert, args.paa_key) if args.paa_cert else None
+    report = DacBatchIssuer.issue(
+        devices, f"{int(args.vid, 0):X}", args.workers, args.output, paa, args.force)
+    for path in report["pai"]:
+        print(path)
+    print("{} DACs issued, {} existing skipped, {:.2f}s, {:.1f} DACs/s".format(
+        report["issued"], report["skipped"], report["elapsed"],
+        report["issued"] / report["elapsed"] if report["elapsed"] > 0 else 0.0))
+    return 0
+
+
+def get_payload_devices(args):
+    """
+    Return the [(targetId, pincode, discriminator, vid, pid)] of a fleet
+    manifest or of the stored devices.
+
+    Arguments:
+        args {Namespace} -- the parsed arguments
+    """
+    if args.manifest:
+        return [(device['targetId'], device['pin-code'], device['discriminator'],
+                 device['vendor-id'], device['product-id'])
+                for device in FleetManifest.expand(
+                    FleetManifest.load(args.manifest), sys.maxsize)]
+    DeviceRegistry.sync()
+    devices = []
+    for item in DeviceRegistry.list_devices():
+        if args.targetid and (item['targetId'] not in args.targetid):
+            continue
+        try:
+            devices.append((item['targetId'], int(item['pin-code']),
+                            int(item['discriminator']), int(item['vendor-id']),
+                            int(item['product-id'])))
+        except ValueError:
+            logging.warning("Skip {}, invalid identity".format(item['targetId']))
+    missing = set(args.targetid or ()) - set(device[0] for device in devices)
+    if missing:
+        raise ValueError("Unknown devices: {}".format(", ".join(sorted(missing))))
+    return devices
+
+
+def cmd_payload(args):
+    """
+    Write the onboarding payloads of devices: a csv of the codes, the
+    qrcodetool input files or the QR code images.
+
+    Arguments:
+        args {Namespace} -- the parsed arguments
+    """
+    devices = get_payload_devices(args)
+    codes = generate_bulk([device[1:] for device in devices])
+    if args.format == "csv":
+        rows = [["targetId", "vendor-id", "product-id", "discriminator", "pin-code",
+                 "qrcode", "manual-code"]]
+        rows += [[targetid, vid, pid, discriminator, pincode, qrcode_payload, manual_code]
+                 for (targetid, pincode, discriminator, vid, pid),
+                 (qrcode_payload, manual_code) in zip(devices, codes)]
+        if args.output == "-":
+            csv.writer(sys.stdout).writerows(rows)
+        else:
+            with open(args.output, "w", newline="") as file:
+                csv.writer(file).writerows(rows)
+        return 0
+
+    if args.output == "-":
+        raise ValueError("--output must be a folder for the {} format".format(args.format))
+    os.makedirs(args.output, exist_ok=True)
+    for (targetid, pincode, discriminator, vid, pid), (qrcode_payload, _) in zip(
+            devices, codes):
+        if args.format == "txt":
+            path = os.path.join(args.output, targetid + "-payload.txt")
+            AtomicFile.write_text(path, format_payload_file(pincode, discriminator, vid, pid))
+        else:
+            path = os.path.join(args.output, targetid + "-qrcode.png")
+            OnboardingSheet.render_image(qrcode_payload, QR_IMAGE_BOX_SIZE).save(path)
+        print(path)
+    return 0
+
+
+def cmd_lookup(args):
+    """
+    Print the stored devices matching an onboarding code or a discriminator.
+
+    Arguments:
+        args {Namespace} -- the parsed arguments
+    """
+    if args.code:
+        fields = parse(args.code)
+        short = 'short_discriminator' in fields
+        discriminator = fields['short_discriminator'] if short else fields['discriminator']
+        pincode = fields['pincode']
+    elif args.discriminator is not None:
+        short, discriminator, pincode = False, args.discriminator, None
+    else:
+        raise ValueError("Give a code or --discriminator")
+    list_targetid = [targetid for targetid in
+                     IdentityAllocator.lookup_discriminator(discriminator, short)
+                     if (pincode is None) or (IdentityAllocator.get(targetid)[1] == pincode)]
+    for targetid in list_targetid:
+        print(targetid)
+    return 0 if list_targetid else 1
+
+
+def cmd_sheet(args):
+    """
+    Write the QR codes and manual codes of the stored devices on one sheet.
+
+    Arguments:
+        args {Namespace} -- the parsed arguments
+    """
+    start = time.perf_counter()
+    paths, count = OnboardingSheet.export(args.output, args.targetid, args.format)
+    for path in paths:
+        print(path)
+    logging.info("{} devices in {:.2f}s".format(count, time.perf_counter() - start))
+    return 0
+
+
+def build_parser():
+    """
+    Return the argument parser of the fleet tool.
+    """
+    parser = argparse.ArgumentParser(
+        description="Matter emulator fleet tool, run it from the emulator folder "
+                    "while the emulator is closed.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    snapshot = subparsers.add_parser(
+        "snapshot", help="capture the KVS and factory config of a commissioned device")
+    snapshot.add_argument("targetid", help="target id of the device, e.g. fff18000-7e6")
+    snapshot.add_argument("--name", help="snapshot name (default: target id)")
+    snapshot.add_argument("--mode", choices=LINK_MODES, default="auto",
+                          help="how files are copied (default: auto)")
+    snapshot.set_defaults(func=cmd_snapshot)
+
+    clone = subparsers.add_parser(
+        "clone", help="create commissioned devices from a snapshot. The clones "
+                      "share the node id, operational key and NOC of the "
+                      "snapshot: a commissioner sees one node, not a fleet of "
+                      "distinct devices.")
+    clone.add_argument("snapshot", help="snapshot name")
+    clone.add_argument("--count", type=int, required=True, help="number of devices")
+    clone.add_argument("--start-serial", type=int,
+                       help="first serial number (default: next free one)")
+    clone.add_argument("--mode", choices=LINK_MODES, default="auto",
+                       help="how files are copied (default: auto)")
+    clone.add_argument("--shared-identity", action="store_true",
+                       help="allow --count above 1, all the clones being one node")
+    clone.set_defaults(func=cmd_clone)
+
+    provision = subparsers.add_parser(
+        "provision", help="validate a fleet manifest (.csv, .yaml) and print the "
+                          "devices with their onboarding codes. Import the "
+                          "manifest in the emulator to start the devices.")
+    provision.add_argument("manifest", help="fleet manifest file")
+    provision.add_argument("--prepare", action="store_true",
+                           help="also create the storage folders, rpc port leases "
+                                "and DACs")
+    provision.add_argument("--workers", type=int, default=PROVISION_WORKERS,
+                           help="number of parallel workers for --prepare "
+                                "(default: %(default)s)")
+    provision.add_argument("--limit", type=int,
+                           help="maximum number of devices "
+                                "(default: max_number_of_device of config.json)")
+    provision.set_defaults(func=cmd_provision)
+
+    export = subparsers.add_parser(
+        "export", help="write commissioned devices (storage folder and DAC) to a "
+                       "fleet archive")
+    export.add_argument("output", help="archive file, - for stdout")
+    export.add_argument("--targetid", action="append",
+                        help="device to export, can be repeated "
+                             "(default: all commissioned devices)")
+    export.add_argument("--gzip", action="store_true", help="compress the archive")
+    export.set_defaults(func=cmd_export)
+
+    restore = subparsers.add_parser(
+        "import", help="restore the devices of a fleet archive")
+    restore.add_argument("input", help="archive file, - for stdin")
+    restore.add_argument("--readdress", choices=READDRESS_MODES, default="auto",
+                         help="give new ip addresses: auto when they are not on the "
+                              "subnet of this host or conflict (default: auto)")
+    restore.add_argument("--replace", action="store_true",
+                         help="overwrite the devices which already exist")
+    restore.set_defaults(func=cmd_import)
+
+    dac = subparsers.add_parser(
+        "dac", help="issue the DACs of many devices with a pool of processes")
+    dac.add_argument("--vid", default="0xFFF1",
+                     help="vendor id of the DACs (default: %(default)s)")
+    dac.add_argument("--pid", help="product id or range, e.g. 0x8000-0x8003")
+    dac.add_argument("--serial", help="serial number or range, e.g. 1-1000")
+    dac.add_argument("--manifest", help="take the devices of a fleet manifest instead")
+    dac.add_argument("--workers", type=int,
+                     help="number of processes (default: number of cores)")
+    dac.add_argument("--output", default=DAC_WORK_PATH,
+                     help="output folder (default: the emulator DAC folder, where "
+                          "the DACs are listed in {} so the DAC cache of the "
+                          "application never evicts them; remove a line to let "
+                          "it)".format(DAC_CACHE_PIN_FILE))
+    dac.add_argument("--paa-cert", help="PAA certificate (PEM): issue a new PAI per "
+                                        "product id signed by this PAA, needs "
+                                        "--output as the emulator only attests "
+                                        "with its development PAI")
+    dac.add_argument("--paa-key", help="PAA private key (PEM)")
+    dac.add_argument("--force", action="store_true",
+                     help="issue again the DACs which exist in the output folder")
+    dac.set_defaults(func=cmd_dac)
+
+    payload = subparsers.add_parser(
+        "payload", help="write the onboarding payloads of the stored devices or of "
+                        "a fleet manifest")
+    payload.add_argument("--manifest", help="take the devices of a fleet manifest")
+    payload.add_argument("--targetid", action="append",
+                         help="stored device, can be repeated (default: all)")
+    payload.add_argument("--format", choices=["csv", "txt", "png"], default="csv",
+                         help="csv of the codes, qrcodetool input file or QR code "
+                              "image per device (default: %(default)s)")
+    payload.add_argument("--output", default="-",
+                         help="csv file or - for stdout, folder for txt and png "
+                              "(default: %(default)s)")
+    payload.set_defaults(func=cmd_payload)
+
+    lookup = subparsers.add_parser(
+        "lookup", help="find the stored devices of a QR code, manual pairing code "
+                       "or discriminator")
+    lookup.add_argument("code", nargs="?", help="QR code (MT:...) or manual pairing code")
+    lookup.add_argument("--discriminator", type=lambda text: int(text, 0),
+                        help="12 bit discriminator instead of a code")
+    lookup.set_defaults(func=cmd_lookup)
+
+    sheet = subparsers.add_parser(
+        "sheet", help="write the QR codes and manual codes of the stored devices "
+                      "on an HTML page or PNG/PDF pages")
+    sheet.add_argument("output", help="output file (.html, .png or .pdf)")
+    sheet.add_argument("--targetid", action="append",
+                       help="device to take, can be repeated (default: all)")
+    sheet.add_argument("--format", choices=SHEET_FORMATS,
+                       help="sheet format (default: output extension)")
+    sheet.set_defaults(func=cmd_sheet)
+    return parser
+
+
+def main(argv=None):
+    """
+    Run the fleet tool.
+
+    Arguments:
+        argv {[str]} -- the arguments (default = sys.argv[1:])
+    """
+    logging.basicConfig(level=logging.INFO,
+                        format="[%(asctime)s] %(levelname)s - %(message)s")
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as err:
+        logging.error(str(err))
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -15,8 +15,6 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
-# TODO: Implement the decode method
-
 CODES = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9',
          'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J',
          'K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R', 'S', 'T',
@@ -24,26 +22,53 @@ CODES = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9',
 RADIX = len(CODES)
 BASE38_CHARS_NEEDED_IN_CHUNK = [2, 4, 5]
 MAX_BYTES_IN_CHUNK = 3
+MAX_ENCODED_BYTES_IN_CHUNK = 5
+DECODE_TABLE = {code: value for value, code in enumerate(CODES)}
+# Number of bytes of a chunk of 2, 4 or 5 characters
+BYTES_IN_ENCODED_CHUNK = {2: 1, 4: 2, 5: 3}
+
+
+def encode_int(value, total_bytes):
+    """Encode the total_bytes little-endian bytes of an integer"""
+    codes = []
+    for i in range(0, total_bytes, MAX_BYTES_IN_CHUNK):
+        bytes_in_chunk = min(MAX_BYTES_IN_CHUNK, total_bytes - i)
+        chunk = value & ((1 << (8 * bytes_in_chunk)) - 1)
+        value >>= 8 * bytes_in_chunk
+        for _ in range(BASE38_CHARS_NEEDED_IN_CHUNK[bytes_in_chunk - 1]):
+            chunk, code = divmod(chunk, RADIX)
+            codes.append(CODES[code])
+    return ''.join(codes)
 
 
 def encode(bytes):
-    total_bytes = len(bytes)
-    qrcode = ''
+    return encode_int(int.from_bytes(bytearray(bytes), 'little'), len(bytes))
 
-    for i in range(0, total_bytes, MAX_BYTES_IN_CHUNK):
-        if (i + MAX_BYTES_IN_CHUNK) > total_bytes:
-            bytes_in_chunk = total_bytes - i
-        else:
-            bytes_in_chunk = MAX_BYTES_IN_CHUNK
-
-        value = 0
-        for j in range(i, i + bytes_in_chunk):
-            value = value + (bytes[j] << (8 * (j - i)))
-
-        base38_chars_needed = BASE38_CHARS_NEEDED_IN_CHUNK[bytes_in_chunk - 1]
-        while base38_chars_needed > 0:
-            qrcode += CODES[int(value % RADIX)]
-            value = int(value / RADIX)
-            base38_chars_needed -= 1
-
-    return qrcode
+
+def decode_int(qrcode):
+    """Return (integer, number of bytes) of a Base38 string
+
+    Raises ValueError if the string is not valid Base38.
+    """
+    value = 0
+    total_bytes = 0
+    for i in range(0, len(qrcode), MAX_ENCODED_BYTES_IN_CHUNK):
+        chunk_codes = qrcode[i:i + MAX_ENCODED_BYTES_IN_CHUNK]
+        bytes_in_chunk = BYTES_IN_ENCODED_CHUNK.get(len(chunk_codes))
+        if bytes_in_chunk is None:
+            raise ValueError('Invalid Base38 length {}'.format(len(qrcode)))
+        chunk = 0
+        for code in reversed(chunk_codes):
+            if code not in DECODE_TABLE:
+                raise ValueError('Invalid Base38 character {!r}'.format(code))
+            chunk = chunk * RADIX + DECODE_TABLE[code]
+        if chunk >> (8 * bytes_in_chunk):
+            raise ValueError('Base38 chunk {} out of range'.format(chunk_codes))
+        value |= chunk << (8 * total_bytes)
+        total_bytes += bytes_in_chunk
+    return value, total_bytes
+
+
+def decode(qrcode):
+    value, total_bytes = decode_int(qrcode)
+    return list(value.to_bytes(total_bytes, 'little'))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+#
+#    Copyright (c) 2024 LG Electronics, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+# Measure the setup payload encoder and check that every payload decodes
+# back to its fields. Run from the application folder:
+#     python3 -m setup_payload.bench_setup_payload --count 100000
+import argparse
+import random
+import time
+
+from setup_payload.generate_setup_payload import (
+    INVALID_PASSCODES, CommissioningFlow, SetupPayload, decode_qrcode, generate_bulk)
+
+
+def make_devices(count, seed):
+    rand = random.Random(seed)
+    devices = []
+    while len(devices) < count:
+        pincode = rand.randint(1, 99999998)
+        if pincode in INVALID_PASSCODES:
+            continue
+        devices.append((pincode, rand.randint(0, 4095),
+                        rand.randint(0, 65535), rand.randint(0, 65535)))
+    return devices
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Setup payload benchmark')
+    parser.add_argument('--count', type=int, default=100000,
+                        help='number of payloads (default 100000)')
+    parser.add_argument('--flow', type=int, default=int(CommissioningFlow.Standard),
+                        choices=[int(flow) for flow in CommissioningFlow])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    devices = make_devices(args.count, args.seed)
+
+    start = time.perf_counter()
+    codes = generate_bulk(devices, flow=args.flow)
+    elapsed_bulk = time.perf_counter() - start
+
+    payloads = SetupPayload()
+    start = time.perf_counter()
+    for pincode, discriminator, vid, pid in devices:
+        payloads.generate_qrcode(pincode, discriminator, flow=args.flow, vid=vid, pid=pid)
+        payloads.generate_manualcode(pincode, discriminator, flow=args.flow, vid=vid, pid=pid)
+    elapsed_single = time.perf_counter() - start
+
+    errors = 0
+    for (pincode, discriminator, vid, pid), (qrcode, _) in zip(devices, codes):
+        fields = decode_qrcode(qrcode)
+        if ((fields['pincode'], fields['discriminator'], fields['vid'], fields['pid'],
+             fields['flow']) != (pincode, discriminator, vid, pid, args.flow)):
+            errors += 1
+
+    for name, elapsed in (('bulk', elapsed_bulk), ('per device', elapsed_single)):
+        print('{:<11} {} payloads in {:.2f}s ({:.0f} payloads/s)'.format(
+            name, args.count, elapsed, args.count / elapsed))
+    print('round trip: {} of {} payloads decode to their fields'.format(
+        args.count - errors, args.count))
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
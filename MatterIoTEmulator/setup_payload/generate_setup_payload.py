@@ -17,11 +17,10 @@
 #
 import argparse
 import enum
+import functools
 import sys
 
 from setup_payload import Base38
-from bitarray import bitarray
-from stdnum.verhoeff import calc_check_digit
 
 # See section 5.1.4.1 Manual Pairing Code in the Matter specification v1.0
 MANUAL_DISCRIMINATOR_LEN = 4
@@ -58,6 +57,39 @@ QRCODE_PADDING_LEN = 4
 QRCODE_VERSION = 0
 QRCODE_PADDING = 0
 
+# Bit positions of the QR code payload, least significant bit first
+QRCODE_VERSION_POS = 0
+QRCODE_VID_POS = QRCODE_VERSION_POS + QRCODE_VERSION_LEN
+QRCODE_PID_POS = QRCODE_VID_POS + QRCODE_VID_LEN
+QRCODE_COMMISSIONING_FLOW_POS = QRCODE_PID_POS + QRCODE_PID_LEN
+QRCODE_DISCOVERY_CAP_BITMASK_POS = QRCODE_COMMISSIONING_FLOW_POS + \
+    QRCODE_COMMISSIONING_FLOW_LEN
+QRCODE_DISCRIMINATOR_POS = QRCODE_DISCOVERY_CAP_BITMASK_POS + \
+    QRCODE_DISCOVERY_CAP_BITMASK_LEN
+QRCODE_PINCODE_POS = QRCODE_DISCRIMINATOR_POS + QRCODE_DISCRIMINATOR_LEN
+QRCODE_PADDING_POS = QRCODE_PINCODE_POS + PINCODE_LEN
+QRCODE_PAYLOAD_LEN = (QRCODE_PADDING_POS + QRCODE_PADDING_LEN) // 8
+QRCODE_PREFIX = 'MT:'
+
+# Verhoeff check digit tables (dihedral group D5)
+VERHOEFF_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 2, 3, 4, 0, 6, 7, 8, 9, 5),
+    (2, 3, 4, 0, 1, 7, 8, 9, 5, 6), (3, 4, 0, 1, 2, 8, 9, 5, 6, 7),
+    (4, 0, 1, 2, 3, 9, 5, 6, 7, 8), (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2), (7, 6, 5, 9, 8, 2, 1, 0, 4, 3),
+    (8, 7, 6, 5, 9, 3, 2, 1, 0, 4), (9, 8, 7, 6, 5, 4, 3, 2, 1, 0))
+VERHOEFF_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 5, 7, 6, 2, 8, 3, 0, 9, 4),
+    (5, 8, 0, 3, 7, 9, 6, 1, 4, 2), (8, 9, 1, 6, 0, 4, 3, 5, 2, 7),
+    (9, 4, 5, 3, 1, 2, 6, 8, 7, 0), (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5), (7, 0, 4, 6, 9, 1, 3, 2, 5, 8))
+VERHOEFF_INV = (0, 4, 3, 2, 1, 5, 6, 7, 8, 9)
+# VERHOEFF_STEP[i % 8][checksum][digit]: checksum after the i-th digit from the right
+VERHOEFF_STEP = tuple(
+    tuple(tuple(VERHOEFF_D[checksum][VERHOEFF_P[i][digit]] for digit in range(10))
+          for checksum in range(10))
+    for i in range(8))
+
 INVALID_PASSCODES = [
     00000000,
     11111111,
@@ -79,6 +111,127 @@ class CommissioningFlow(enum.IntEnum):
     Custom = 2
 
 
+def verhoeff_checksum(number, position=0):
+    """Return the Verhoeff checksum of a string of digits, the rightmost
+    digit being at position"""
+    checksum = 0
+    for digit in reversed(number):
+        checksum = VERHOEFF_STEP[position & 7][checksum][ord(digit) - 48]
+        position += 1
+    return checksum
+
+
+def calc_check_digit(number):
+    """Return the Verhoeff check digit of a string of digits"""
+    # the check digit takes position 0
+    return str(VERHOEFF_INV[verhoeff_checksum(number, 1)])
+
+
+def pack_qrcode_payload(pincode, discriminator, rendezvous, flow, vid, pid):
+    """Return the QR code payload bits as an integer (bit 0 first)"""
+    return ((QRCODE_VERSION << QRCODE_VERSION_POS) |
+            (vid << QRCODE_VID_POS) |
+            (pid << QRCODE_PID_POS) |
+            (int(flow) << QRCODE_COMMISSIONING_FLOW_POS) |
+            (rendezvous << QRCODE_DISCOVERY_CAP_BITMASK_POS) |
+            (discriminator << QRCODE_DISCRIMINATOR_POS) |
+            (int(pincode) << QRCODE_PINCODE_POS) |
+            (QRCODE_PADDING << QRCODE_PADDING_POS))
+
+
+def unpack_qrcode_payload(value):
+    """Return the fields of a QR code payload integer as a dictionary"""
+    def field(pos, length):
+        return (value >> pos) & ((1 << length) - 1)
+    return {
+        'version': field(QRCODE_VERSION_POS, QRCODE_VERSION_LEN),
+        'vid': field(QRCODE_VID_POS, QRCODE_VID_LEN),
+        'pid': field(QRCODE_PID_POS, QRCODE_PID_LEN),
+        'flow': field(QRCODE_COMMISSIONING_FLOW_POS, QRCODE_COMMISSIONING_FLOW_LEN),
+        'rendezvous': field(QRCODE_DISCOVERY_CAP_BITMASK_POS,
+                            QRCODE_DISCOVERY_CAP_BITMASK_LEN),
+        'discriminator': field(QRCODE_DISCRIMINATOR_POS, QRCODE_DISCRIMINATOR_LEN),
+        'pincode': field(QRCODE_PINCODE_POS, PINCODE_LEN),
+        'padding': field(QRCODE_PADDING_POS, QRCODE_PADDING_LEN)}
+
+
+def encode_qrcode(pincode, discriminator, rendezvous, flow, vid, pid):
+    """Return the MT: string of a QR code payload"""
+    return QRCODE_PREFIX + Base38.encode_int(
+        pack_qrcode_payload(pincode, discriminator, rendezvous, flow, vid, pid),
+        QRCODE_PAYLOAD_LEN)
+
+
+def decode_qrcode(qrcode):
+    """Return the fields of an MT: string, raise ValueError if it is invalid"""
+    if not qrcode.startswith(QRCODE_PREFIX):
+        raise ValueError('QR code payload must start with ' + QRCODE_PREFIX)
+    value, total_bytes = Base38.decode_int(qrcode[len(QRCODE_PREFIX):])
+    if total_bytes < QRCODE_PAYLOAD_LEN:
+        raise ValueError('QR code payload is too short')
+    return unpack_qrcode_payload(value & ((1 << (8 * QRCODE_PAYLOAD_LEN)) - 1))
+
+
+def encode_manualcode(pincode, discriminator, flow, vid, pid):
+    """Return the 11 or 21 digit manual pairing code"""
+    short_discriminator = discriminator >> 8
+    chunk1 = (((short_discriminator >> (MANUAL_DISCRIMINATOR_LEN -
+                                        MANUAL_CHUNK1_DISCRIMINATOR_MSBITS_LEN)) &
+               ((1 << MANUAL_CHUNK1_DISCRIMINATOR_MSBITS_LEN) - 1))
+              << MANUAL_CHUNK1_DISCRIMINATOR_MSBITS_POS)
+    if flow != CommissioningFlow.Standard:
+        chunk1 |= 1 << MANUAL_CHUNK1_VID_PID_PRESENT_BIT_POS
+    chunk2 = (((pincode & ((1 << MANUAL_CHUNK2_PINCODE_LSBITS_LEN) - 1))
+               << MANUAL_CHUNK2_PINCODE_LSBITS_POS) |
+              ((short_discriminator & ((1 << MANUAL_CHUNK2_DISCRIMINATOR_LSBITS_LEN) - 1))
+               << MANUAL_CHUNK2_DISCRIMINATOR_LSBITS_POS))
+    chunk3 = (((pincode >> (PINCODE_LEN - MANUAL_CHUNK3_PINCODE_MSBITS_LEN)) &
+               ((1 << MANUAL_CHUNK3_PINCODE_MSBITS_LEN) - 1))
+              << MANUAL_CHUNK3_PINCODE_MSBITS_POS)
+    if flow != CommissioningFlow.Standard:
+        payload = '%0*d%0*d%0*d%0*d%0*d' % (
+            MANUAL_CHUNK1_LEN, chunk1, MANUAL_CHUNK2_LEN, chunk2,
+            MANUAL_CHUNK3_LEN, chunk3, MANUAL_VID_LEN, vid, MANUAL_PID_LEN, pid)
+    else:
+        payload = '%0*d%0*d%0*d' % (
+            MANUAL_CHUNK1_LEN, chunk1, MANUAL_CHUNK2_LEN, chunk2,
+            MANUAL_CHUNK3_LEN, chunk3)
+    return payload + calc_check_digit(payload)
+
+
+def generate_bulk(devices, rendezvous=6, flow=CommissioningFlow.Standard):
+    """Return the [(QR code, manual pairing code)] of many devices
+
+    devices is an iterable of (pincode, discriminator, vid, pid).
+    """
+    flow = int(flow)
+    return [(encode_qrcode(pincode, discriminator, rendezvous, flow, vid, pid),
+             encode_manualcode(pincode, discriminator, flow, vid, pid))
+            for pincode, discriminator, vid, pid in devices]
+
+
+@functools.lru_cache(maxsize=4096)
+def generate_codes(pincode, discriminator, vid, pid, rendezvous=6,
+                   flow=CommissioningFlow.Standard):
+    """Return the (QR code, manual pairing code) of a device, cached"""
+    flow = int(flow)
+    return (encode_qrcode(pincode, discriminator, rendezvous, flow, vid, pid),
+            encode_manualcode(pincode, discriminator, flow, vid, pid))
+
+
+def format_payload_file(pincode, discriminator, vid, pid, rendezvous=6,
+                        flow=CommissioningFlow.Standard):
+    """Return the payload description read by the chip qrcodetool"""
+    return ("version 0\n"
+            "vendorID {}\n"
+            "productID {}\n"
+            "commissioningFlow {}\n"
+            "rendezVousInformation {}\n"
+            "setUpPINCode {}\n"
+            "discriminator {}").format(vid, pid, int(flow), rendezvous, pincode,
+                                       discriminator)
+
+
 class SetupPayload:
     def __init__(self):
         self.long_discriminator = 0
@@ -89,30 +242,6 @@ class SetupPayload:
         self.vid = 0
         self.pid = 0
 
-    def manual_chunk1(self):
-        discriminator_shift = (
-            MANUAL_DISCRIMINATOR_LEN -
-            MANUAL_CHUNK1_DISCRIMINATOR_MSBITS_LEN)
-        discriminator_mask = (1 << MANUAL_CHUNK1_DISCRIMINATOR_MSBITS_LEN) - 1
-        discriminator_chunk = (
-            self.short_discriminator >> discriminator_shift) & discriminator_mask
-        vid_pid_present_flag = 0 if self.flow == CommissioningFlow.Standard else 1
-        return (discriminator_chunk << MANUAL_CHUNK1_DISCRIMINATOR_MSBITS_POS) | (
-            vid_pid_present_flag << MANUAL_CHUNK1_VID_PID_PRESENT_BIT_POS)
-
-    def manual_chunk2(self):
-        discriminator_mask = (1 << MANUAL_CHUNK2_DISCRIMINATOR_LSBITS_LEN) - 1
-        pincode_mask = (1 << MANUAL_CHUNK2_PINCODE_LSBITS_LEN) - 1
-        discriminator_chunk = self.short_discriminator & discriminator_mask
-        return ((self.pincode & pincode_mask) << MANUAL_CHUNK2_PINCODE_LSBITS_POS) | (
-            discriminator_chunk << MANUAL_CHUNK2_DISCRIMINATOR_LSBITS_POS)
-
-    def manual_chunk3(self):
-        pincode_shift = PINCODE_LEN - MANUAL_CHUNK3_PINCODE_MSBITS_LEN
-        pincode_mask = (1 << MANUAL_CHUNK3_PINCODE_MSBITS_LEN) - 1
-        return ((self.pincode >> pincode_shift) &
-                pincode_mask) << MANUAL_CHUNK3_PINCODE_MSBITS_POS
-
     def generate_manualcode(
             self,
             pincode,
@@ -128,16 +257,8 @@ class SetupPayload:
         self.flow = flow
         self.vid = vid
         self.pid = pid
-        payload = str(self.manual_chunk1()).zfill(MANUAL_CHUNK1_LEN)
-        payload += str(self.manual_chunk2()).zfill(MANUAL_CHUNK2_LEN)
-        payload += str(self.manual_chunk3()).zfill(MANUAL_CHUNK3_LEN)
-
-        if self.flow != CommissioningFlow.Standard:
-            payload += str(self.vid).zfill(MANUAL_VID_LEN)
-            payload += str(self.pid).zfill(MANUAL_PID_LEN)
-
-        payload += calc_check_digit(payload)
-        return payload
+        return encode_manualcode(int(self.pincode), self.long_discriminator,
+                                 self.flow, self.vid, self.pid)
 
     def generate_qrcode(
             self,
@@ -154,22 +275,5 @@ class SetupPayload:
         self.flow = flow
         self.vid = vid
         self.pid = pid
-        qrcode_bit_string = '{0:b}'.format(
-            QRCODE_PADDING).zfill(QRCODE_PADDING_LEN)
-        qrcode_bit_string += '{0:b}'.format(int(self.pincode)
-                                            ).zfill(PINCODE_LEN)
-        qrcode_bit_string += '{0:b}'.format(
-            self.long_discriminator).zfill(QRCODE_DISCRIMINATOR_LEN)
-        qrcode_bit_string += '{0:b}'.format(
-            self.rendezvous).zfill(QRCODE_DISCOVERY_CAP_BITMASK_LEN)
-        qrcode_bit_string += '{0:b}'.format(int(self.flow)
-                                            ).zfill(QRCODE_COMMISSIONING_FLOW_LEN)
-        qrcode_bit_string += '{0:b}'.format(self.pid).zfill(QRCODE_PID_LEN)
-        qrcode_bit_string += '{0:b}'.format(self.vid).zfill(QRCODE_VID_LEN)
-        qrcode_bit_string += '{0:b}'.format(
-            QRCODE_VERSION).zfill(QRCODE_VERSION_LEN)
-
-        qrcode_bits = bitarray(qrcode_bit_string)
-        bytes = list(qrcode_bits.tobytes())
-        bytes.reverse()
-        return str('MT:{}'.format(Base38.encode(bytes)))
+        return encode_qrcode(self.pincode, self.long_discriminator,
+                             self.rendezvous, self.flow, self.vid, self.pid)
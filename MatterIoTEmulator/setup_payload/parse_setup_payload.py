@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+#
+#    Copyright (c) 2024 LG Electronics, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+# Decode and check Matter onboarding payloads: MT: QR code strings with
+# their TLV extension data and 11/21 digit manual pairing codes.
+#
+# Check the payloads found in a log file, or the rows of a CSV manifest
+# (e.g. the output of "fleet_cli.py provision") against their own
+# discriminator/pin-code/vendor-id/product-id columns:
+#     python3 -m setup_payload.parse_setup_payload emulator.log --pin 20202021
+#     python3 -m setup_payload.parse_setup_payload devices.csv
+#     python3 -m setup_payload.parse_setup_payload - < codes.txt
+import argparse
+import csv
+import re
+import struct
+import sys
+
+from setup_payload import Base38
+from setup_payload.generate_setup_payload import (
+    INVALID_PASSCODES, MANUAL_CHUNK1_DISCRIMINATOR_MSBITS_LEN, MANUAL_CHUNK1_LEN,
+    MANUAL_CHUNK1_VID_PID_PRESENT_BIT_POS, MANUAL_CHUNK2_LEN,
+    MANUAL_CHUNK2_DISCRIMINATOR_LSBITS_LEN, MANUAL_CHUNK2_PINCODE_LSBITS_LEN,
+    MANUAL_CHUNK3_LEN, MANUAL_PID_LEN, MANUAL_VID_LEN, QRCODE_PAYLOAD_LEN,
+    QRCODE_PREFIX, QRCODE_VERSION, CommissioningFlow, unpack_qrcode_payload,
+    verhoeff_checksum)
+
+MANUAL_SHORT_LEN = MANUAL_CHUNK1_LEN + MANUAL_CHUNK2_LEN + MANUAL_CHUNK3_LEN + 1
+MANUAL_LONG_LEN = MANUAL_SHORT_LEN + MANUAL_VID_LEN + MANUAL_PID_LEN
+MAX_PINCODE = 99999998
+
+# See section 5.1.3.1 (TLV data) in the Matter specification v1.0
+QRCODE_TLV_TAGS = {
+    0x00: 'serial-number',
+    0x01: 'pbkdf-iterations',
+    0x02: 'pbkdf-salt',
+    0x03: 'number-of-devices',
+    0x04: 'commissioning-timeout'}
+
+# Matter TLV: tag control (3 high bits) -> tag length, element types
+TLV_TAG_LENGTHS = [0, 1, 2, 4, 2, 4, 6, 8]
+TLV_INT_FORMATS = {0x00: '<b', 0x01: '<h', 0x02: '<i', 0x03: '<q',
+                   0x04: '<B', 0x05: '<H', 0x06: '<I', 0x07: '<Q',
+                   0x0A: '<f', 0x0B: '<d'}
+TLV_LENGTH_FORMATS = {0: '<B', 1: '<H', 2: '<I', 3: '<Q'}
+TLV_FALSE = 0x08
+TLV_TRUE = 0x09
+TLV_UTF8_STRING = 0x0C
+TLV_BYTE_STRING = 0x10
+TLV_NULL = 0x14
+TLV_STRUCTURE = 0x15
+TLV_ARRAY = 0x16
+TLV_LIST = 0x17
+TLV_END_OF_CONTAINER = 0x18
+
+QRCODE_PATTERN = re.compile(r'MT:[0-9A-Z.\-]+')
+# Grouped as printed (4-3-4 and 5-5 digits for the 21 digit form) or bare
+MANUAL_CODE_PATTERN = re.compile(
+    r'(?<![0-9])(?:[0-9]{4}-[0-9]{3}-[0-9]{4}(?:-[0-9]{5}-[0-9]{5})?|'
+    r'[0-9]{21}|[0-9]{11})(?![0-9])')
+# CSV columns holding the payloads and the expected values
+CSV_PAYLOAD_COLUMNS = ['qrcode', 'manual-code']
+CSV_EXPECTED_COLUMNS = {'discriminator': 'discriminator', 'pin-code': 'pincode',
+                        'vendor-id': 'vid', 'product-id': 'pid'}
+
+
+def parse_tlv_element(data, offset):
+    """Return (tag, value, offset after the element) of a TLV element"""
+    control = data[offset]
+    offset += 1
+    tag_length = TLV_TAG_LENGTHS[control >> 5]
+    element_type = control & 0x1F
+    if offset + tag_length > len(data):
+        raise ValueError('TLV tag runs past the end of the data')
+    tag = int.from_bytes(data[offset:offset + tag_length], 'little') if tag_length else None
+    offset += tag_length
+
+    if element_type in TLV_INT_FORMATS:
+        value_format = TLV_INT_FORMATS[element_type]
+        size = struct.calcsize(value_format)
+        if offset + size > len(data):
+            raise ValueError('TLV value runs past the end of the data')
+        return tag, struct.unpack_from(value_format, data, offset)[0], offset + size
+    if element_type in (TLV_FALSE, TLV_TRUE):
+        return tag, element_type == TLV_TRUE, offset
+    if element_type == TLV_NULL:
+        return tag, None, offset
+    if TLV_UTF8_STRING <= element_type < TLV_NULL:
+        length_format = TLV_LENGTH_FORMATS[element_type & 0x03]
+        size = struct.calcsize(length_format)
+        if offset + size > len(data):
+            raise ValueError('TLV length runs past the end of the data')
+        length = struct.unpack_from(length_format, data, offset)[0]
+        offset += size
+        if offset + length > len(data):
+            raise ValueError('TLV string runs past the end of the data')
+        value = bytes(data[offset:offset + length])
+        if element_type < TLV_BYTE_STRING:
+            value = value.decode('utf-8')
+        return tag, value, offset + length
+    if element_type in (TLV_STRUCTURE, TLV_ARRAY, TLV_LIST):
+        members = []
+        while True:
+            if offset >= len(data):
+                raise ValueError('TLV container is not closed')
+            if data[offset] == TLV_END_OF_CONTAINER:
+                offset += 1
+                break
+            member_tag, member_value, offset = parse_tlv_element(data, offset)
+            members.append((member_tag, member_value))
+        if element_type == TLV_STRUCTURE:
+            return tag, dict(members), offset
+        return tag, [value for _, value in members], offset
+    raise ValueError('Unknown TLV element type 0x{:02x}'.format(element_type))
+
+
+def parse_tlv(data):
+    """Return the elements of TLV data as a {tag: value} dictionary, the
+    members of a top level structure being merged into it"""
+    elements = {}
+    offset = 0
+    while offset < len(data):
+        tag, value, offset = parse_tlv_element(data, offset)
+        if tag is None and isinstance(value, dict):
+            elements.update(value)
+        else:
+            elements[tag] = value
+    return {QRCODE_TLV_TAGS.get(tag, tag): value for tag, value in elements.items()}
+
+
+def parse_qrcode(qrcode):
+    """Return the fields of an MT: QR code string
+
+    The result has version, vid, pid, flow, rendezvous, discriminator,
+    pincode, padding and tlv. Raises ValueError if the string is not valid.
+    """
+    if not qrcode.startswith(QRCODE_PREFIX):
+        raise ValueError('QR code payload must start with ' + QRCODE_PREFIX)
+    if '*' in qrcode:
+        raise ValueError('Concatenated QR code payloads are not supported')
+    value, total_bytes = Base38.decode_int(qrcode[len(QRCODE_PREFIX):])
+    if total_bytes < QRCODE_PAYLOAD_LEN:
+        raise ValueError('QR code payload has {} bytes, expected at least {}'.format(
+            total_bytes, QRCODE_PAYLOAD_LEN))
+    fields = unpack_qrcode_payload(value & ((1 << (8 * QRCODE_PAYLOAD_LEN)) - 1))
+    fields['tlv'] = {}
+    if total_bytes > QRCODE_PAYLOAD_LEN:
+        fields['tlv'] = parse_tlv(value.to_bytes(total_bytes, 'little')[QRCODE_PAYLOAD_LEN:])
+    if fields['version'] != QRCODE_VERSION:
+        raise ValueError('Unsupported QR code version {}'.format(fields['version']))
+    if fields['padding'] != 0:
+        raise ValueError('QR code padding bits are not zero')
+    if fields['flow'] > CommissioningFlow.Custom:
+        raise ValueError('Invalid commissioning flow {}'.format(fields['flow']))
+    check_pincode(fields['pincode'])
+    return fields
+
+
+def parse_manualcode(manual_code):
+    """Return the fields of an 11 or 21 digit manual pairing code
+
+    Dashes and spaces are ignored. The result has flow, discriminator (the
+    4 high bits of the discriminator shifted by 8, as the code holds them),
+    short_discriminator, pincode, vid and pid (None in an 11 digit code).
+    Raises ValueError if the code is not valid.
+    """
+    code = manual_code.replace('-', '').replace(' ', '')
+    if (not code.isdigit()) or (len(code) not in (MANUAL_SHORT_LEN, MANUAL_LONG_LEN)):
+        raise ValueError('Manual code must have {} or {} digits'.format(
+            MANUAL_SHORT_LEN, MANUAL_LONG_LEN))
+    if verhoeff_checksum(code) != 0:
+        raise ValueError('Wrong manual code check digit')
+    position = 0
+    chunk1 = int(code[position:position + MANUAL_CHUNK1_LEN])
+    position += MANUAL_CHUNK1_LEN
+    chunk2 = int(code[position:position + MANUAL_CHUNK2_LEN])
+    position += MANUAL_CHUNK2_LEN
+    chunk3 = int(code[position:position + MANUAL_CHUNK3_LEN])
+    position += MANUAL_CHUNK3_LEN
+    if (chunk1 > 7) or (chunk2 >= 1 << 16) or (chunk3 >= 1 << 13):
+        raise ValueError('Manual code chunk out of range')
+    vid_pid_present = (chunk1 >> MANUAL_CHUNK1_VID_PID_PRESENT_BIT_POS) & 1
+    if vid_pid_present != (len(code) == MANUAL_LONG_LEN):
+        raise ValueError('Manual code length does not match its VID/PID flag')
+
+    short_discriminator = (
+        ((chunk1 & ((1 << MANUAL_CHUNK1_DISCRIMINATOR_MSBITS_LEN) - 1))
+         << MANUAL_CHUNK2_DISCRIMINATOR_LSBITS_LEN) |
+        (chunk2 >> MANUAL_CHUNK2_PINCODE_LSBITS_LEN))
+    fields = {
+        'flow': CommissioningFlow.Custom if vid_pid_present else CommissioningFlow.Standard,
+        'short_discriminator': short_discriminator,
+        'discriminator': short_discriminator << 8,
+        'pincode': (chunk3 << MANUAL_CHUNK2_PINCODE_LSBITS_LEN) |
+                   (chunk2 & ((1 << MANUAL_CHUNK2_PINCODE_LSBITS_LEN) - 1)),
+        'vid': None,
+        'pid': None}
+    if vid_pid_present:
+        fields['vid'] = int(code[position:position + MANUAL_VID_LEN])
+        position += MANUAL_VID_LEN
+        fields['pid'] = int(code[position:position + MANUAL_PID_LEN])
+    check_pincode(fields['pincode'])
+    return fields
+
+
+def parse(payload):
+    """Return the fields of a QR code string or manual pairing code"""
+    if payload.startswith(QRCODE_PREFIX):
+        return parse_qrcode(payload)
+    return parse_manualcode(payload)
+
+
+def check_pincode(pincode):
+    """Raise ValueError if a pincode can not be used"""
+    if not (0 < pincode <= MAX_PINCODE) or pincode in INVALID_PASSCODES:
+        raise ValueError('Invalid pin code {}'.format(pincode))
+
+
+def compare(fields, expected):
+    """Return the list of differences between decoded fields and the expected
+    {discriminator, pincode, vid, pid} values (None values are not checked)"""
+    errors = []
+    for name, value in expected.items():
+        if value is None:
+            continue
+        actual = fields.get(name)
+        if name == 'discriminator' and 'short_discriminator' in fields:
+            # a manual code only has the 4 high bits
+            actual, value = fields['short_discriminator'], value >> 8
+        if actual is None:
+            continue
+        if actual != value:
+            errors.append('{} is {}, expected {}'.format(name, actual, value))
+    return errors
+
+
+def check_payload(payload, expected):
+    """Return (fields or None, list of errors) of a payload"""
+    try:
+        fields = parse(payload)
+    except ValueError as err:
+        return None, [str(err)]
+    return fields, compare(fields, expected)
+
+
+def format_fields(fields):
+    text = 'discriminator={} pincode={} vid={} pid={} flow={}'.format(
+        fields['discriminator'], fields['pincode'], fields['vid'], fields['pid'],
+        int(fields['flow']))
+    if fields.get('tlv'):
+        text += ' tlv={}'.format(fields['tlv'])
+    return text
+
+
+def iter_log_payloads(lines, expected):
+    """Yield (line number, payload, expected) for each payload in text lines
+
+    A bare run of 11 or 21 digits is only taken with a right check digit, a
+    timestamp or an id in a log line is not a manual code."""
+    for number, line in enumerate(lines, 1):
+        for match in QRCODE_PATTERN.finditer(line):
+            yield number, match.group(0), expected
+        # Base38 has digits, do not take a part of a QR code as a manual code
+        for match in MANUAL_CODE_PATTERN.finditer(QRCODE_PATTERN.sub(' ', line)):
+            payload = match.group(0)
+            if ('-' in payload) or (verhoeff_checksum(payload) == 0):
+                yield number, payload, expected
+
+
+def iter_csv_payloads(lines, expected):
+    """Yield (line number, payload, expected) for each payload of a CSV
+    manifest, the columns of a row overriding the expected values"""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        row_expected = dict(expected)
+        for column, name in CSV_EXPECTED_COLUMNS.items():
+            if (row.get(column) or '').strip():
+                row_expected[name] = int(row[column], 0)
+        for column in CSV_PAYLOAD_COLUMNS:
+            payload = (row.get(column) or '').strip()
+            if payload:
+                yield reader.line_num, payload, row_expected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Decode and check Matter QR code and manual pairing code payloads')
+    parser.add_argument('input', nargs='?', default='-',
+                        help='log or CSV file, - for stdin (default)')
+    parser.add_argument('--csv', action='store_true',
+                        help='read the input as a CSV manifest (default for .csv files)')
+    parser.add_argument('--discriminator', type=lambda x: int(x, 0))
+    parser.add_argument('--pin', type=lambda x: int(x, 0))
+    parser.add_argument('--vid', type=lambda x: int(x, 0))
+    parser.add_argument('--pid', type=lambda x: int(x, 0))
+    parser.add_argument('--quiet', action='store_true', help='print the errors only')
+    args = parser.parse_args(argv)
+
+    expected = {'discriminator': args.discriminator, 'pincode': args.pin,
+                'vid': args.vid, 'pid': args.pid}
+    is_csv = args.csv or args.input.lower().endswith('.csv')
+    stream = sys.stdin if args.input == '-' else open(args.input, newline='')
+    checked = 0
+    failed = 0
+    try:
+        iter_payloads = iter_csv_payloads if is_csv else iter_log_payloads
+        for number, payload, payload_expected in iter_payloads(stream, expected):
+            checked += 1
+            fields, errors = check_payload(payload, payload_expected)
+            if errors:
+                failed += 1
+                print('{}:{}: FAIL {}: {}'.format(
+                    args.input, number, payload, '; '.join(errors)))
+            elif not args.quiet:
+                print('{}:{}: OK {} {}'.format(
+                    args.input, number, payload, format_fields(fields)))
+    except ValueError as err:
+        print('{}: {}'.format(args.input, err), file=sys.stderr)
+        return 2
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    print('{} payloads checked, {} failed'.format(checked, failed), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
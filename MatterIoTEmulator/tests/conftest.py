@@ -0,0 +1,78 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+# Run from the application folder: python3 -m pytest -q tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """
+    Point the device folders, registry and reservation files to tmp_path.
+    """
+    from utils import (device_registry, fleet_provisioner, handle_recover,
+                       rpc_port_allocator, running_devices, storage_consistency)
+    from utils.identity_allocator import IdentityAllocator, IDENTITY_KEYS
+    temp_dir = str(tmp_path / "temp") + "/"
+    os.makedirs(temp_dir)
+    for module in (device_registry, fleet_provisioner, handle_recover,
+                   storage_consistency):
+        monkeypatch.setattr(module, "CURRENT_TEMP_DIR", temp_dir)
+    monkeypatch.setattr(device_registry, "REGISTRY_PATH", str(tmp_path / "registry.db"))
+    monkeypatch.setattr(device_registry.DeviceRegistry, "connection", None)
+    monkeypatch.setattr(storage_consistency, "QUARANTINE_DIR", str(tmp_path / "quarantine"))
+    monkeypatch.setattr(storage_consistency, "CHECK_STATE_PATH", str(tmp_path / "check.json"))
+    monkeypatch.setattr(storage_consistency.StorageConsistencyChecker, "checked", None)
+    monkeypatch.setattr(storage_consistency.StorageConsistencyChecker, "dirty", set())
+    monkeypatch.setattr(rpc_port_allocator, "RESERVATION_PATH", str(tmp_path / "ports.json"))
+    monkeypatch.setattr(rpc_port_allocator.RpcPortAllocator, "reservations", None)
+    monkeypatch.setattr(running_devices, "DEVICE_LIST_PATH", str(tmp_path / "deviceList.dat"))
+    monkeypatch.setattr(running_devices.RunningDeviceRegistry, "devices", set())
+    monkeypatch.setattr(IdentityAllocator, "owners", {})
+    monkeypatch.setattr(IdentityAllocator, "values", {key: {} for key in IDENTITY_KEYS})
+    monkeypatch.setattr(IdentityAllocator, "cursors", {key: None for key in IDENTITY_KEYS})
+    monkeypatch.setattr(IdentityAllocator, "loaded", False)
+    yield temp_dir
+    connection = device_registry.DeviceRegistry.connection
+    if connection is not None:
+        connection.close()
+
+
+@pytest.fixture
+def store_device(storage):
+    """
+    Return a function which writes the storage folder and chip_factory.ini
+    of a device under the storage fixture.
+    """
+    from constants import CHIP_FACTORY_FILE
+    from utils.device_runner import DeviceRunner
+
+    def store(targetid, serial, discriminator="3840", pincode="20202021",
+              product_id="32768", device_type="On/Off Light(0x0100)",
+              create_time=1700000000, **options):
+        os.makedirs(storage + targetid)
+        options.setdefault('vendor_id', "65521")
+        DeviceRunner("cd").update_SN_config_file(
+            os.path.join(storage + targetid, CHIP_FACTORY_FILE), str(serial),
+            product_id, str(discriminator), str(pincode), device_type,
+            create_time, **options)
+    return store
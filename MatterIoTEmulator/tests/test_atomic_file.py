@@ -0,0 +1,115 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import errno
+import os
+
+import pytest
+
+from utils import atomic_file
+from utils.atomic_file import AtomicFile, AtomicIniBatch
+
+ORIGINAL = b"[DEFAULT]\nipv4=10.0.0.1\nrpc-port=33000"
+
+
+def fail(*args, **kwargs):
+    raise OSError(errno.EIO, "injected failure")
+
+
+class PartialFile():
+    """File wrapper writing half of the data, then failing like a full disk"""
+
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, data):
+        self.file.write(data[:len(data) // 2])
+        self.file.flush()
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.file.close()
+        return False
+
+
+@pytest.fixture
+def target(tmp_path):
+    path = tmp_path / "chip_factory.ini"
+    path.write_bytes(ORIGINAL)
+    return path
+
+
+def assert_untouched(path):
+    assert path.read_bytes() == ORIGINAL
+    assert [name for name in os.listdir(path.parent) if name.endswith(".tmp")] == []
+
+
+@pytest.mark.parametrize("name", ["fsync", "replace", "chmod"])
+def test_write_bytes_failure_keeps_the_old_file(monkeypatch, target, name):
+    monkeypatch.setattr(atomic_file.os, name, fail)
+    with pytest.raises(OSError):
+        AtomicFile.write_bytes(str(target), b"new content")
+    monkeypatch.undo()
+    assert_untouched(target)
+
+
+def test_partial_write_keeps_the_old_file(monkeypatch, target):
+    real_fdopen = os.fdopen
+    monkeypatch.setattr(atomic_file.os, "fdopen",
+                        lambda *args, **kwargs: PartialFile(real_fdopen(*args, **kwargs)))
+    with pytest.raises(OSError):
+        AtomicFile.write_bytes(str(target), b"x" * 4096)
+    monkeypatch.undo()
+    assert_untouched(target)
+
+
+def test_write_bytes_replaces_and_keeps_the_mode(target):
+    os.chmod(target, 0o600)
+    AtomicFile.write_bytes(str(target), b"new content")
+    assert target.read_bytes() == b"new content"
+    assert os.stat(target).st_mode & 0o777 == 0o600
+    assert [name for name in os.listdir(target.parent) if name.endswith(".tmp")] == []
+
+
+def test_ini_batch_writes_all_fields_at_once(target):
+    with AtomicIniBatch(str(target)) as fields:
+        fields["ipv4"] = "10.0.0.2"
+        fields["ipv6"] = "fe80::2"
+    assert target.read_text() == "[DEFAULT]\nipv4=10.0.0.2\nrpc-port=33000\nipv6=fe80::2"
+
+
+def test_ini_batch_error_in_block_writes_nothing(target):
+    with pytest.raises(RuntimeError):
+        with AtomicIniBatch(str(target)) as fields:
+            fields["ipv4"] = "10.0.0.2"
+            raise RuntimeError("stop")
+    assert_untouched(target)
+
+
+@pytest.mark.parametrize("name", ["fsync", "replace"])
+def test_ini_batch_write_failure_keeps_the_old_file(monkeypatch, target, name):
+    monkeypatch.setattr(atomic_file.os, name, fail)
+    with pytest.raises(OSError):
+        with AtomicIniBatch(str(target)) as fields:
+            fields["ipv4"] = "10.0.0.2"
+    monkeypatch.undo()
+    assert_untouched(target)
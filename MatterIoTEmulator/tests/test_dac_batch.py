@@ -0,0 +1,67 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import pytest
+from credentials.development import dac_batch, dac_cache
+from credentials.development.dac_batch import DacBatchIssuer
+from credentials.development.dac_cache import DacCache
+
+pytest.importorskip("cryptography")
+
+
+def test_parse_range():
+    assert DacBatchIssuer.parse_range("7") == (7, 7)
+    assert DacBatchIssuer.parse_range("0x8000-0x8003") == (0x8000, 0x8003)
+    with pytest.raises(ValueError):
+        DacBatchIssuer.parse_range("10-1")
+
+
+def test_issue_pins_the_dacs_of_the_emulator_folder(storage, tmp_path, monkeypatch):
+    work_path = str(tmp_path / "dac-temp") + "/"
+    monkeypatch.setattr(dac_cache, "DAC_WORK_PATH", work_path)
+    monkeypatch.setattr(dac_batch, "DAC_WORK_PATH", work_path)
+    monkeypatch.setattr(DacCache, "index", None)
+    devices = [("8000", "1"), ("8000", "2")]
+
+    report = DacBatchIssuer.issue(devices, "fff1", workers=1, work_path=work_path)
+
+    assert report["issued"] == 2
+    assert os.path.exists(work_path + "DAC-FFF1-8000-2-Cert.pem")
+    assert DacCache.get_pinned_keys() == {("FFF1", "8000", "1"), ("FFF1", "8000", "2")}
+    DacCache.index = None
+    assert DacBatchIssuer.issue(devices, "FFF1", 1, work_path)["skipped"] == 2
+
+
+def test_issue_does_not_pin_elsewhere(storage, tmp_path, monkeypatch):
+    monkeypatch.setattr(dac_cache, "DAC_WORK_PATH", str(tmp_path / "dac-temp") + "/")
+    monkeypatch.setattr(dac_batch, "DAC_WORK_PATH", str(tmp_path / "dac-temp") + "/")
+    output = str(tmp_path / "out")
+
+    DacBatchIssuer.issue([("8000", "1")], "FFF1", workers=1, work_path=output)
+
+    assert os.path.exists(os.path.join(output, "DAC-FFF1-8000-1-Cert.pem"))
+    assert DacCache.get_pinned_keys() == set()
+
+
+def test_issue_refuses_a_paa_for_the_emulator_folder(storage, tmp_path, monkeypatch):
+    work_path = str(tmp_path / "dac-temp") + "/"
+    monkeypatch.setattr(dac_batch, "DAC_WORK_PATH", work_path)
+
+    with pytest.raises(ValueError, match="another output folder"):
+        DacBatchIssuer.issue([("8000", "1")], "FFF1", 1, work_path, ("paa.pem", "paa.key"))
+
+    assert not os.path.exists(work_path)
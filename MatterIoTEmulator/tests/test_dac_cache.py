@@ -0,0 +1,113 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import pytest
+from credentials.development import dac_cache
+from credentials.development.dac_cache import DacCache, DAC_FILE_FORMATS
+from constants import DAC_CACHE_MAX_AGE_DAYS, DAC_CACHE_MAX_UNUSED
+
+NOW = 1800000000.0
+
+
+@pytest.fixture
+def dac_folder(storage, tmp_path, monkeypatch):
+    work_path = str(tmp_path / "dac-temp") + "/"
+    os.makedirs(work_path)
+    monkeypatch.setattr(dac_cache, "DAC_WORK_PATH", work_path)
+    monkeypatch.setattr(DacCache, "index", None)
+    return work_path
+
+
+def write_dac(work_path, serial, age):
+    base_name = "FFF1-8000-{}".format(serial)
+    for file_format in DAC_FILE_FORMATS:
+        path = work_path + file_format.format(base_name)
+        open(path, "w").close()
+        os.utime(path, (NOW - age, NOW - age))
+
+
+def get_serials():
+    DacCache.index = DacCache.scan()
+    return sorted(int(key[2]) for key in DacCache.index)
+
+
+def test_evict_keeps_pinned_dacs(dac_folder):
+    for serial in range(1, 11):
+        write_dac(dac_folder, serial, (DAC_CACHE_MAX_AGE_DAYS + 1) * 86400)
+    DacCache.pin([("FFF1", "8000", 2), ("FFF1", "8000", "7")])
+
+    removed = DacCache.evict(DacCache.get_used_keys("FFF1"), NOW)
+
+    assert removed == 8
+    assert get_serials() == [2, 7]
+
+
+def test_evict_keeps_pinned_dacs_beyond_max_unused(dac_folder):
+    count = DAC_CACHE_MAX_UNUSED + 10
+    for serial in range(1, count + 1):
+        # serial 1 is the oldest
+        write_dac(dac_folder, serial, 86400 + count - serial)
+    DacCache.pin([("FFF1", "8000", serial) for serial in range(1, 6)])
+
+    DacCache.evict(DacCache.get_used_keys("FFF1"), NOW)
+
+    # Pinned DACs do not count, the oldest unpinned ones go
+    assert get_serials() == list(range(1, 6)) + list(range(11, count + 1))
+
+
+def test_unpin(dac_folder):
+    DacCache.pin([("FFF1", "8000", 1), ("FFF1", "8000", 2)])
+    DacCache.unpin([("FFF1", "8000", "1")])
+
+    assert DacCache.get_pinned_keys() == {("FFF1", "8000", "2")}
+
+
+class FakeIssuer():
+    def __init__(self):
+        self.issued = []
+
+    def write(self, work_path, pid, sn):
+        self.issued.append((pid, sn))
+        for file_format in DAC_FILE_FORMATS:
+            open(work_path + file_format.format("FFF1-{}-{}".format(pid, sn)), "w").close()
+
+
+def test_pre_issue_follows_the_handed_over_state(dac_folder):
+    issuer = FakeIssuer()
+    service = DacCache("FFF1", issuer)
+    service.update([("8000", 5), ("8000", 6)], idle=False)
+
+    assert service.run_once()["issued"] == 0
+    service.update([("8000", 5), ("8000", 6)], idle=True)
+    assert service.run_once()["issued"] == 2
+    assert issuer.issued == [("8000", "5"), ("8000", "6")]
+
+
+def test_run_survives_a_failed_pass(dac_folder, monkeypatch):
+    service = DacCache("FFF1", None, interval=0.01)
+    passes = []
+
+    def run_once():
+        passes.append(1)
+        if len(passes) == 3:
+            service._stop.set()
+        raise KeyError("targetId")
+    monkeypatch.setattr(service, "run_once", run_once)
+
+    service.run()
+
+    assert len(passes) == 3
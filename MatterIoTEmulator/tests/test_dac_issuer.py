@@ -0,0 +1,68 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import pytest
+from credentials.development.dac_issuer import DacIssuer, OID_MATTER_PID, OID_MATTER_VID
+from credentials.development.gen_dac_cert import pai_cert_path, pai_key_path
+
+x509 = pytest.importorskip("cryptography.x509")
+from cryptography.hazmat.primitives.asymmetric import ec  # noqa: E402
+from cryptography.x509.oid import ObjectIdentifier  # noqa: E402
+
+
+def test_issue_dac_content():
+    issuer = DacIssuer(pai_cert_path, pai_key_path, "FFF1")
+
+    files = issuer.issue("8001", "42")
+
+    assert list(files)[-1] == "DAC-FFF1-8001-42-Cert.pem"
+    cert = x509.load_der_x509_certificate(files["DAC-FFF1-8001-42-Cert.der"])
+    assert cert.issuer == issuer.pai_cert.subject
+    assert cert.subject.get_attributes_for_oid(
+        ObjectIdentifier(OID_MATTER_VID))[0].value == "FFF1"
+    assert cert.subject.get_attributes_for_oid(
+        ObjectIdentifier(OID_MATTER_PID))[0].value == "8001"
+    assert [type(extension.value) for extension in cert.extensions] == [
+        x509.BasicConstraints, x509.KeyUsage, x509.SubjectKeyIdentifier,
+        x509.AuthorityKeyIdentifier]
+    assert cert.not_valid_after_utc.year == 9999
+    issuer.pai_cert.public_key().verify(
+        cert.signature, cert.tbs_certificate_bytes, ec.ECDSA(cert.signature_hash_algorithm))
+
+
+def test_format_od_array_folds_repeated_lines():
+    text = DacIssuer.format_od_array(bytes(40) + b"\x01").decode()
+
+    assert text.splitlines() == [
+        "   " + " 0x00," * 16,
+        "   *",
+        "   " + " 0x00," * 8 + " 0x01,"]
+
+
+def test_format_ec_array_lines():
+    lines = DacIssuer.format_ec_array(bytes(range(32))).decode().splitlines()
+
+    assert len(lines) == 3
+    assert lines[0] == "    " + ", ".join("0x{:02x}".format(byte) for byte in range(15)) + ", "
+    assert lines[2] == "    0x1e, 0x1f"
+
+
+def test_write_leaves_no_temporary_file(tmp_path):
+    paths = DacIssuer(pai_cert_path, pai_key_path, "FFF1").write(str(tmp_path), "8000", "1")
+
+    assert len(paths) == 6
+    assert sorted(os.listdir(str(tmp_path))) == sorted(os.path.basename(path) for path in paths)
@@ -0,0 +1,60 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+
+import pytest
+
+from constants import CHIP_FACTORY_FILE
+from utils import device_clone
+from utils.device_clone import DeviceCloner
+from utils.device_registry import DeviceRegistry
+
+
+class Stop(Exception):
+    pass
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    snapshot_dir = tmp_path / "fff18001-64"
+    snapshot_dir.mkdir()
+    (snapshot_dir / device_clone.SNAPSHOT_MANIFEST).write_text(
+        json.dumps({"files": [CHIP_FACTORY_FILE]}))
+    (snapshot_dir / CHIP_FACTORY_FILE).write_text(
+        "[DEFAULT]\nvendor-id=65521\nproduct-id=32769\nserial-num=100")
+    monkeypatch.setattr(device_clone, "SNAPSHOT_DIR", str(tmp_path))
+
+    def stop():
+        raise Stop()
+    # Only the checks before the devices are created are of interest
+    monkeypatch.setattr(DeviceRegistry, "sync", stop)
+    return snapshot_dir.name
+
+
+def test_clones_need_shared_identity(snapshot):
+    with pytest.raises(ValueError, match="share one operational identity"):
+        DeviceCloner.clone(snapshot, 100)
+
+
+def test_shared_identity_allows_clones(snapshot):
+    with pytest.raises(Stop):
+        DeviceCloner.clone(snapshot, 100, shared_identity=True)
+
+
+def test_single_clone(snapshot):
+    with pytest.raises(Stop):
+        DeviceCloner.clone(snapshot, 1)
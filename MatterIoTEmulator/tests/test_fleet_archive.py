@@ -0,0 +1,160 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import io
+import json
+import os
+import shutil
+import tarfile
+import pytest
+from utils import fleet_archive
+from utils.device_clone import DeviceCloner
+from utils.device_registry import DeviceRegistry
+from utils.fleet_archive import FleetArchive
+
+BASE_ADDRESSES = ("10.0.0.1", "fd00::1", {"10.0.0.1", "fd00::1"})
+DAC_FILE = "Matter-Development-DAC-FFF1-8001-1-Cert.pem"
+
+
+@pytest.fixture
+def archive(storage, store_device, tmp_path, monkeypatch):
+    """
+    Store a commissioned device with a DAC file and return its archive.
+    """
+    dac_dir = tmp_path / "dac"
+    dac_dir.mkdir()
+    monkeypatch.setattr(fleet_archive, "CURRENT_TEMP_DIR", storage)
+    monkeypatch.setattr(fleet_archive, "DAC_DIR", str(dac_dir))
+    monkeypatch.setattr(fleet_archive, "SOURCE_PATH", str(tmp_path))
+    monkeypatch.setattr(DeviceCloner, "get_base_addresses", lambda: BASE_ADDRESSES)
+    store_device("fff18001-1", 1, product_id="32769", ipv4="10.0.0.5",
+                 ipv6="fd00::5", interface_index="3", is_recover="1")
+    with open(storage + "fff18001-1/chip_kvs_fff18001-1", "w") as file:
+        file.write("kvs")
+    (dac_dir / DAC_FILE).write_text("dac")
+    output = io.BytesIO()
+    assert FleetArchive.export_fleet(output) == ["fff18001-1"]
+    return output.getvalue()
+
+
+def remove_device(storage, targetid):
+    shutil.rmtree(storage + targetid)
+    os.remove(os.path.join(fleet_archive.DAC_DIR, DAC_FILE))
+    DeviceRegistry.sync()
+
+
+def rewrite(data, edit_manifest=None, extra=None):
+    """
+    Return the archive with an edited manifest and extra members.
+    """
+    output = io.BytesIO()
+    with tarfile.open(fileobj=io.BytesIO(data)) as source, \
+            tarfile.open(fileobj=output, mode="w") as tar:
+        for tarinfo in extra or []:
+            tar.addfile(tarinfo, io.BytesIO(b"x" * tarinfo.size))
+        for member in source:
+            content = source.extractfile(member).read()
+            if member.name == fleet_archive.ARCHIVE_MANIFEST and edit_manifest:
+                manifest = json.loads(content)
+                edit_manifest(manifest)
+                content = json.dumps(manifest).encode("utf-8")
+                member.size = len(content)
+            tar.addfile(member, io.BytesIO(content))
+    return output.getvalue()
+
+
+def test_round_trip(archive, storage):
+    remove_device(storage, "fff18001-1")
+
+    restored = FleetArchive.import_fleet(io.BytesIO(archive))
+
+    assert restored == ["fff18001-1"]
+    with open(storage + "fff18001-1/chip_kvs_fff18001-1") as file:
+        assert file.read() == "kvs"
+    assert os.path.isfile(os.path.join(fleet_archive.DAC_DIR, DAC_FILE))
+    stored = DeviceRegistry.get("fff18001-1")
+    assert (stored['ipv4'], stored['ipv6'], stored['interface_index']) == (
+        "10.0.0.5", "fd00::5", "3")
+
+
+def test_tampered_checksum_restores_nothing(archive, storage):
+    remove_device(storage, "fff18001-1")
+
+    def tamper(manifest):
+        info = manifest["devices"][0]["files"]["dac/" + DAC_FILE]
+        info["sha256"] = "0" * 64
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        FleetArchive.import_fleet(io.BytesIO(rewrite(archive, tamper)))
+
+    assert os.listdir(storage) == []
+    assert not os.path.exists(os.path.join(fleet_archive.DAC_DIR, DAC_FILE))
+
+
+@pytest.mark.parametrize("name, member_type", [
+    ("devices/../../escaped", tarfile.REGTYPE),
+    ("devices/fff18001-1/../escaped", tarfile.REGTYPE),
+    ("devices/fff18001-1/link", tarfile.SYMTYPE)])
+def test_rejects_unsafe_members(archive, storage, tmp_path, name, member_type):
+    remove_device(storage, "fff18001-1")
+    tarinfo = tarfile.TarInfo(name)
+    tarinfo.type = member_type
+    tarinfo.linkname = "/etc/passwd" if member_type == tarfile.SYMTYPE else ""
+    tarinfo.size = 0 if member_type == tarfile.SYMTYPE else 1
+
+    with pytest.raises(ValueError, match="Unexpected archive member"):
+        FleetArchive.import_fleet(io.BytesIO(rewrite(archive, extra=[tarinfo])))
+
+    assert os.listdir(storage) == []
+    assert not os.path.exists(tmp_path / "escaped")
+
+
+def test_auto_readdress_on_conflict(archive, storage, store_device):
+    remove_device(storage, "fff18001-1")
+    # Another device took the address of the archived one
+    store_device("fff18001-2", 2, product_id="32769", ipv4="10.0.0.5",
+                 ipv6="fd00::5", interface_index="3", is_recover="1")
+
+    FleetArchive.import_fleet(io.BytesIO(archive))
+
+    stored = DeviceRegistry.get("fff18001-1")
+    assert (stored['ipv4'], stored['ipv6'], stored['interface_index']) == (
+        "10.0.0.2", "fd00::2", "4")
+    assert DeviceRegistry.get("fff18001-2")['ipv4'] == "10.0.0.5"
+
+
+def test_auto_readdress_other_subnet(archive, storage, monkeypatch):
+    remove_device(storage, "fff18001-1")
+    # The archive comes from a host on 10.0.0.0/24
+    monkeypatch.setattr(DeviceCloner, "get_base_addresses", lambda: (
+        "192.168.1.1", "fd01::1", {"192.168.1.1", "fd01::1"}))
+
+    FleetArchive.import_fleet(io.BytesIO(archive))
+
+    stored = DeviceRegistry.get("fff18001-1")
+    assert (stored['ipv4'], stored['ipv6']) == ("192.168.1.2", "fd01::2")
+
+
+def test_skips_device_without_files(archive, storage):
+    remove_device(storage, "fff18001-1")
+
+    def add_empty_device(manifest):
+        manifest["devices"].append(
+            {"targetId": "fff18001-9", "config": {}, "files": {}})
+
+    restored = FleetArchive.import_fleet(io.BytesIO(rewrite(archive, add_empty_device)))
+
+    assert restored == ["fff18001-1"]
+    assert not os.path.exists(storage + "fff18001-9")
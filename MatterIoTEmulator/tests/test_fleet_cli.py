@@ -0,0 +1,65 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import csv
+import io
+import os
+import pytest
+import fleet_cli
+from setup_payload.parse_setup_payload import parse
+
+
+def test_payload_csv(store_device, capsys):
+    store_device("fff18001-1", "1", "3840", "20202021", product_id="32769")
+    store_device("fff18001-2", "2", "1234", "34567890", product_id="32769")
+
+    assert fleet_cli.main(["payload", "--targetid", "fff18001-2"]) == 0
+
+    rows = list(csv.DictReader(io.StringIO(capsys.readouterr().out)))
+    assert [row['targetId'] for row in rows] == ["fff18001-2"]
+    fields = parse(rows[0]['qrcode'])
+    assert (fields['discriminator'], fields['pincode'], fields['vid'], fields['pid']) == (
+        1234, 34567890, 65521, 32769)
+    assert parse(rows[0]['manual-code'])['pincode'] == 34567890
+
+
+def test_payload_txt(store_device, tmp_path):
+    store_device("fff18001-1", "1", "3840", "20202021", product_id="32769")
+    output = str(tmp_path / "payloads")
+
+    assert fleet_cli.main(["payload", "--format", "txt", "--output", output]) == 0
+
+    with open(os.path.join(output, "fff18001-1-payload.txt")) as file:
+        assert file.read().splitlines() == [
+            "version 0", "vendorID 65521", "productID 32769", "commissioningFlow 0",
+            "rendezVousInformation 6", "setUpPINCode 20202021", "discriminator 3840"]
+
+
+def test_payload_png(store_device, tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    store_device("fff18001-1", "1", "3840", "20202021", product_id="32769")
+    output = str(tmp_path / "payloads")
+
+    assert fleet_cli.main(["payload", "--format", "png", "--output", output]) == 0
+
+    with Image.open(os.path.join(output, "fff18001-1-qrcode.png")) as image:
+        # 21 modules of version 1 and a 4 module border, 10 pixels each
+        assert image.size == (290, 290)
+
+
+def test_payload_unknown_device(storage):
+    assert fleet_cli.main(["payload", "--targetid", "fff18001-9"]) == 1
+    assert fleet_cli.main(["payload", "--format", "txt"]) == 1
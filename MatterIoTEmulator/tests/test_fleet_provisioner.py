@@ -0,0 +1,152 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import pytest
+from utils import fleet_provisioner
+from utils.device_clone import DeviceCloner
+from utils.device_registry import DeviceRegistry
+from utils.fleet_provisioner import FleetManifest, FleetProvisioner
+from utils.identity_allocator import IdentityAllocator
+from utils.rpc_port_allocator import RpcPortAllocator
+
+BASE_ADDRESSES = ("10.0.0.1", "fd00::1", {"10.0.0.1", "fd00::1", "10.0.0.2"})
+MANIFEST_CSV = """device_type,count,serial_start,discriminator_start,pin_code_start
+On/Off Light,2,100,,
+0x0101,1,,200,20202021
+"""
+
+
+def write_manifest(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_load_csv_and_yaml(tmp_path):
+    csv_entries = FleetManifest.load(write_manifest(tmp_path, "fleet.csv", MANIFEST_CSV))
+    yaml_entries = FleetManifest.load(write_manifest(tmp_path, "fleet.yaml", (
+        "devices:\n"
+        "  - {device_type: On/Off Light, count: 2, serial_start: 100}\n"
+        "  - {device_type: '0x0101', discriminator_start: 200, pin_code_start: 20202021}\n")))
+
+    assert csv_entries[0]["device_type"] == yaml_entries[0]["device_type"] == "On/Off Light"
+    assert csv_entries[1]["pin_code_start"] == yaml_entries[1]["pin_code_start"] == "20202021"
+    with pytest.raises(ValueError):
+        FleetManifest.load(write_manifest(tmp_path, "fleet.txt", MANIFEST_CSV))
+
+
+def test_expand_identities(storage, tmp_path):
+    devices = FleetManifest.expand(FleetManifest.load(
+        write_manifest(tmp_path, "fleet.csv", MANIFEST_CSV)))
+
+    assert [device['serial-num'] for device in devices] == [100, 101, 102]
+    assert [device['targetId'] for device in devices] == [
+        "fff18001-64", "fff18001-65", "fff18001-66"]
+    assert devices[2]['device-type'] == "Dimmable Light(0x0101)"
+    assert (devices[2]['discriminator'], devices[2]['pin-code']) == (200, 20202021)
+    assert devices[0]['discriminator'] != devices[1]['discriminator']
+    assert devices[0]['pin-code'] != devices[1]['pin-code']
+    # The allocated values avoid the ones the manifest gives
+    assert 200 not in (devices[0]['discriminator'], devices[1]['discriminator'])
+    assert 20202021 not in (devices[0]['pin-code'], devices[1]['pin-code'])
+
+
+def test_expand_reports_every_problem(storage):
+    with pytest.raises(ValueError) as error:
+        FleetManifest.expand([
+            {'device_type': "Toaster"},
+            {'device_type': "On/Off Light", 'count': "0"},
+            {'device_type': "On/Off Light", 'serial_start': "1", 'discriminator_start': "5000"},
+            {'device_type': "On/Off Light", 'serial_start': "1", 'count': "2"}])
+
+    lines = str(error.value).splitlines()
+    assert lines[0] == "Entry 1: unsupported device type 'Toaster'"
+    assert lines[1] == "Entry 2: count must be positive"
+    assert "discriminator 5000 is out of range" in lines[2]
+    assert "fff18001-1 is listed twice" in lines[3]
+
+
+def test_expand_does_not_allocate(storage):
+    entries = [{'device_type': "On/Off Light", 'count': "3", 'serial_start': "1"}]
+
+    first = FleetManifest.expand(entries)
+    second = FleetManifest.expand(entries)
+
+    assert first == second
+    assert IdentityAllocator.owners == {}
+
+
+def test_prepare_allocates_the_previewed_identities(storage, monkeypatch):
+    monkeypatch.setattr(fleet_provisioner.GenDacTool, "gen_dac_cert", lambda self: True)
+    monkeypatch.setattr(DeviceCloner, "get_base_addresses", lambda: BASE_ADDRESSES)
+    devices = FleetManifest.expand(
+        [{'device_type': "On/Off Light", 'count': "3", 'serial_start': "1"}])
+
+    results, _ = FleetProvisioner.prepare(devices, workers=2)
+
+    assert [result['error'] for result in results] == ["", "", ""]
+    for device, result in zip(devices, results):
+        identity = (device['discriminator'], device['pin-code'])
+        assert (result['discriminator'], result['pin-code']) == identity
+        assert IdentityAllocator.get(device['targetId']) == identity
+        assert DeviceRegistry.get(device['targetId'])['provisioned'] == "1"
+
+
+def test_prepare_leases_addresses(store_device, monkeypatch):
+    monkeypatch.setattr(fleet_provisioner.GenDacTool, "gen_dac_cert", lambda self: True)
+    monkeypatch.setattr(DeviceCloner, "get_base_addresses", lambda: BASE_ADDRESSES)
+    store_device("fff18001-64", 100, product_id="32769", ipv4="10.0.0.3",
+                 ipv6="fd00::2", interface_index="4")
+    devices = FleetManifest.expand(
+        [{'device_type': "On/Off Light", 'count': "2", 'serial_start': "1"}])
+
+    results, _ = FleetProvisioner.prepare(devices, workers=2)
+
+    assert [(result['ipv4'], result['ipv6'], result['interface_index'])
+            for result in results] == [("10.0.0.4", "fd00::3", "5"),
+                                       ("10.0.0.5", "fd00::4", "6")]
+    stored = DeviceRegistry.get("fff18001-2")
+    assert (stored['ipv4'], stored['ipv6'], stored['interface_index']) == (
+        "10.0.0.5", "fd00::4", "6")
+    assert RpcPortAllocator.get_owner(stored['rpc-port']) == "fff18001-2"
+
+
+def test_prepare_fails_without_base_address(storage, monkeypatch):
+    def no_base_address():
+        raise ValueError("No base address on eth0")
+    monkeypatch.setattr(DeviceCloner, "get_base_addresses", no_base_address)
+    devices = FleetManifest.expand([{'device_type': "On/Off Light", 'serial_start': "1"}])
+
+    results, _ = FleetProvisioner.prepare(devices)
+
+    assert results[0]['error'] == "No base address on eth0"
+    assert not os.path.exists(storage + "fff18001-1")
+    assert IdentityAllocator.get("fff18001-1") is None
+
+
+def test_prepare_rolls_back_a_failed_device(storage, monkeypatch):
+    monkeypatch.setattr(fleet_provisioner.GenDacTool, "gen_dac_cert", lambda self: False)
+    monkeypatch.setattr(DeviceCloner, "get_base_addresses", lambda: BASE_ADDRESSES)
+    devices = FleetManifest.expand([{'device_type': "On/Off Light", 'serial_start': "1"}])
+
+    results, _ = FleetProvisioner.prepare(devices)
+
+    assert results[0]['error'] == "fail to create DAC"
+    assert not os.path.exists(storage + "fff18001-1")
+    assert DeviceRegistry.get("fff18001-1") is None
+    assert IdentityAllocator.get("fff18001-1") is None
+    assert "fff18001-1" not in RpcPortAllocator.reservations.values()
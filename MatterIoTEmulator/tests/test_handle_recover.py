@@ -0,0 +1,109 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import sqlite3
+from constants import CHIP_FACTORY_FILE
+from utils import device_registry
+from utils.device_registry import DeviceRegistry
+from utils.device_runner import DeviceRunner
+from utils.handle_recover import HandleRecoverDevices
+from utils.rpc_port_allocator import RpcPortAllocator
+from utils.storage_consistency import StorageConsistencyChecker
+
+
+def make_device(store_device, targetid, provisioned=None):
+    store_device(targetid, targetid.split("-")[-1], device_type="light",
+                 provisioned=provisioned)
+    return RpcPortAllocator.allocate(targetid)
+
+
+def age_folders(temp_dir):
+    # Older than STORAGE_CHECK_GRACE so the checker looks at them
+    for name in os.listdir(temp_dir):
+        for root, _, files in os.walk(temp_dir + name):
+            for path in [root] + [os.path.join(root, file) for file in files]:
+                os.utime(path, (1700000000, 1700000000))
+
+
+def test_remove_keeps_provisioned_and_releases_ports(storage, store_device, monkeypatch):
+    provisioned_port = make_device(store_device, "light-0001", provisioned="1")
+    removed_port = make_device(store_device, "light-0002")
+    age_folders(storage)
+    # The full scan is left to the background checker
+    monkeypatch.setattr(StorageConsistencyChecker, "run_pass", None)
+
+    HandleRecoverDevices.remove_un_commissioned_storage_folder()
+
+    assert os.path.isdir(storage + "light-0001")
+    assert not os.path.exists(storage + "light-0002")
+    assert DeviceRegistry.get("light-0001")["provisioned"] == "1"
+    assert DeviceRegistry.get("light-0002") is None
+    assert RpcPortAllocator.get_owner(provisioned_port) == "light-0001"
+    assert RpcPortAllocator.get_owner(removed_port) is None
+
+
+def test_rewrite_keeps_provisioned_flag(storage, store_device):
+    make_device(store_device, "light-0001", provisioned="1")
+    DeviceRegistry.sync()
+    # The app rewrites the file with the address when the device starts
+    DeviceRunner("cd").update_SN_config_file(
+        os.path.join(storage + "light-0001", CHIP_FACTORY_FILE),
+        "0001", "32768", "3840", "20202021", "light", 1700000000,
+        ipv4="10.0.0.2", vendor_id="65521")
+    DeviceRegistry.upsert("light-0001", {"serial-num": "0001", "ipv4": "10.0.0.2"})
+
+    assert DeviceRegistry.get("light-0001")["provisioned"] == "1"
+    DeviceRegistry.sync()
+    assert DeviceRegistry.get("light-0001")["provisioned"] == "1"
+
+
+def test_quarantine_releases_port(storage, store_device):
+    port = make_device(store_device, "light-0003")
+    os.remove(os.path.join(storage + "light-0003", CHIP_FACTORY_FILE))
+    age_folders(storage)
+
+    report = StorageConsistencyChecker.run_pass()
+
+    assert [targetid for targetid, _ in report["quarantined"]] == ["light-0003"]
+    assert RpcPortAllocator.get_owner(port) is None
+
+
+def test_old_registry_gets_provisioned_column(storage, store_device):
+    make_device(store_device, "light-0001", provisioned="1")
+    connection = sqlite3.connect(device_registry.REGISTRY_PATH)
+    connection.execute("CREATE TABLE devices (target_id TEXT PRIMARY KEY, "
+                       "ini_mtime INTEGER NOT NULL DEFAULT 0)")
+    connection.execute("INSERT INTO devices VALUES ('light-0001', 1)")
+    connection.commit()
+    connection.close()
+
+    DeviceRegistry.sync()
+
+    assert DeviceRegistry.get("light-0001")["provisioned"] == "1"
+
+
+def test_checker_runs_the_first_pass_at_once(storage, store_device):
+    make_device(store_device, "light-0003")
+    os.remove(os.path.join(storage + "light-0003", CHIP_FACTORY_FILE))
+    age_folders(storage)
+    checker = StorageConsistencyChecker(interval=60)
+
+    checker.start()
+    checker.stop()
+
+    assert not os.path.exists(storage + "light-0003")
+    assert StorageConsistencyChecker.last_report["quarantined"][0][0] == "light-0003"
@@ -0,0 +1,164 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from constants import MDNS_LATENCY_SAMPLES, MDNS_WITHDRAWN_RETENTION
+from utils.mdns_browser import (
+    DNS_CLASS_IN, DNS_HEADER, DNS_RECORD, DNS_TYPE_PTR, DNS_TYPE_SRV, DNS_TYPE_TXT,
+    MdnsBrowser, SERVICE_COMMISSIONABLE, SERVICE_OPERATIONAL)
+
+COMMISSIONABLE = "5E1F9A2C3B4D6E70._matterc._udp.local"
+OPERATIONAL = "2906C908D115D362-0000000000000001._matter._tcp.local"
+
+
+def record(name, rtype, ttl, rdata):
+    """Return a resource record in wire format"""
+    return (MdnsBrowser.encode_name(name) +
+            DNS_RECORD.pack(rtype, DNS_CLASS_IN, ttl, len(rdata)) + rdata)
+
+
+def response(instance, service, ttl, txt=None):
+    """Return the announcement of a responder: PTR, SRV and TXT of an instance"""
+    records = [
+        record(service, DNS_TYPE_PTR, ttl, MdnsBrowser.encode_name(instance)),
+        record(instance, DNS_TYPE_SRV, ttl,
+               struct.pack("!HHH", 0, 0, 5540) + MdnsBrowser.encode_name("host.local"))]
+    if txt is not None:
+        entries = b"".join(bytes([len(entry)]) + entry.encode()
+                           for entry in ("{}={}".format(*item) for item in txt.items()))
+        records.append(record(instance, DNS_TYPE_TXT, ttl, entries))
+    return DNS_HEADER.pack(0, 0x8400, 0, len(records), 0, 0) + b"".join(records)
+
+
+@pytest.fixture(autouse=True)
+def clean_browser():
+    MdnsBrowser.advertisements.clear()
+    MdnsBrowser.devices.clear()
+    MdnsBrowser.latencies.clear()
+    yield
+
+
+def test_commissionable_advertisement_is_attached_by_discriminator():
+    browser = MdnsBrowser()
+    MdnsBrowser.mark_started("fff18001-64", 3840, "On/Off Light", ["10.0.0.5"])
+    browser.feed(response(COMMISSIONABLE, "_matterc._udp.local", 120,
+                          {"D": 3841, "CM": 1}), "10.0.0.6")
+    browser.feed(response("0000000000000001._matterc._udp.local",
+                          "_matterc._udp.local", 120, {"D": 3840, "CM": 1}), "10.0.0.5")
+    (advertisement,) = MdnsBrowser.get_device_advertisements("fff18001-64")
+    assert advertisement["service"] == SERVICE_COMMISSIONABLE
+    assert advertisement["discriminator"] == 3840
+    assert MdnsBrowser.get_latency_report()["On/Off Light"][SERVICE_COMMISSIONABLE]["count"] == 1
+
+
+def advertise(browser, number, fleet="On/Off Light"):
+    """Start a device and feed its commissionable advertisement"""
+    MdnsBrowser.mark_started("fff18001-{:x}".format(number), number, fleet)
+    browser.feed(response("{:016X}._matterc._udp.local".format(number),
+                          "_matterc._udp.local", 120, {"D": number}), "10.0.0.6")
+
+
+def test_latencies_are_bounded():
+    browser = MdnsBrowser()
+    for number in range(MDNS_LATENCY_SAMPLES + 10):
+        advertise(browser, number % 4096)
+    report = MdnsBrowser.get_latency_report()
+    assert report["On/Off Light"][SERVICE_COMMISSIONABLE]["count"] == MDNS_LATENCY_SAMPLES
+
+
+def test_forget_device_drops_its_latencies():
+    browser = MdnsBrowser()
+    advertise(browser, 1)
+    advertise(browser, 2)
+    advertise(browser, 3, "Dimmable Light")
+    MdnsBrowser.forget_device("fff18001-1")
+    MdnsBrowser.forget_device("fff18001-3")
+    report = MdnsBrowser.get_latency_report()
+    assert report["On/Off Light"][SERVICE_COMMISSIONABLE]["count"] == 1
+    assert "Dimmable Light" not in report
+
+
+def test_operational_advertisement_is_attached_by_node_id():
+    browser = MdnsBrowser()
+    MdnsBrowser.mark_started("fff18001-64", 3840, "On/Off Light", ["10.0.0.5"])
+    MdnsBrowser.mark_connected("fff18001-64")
+    browser.feed(response(OPERATIONAL, "_matter._tcp.local", 120), "10.0.0.9")
+    assert MdnsBrowser.get_device_advertisements("fff18001-64") == []
+    MdnsBrowser.set_node_id("fff18001-64", 1)
+    (advertisement,) = MdnsBrowser.get_device_advertisements("fff18001-64")
+    assert advertisement["service"] == SERVICE_OPERATIONAL
+
+
+def test_goodbye_withdraws_and_expire_forgets():
+    browser = MdnsBrowser()
+    browser.feed(response(COMMISSIONABLE, "_matterc._udp.local", 120, {"D": 1}),
+                 "10.0.0.6", now=1000.0)
+    browser.feed(response(COMMISSIONABLE, "_matterc._udp.local", 120, {"D": 1}),
+                 "10.0.0.6", now=1010.0)
+    assert MdnsBrowser.advertisements[COMMISSIONABLE]["refresh_count"] == 1
+    browser.feed(response(COMMISSIONABLE, "_matterc._udp.local", 0), "10.0.0.6",
+                 now=1020.0)
+    assert MdnsBrowser.advertisements[COMMISSIONABLE]["withdrawn_at"] == 1020.0
+    browser.expire(1020.0 + MDNS_WITHDRAWN_RETENTION)
+    assert COMMISSIONABLE in MdnsBrowser.advertisements
+    browser.expire(1021.0 + MDNS_WITHDRAWN_RETENTION)
+    assert COMMISSIONABLE not in MdnsBrowser.advertisements
+
+
+def test_expired_ttl_is_withdrawn():
+    browser = MdnsBrowser()
+    browser.feed(response(COMMISSIONABLE, "_matterc._udp.local", 120, {"D": 1}),
+                 "10.0.0.6", now=1000.0)
+    browser.expire(1121.0)
+    assert MdnsBrowser.advertisements[COMMISSIONABLE]["withdrawn_at"] == 1120.0
+
+
+def test_malformed_and_query_packets_are_dropped():
+    browser = MdnsBrowser()
+    packet = response(COMMISSIONABLE, "_matterc._udp.local", 120, {"D": 1})
+    browser.feed(packet[:-5], "10.0.0.6")
+    browser.feed(b"\x00\x01", "10.0.0.6")
+    browser.feed(DNS_HEADER.pack(0, 0, 0, 0, 0, 0), "10.0.0.6")
+    assert MdnsBrowser.advertisements == {}
+
+
+def test_packets_from_a_local_responder_are_read():
+    browser = MdnsBrowser()
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.bind(("127.0.0.1", 0))
+    browser._sockets = [listener]
+    browser._last_query = time.time()
+    thread = threading.Thread(target=browser.run, daemon=True)
+    thread.start()
+    responder = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        responder.sendto(response(COMMISSIONABLE, "_matterc._udp.local", 120, {"D": 7}),
+                         listener.getsockname())
+        deadline = time.time() + 5
+        while (COMMISSIONABLE not in MdnsBrowser.advertisements) and (
+                time.time() < deadline):
+            time.sleep(0.01)
+    finally:
+        browser.stop()
+        responder.close()
+    assert MdnsBrowser.advertisements[COMMISSIONABLE]["discriminator"] == 7
+    assert MdnsBrowser.advertisements[COMMISSIONABLE]["source"] == "127.0.0.1"
@@ -0,0 +1,68 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import pytest
+from utils import network_interface_priority
+from utils.network_interface_priority import UplinkMonitor
+
+
+@pytest.fixture
+def links(monkeypatch):
+    states = {"eth0": True, "wlan0": True}
+    events = []
+    monkeypatch.setattr(network_interface_priority, "check_interface_up",
+                        lambda interface: states.get(interface, False))
+    monkeypatch.setattr(UplinkMonitor, "interface", "eth0")
+    monkeypatch.setattr(UplinkMonitor, "previous_interface", "eth0")
+    monkeypatch.setattr(UplinkMonitor, "is_up", True)
+    monkeypatch.setattr(UplinkMonitor, "listeners", [events.append])
+    return states, events
+
+
+def change(states, ifname, is_up):
+    states[ifname] = is_up
+    UplinkMonitor.on_interface_changed(ifname)
+
+
+def test_fail_over_and_back(links):
+    states, events = links
+
+    change(states, "eth0", False)
+    change(states, "eth0", True)
+
+    assert [(event["previous_interface"], event["interface"], event["is_up"])
+            for event in events] == [("eth0", "wlan0", True), ("wlan0", "eth0", True)]
+
+
+def test_all_down_and_recovery(links):
+    states, events = links
+
+    change(states, "wlan0", False)
+    change(states, "eth0", False)
+    change(states, "wlan0", True)
+    change(states, "eth0", True)
+
+    assert [(event["interface"], event["is_up"]) for event in events] == [
+        ("eth0", False), ("wlan0", True), ("eth0", True)]
+
+
+def test_other_interfaces_are_ignored(links):
+    states, events = links
+
+    change(states, "docker0", False)
+    change(states, "wlan0", False)
+
+    assert events == []
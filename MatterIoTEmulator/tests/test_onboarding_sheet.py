@@ -0,0 +1,88 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import re
+import pytest
+from constants import ONBOARDING_SHEET_COLUMNS, ONBOARDING_SHEET_ROWS
+from setup_payload.parse_setup_payload import parse
+from utils.onboarding_sheet import OnboardingSheet
+from utils.running_devices import RunningDeviceRegistry
+
+
+def store_devices(store_device, count):
+    for serial in range(1, count + 1):
+        store_device("fff18000-{:x}".format(serial), serial, serial, 20202020 + serial,
+                     create_time=1700000000 + serial)
+
+
+def test_get_devices(store_device):
+    store_devices(store_device, 3)
+    RunningDeviceRegistry.devices.add("fff18000-2")
+
+    devices = OnboardingSheet.get_devices(["fff18000-2", "fff18000-3"])
+
+    assert [device['targetId'] for device in devices] == ["fff18000-2", "fff18000-3"]
+    assert [device['running'] for device in devices] == [True, False]
+    assert parse(devices[0]['qrcode'])['pincode'] == 20202022
+    assert parse(devices[0]['manual-code'])['pincode'] == 20202022
+
+
+def test_format_manual_code():
+    assert OnboardingSheet.format_manual_code("34970112332") == "3497-011-2332"
+    assert OnboardingSheet.format_manual_code(
+        "749701123365521327694") == "7497-011-2336-55213-27694"
+
+
+def test_render_svg_draws_every_dark_module():
+    payload = "MT:Y.K9042C00KA0648G00"
+    matrix = OnboardingSheet.get_matrix(payload)
+
+    svg = OnboardingSheet.render_svg(payload)
+
+    assert 'viewBox="0 0 {0} {0}"'.format(len(matrix)) in svg
+    widths = [int(width) for width in re.findall(r"h([0-9]+)v1", svg)]
+    assert sum(widths) == sum(module for row in matrix for module in row)
+
+
+def test_write_html(store_device, tmp_path):
+    store_devices(store_device, 2)
+    path = str(tmp_path / "sheet.html")
+
+    paths, count = OnboardingSheet.export(path)
+
+    assert (paths, count) == ([path], 2)
+    with open(path) as file:
+        text = file.read()
+    assert text.count('<div class="tile">') == 2
+    assert "fff18000-1" in text and "<svg" in text
+
+
+def test_write_png_pages_and_pdf(store_device, tmp_path):
+    pytest.importorskip("PIL")
+    per_page = ONBOARDING_SHEET_COLUMNS * ONBOARDING_SHEET_ROWS
+    store_devices(store_device, per_page + 1)
+    devices = OnboardingSheet.get_devices()
+
+    paths = OnboardingSheet.write(str(tmp_path / "sheet.png"), devices)
+    pdf_paths = OnboardingSheet.write(str(tmp_path / "sheet"), devices, "pdf")
+
+    assert paths == [str(tmp_path / "sheet-1.png"), str(tmp_path / "sheet-2.png")]
+    assert all(os.path.getsize(path) > 0 for path in paths)
+    with open(pdf_paths[0], "rb") as file:
+        assert file.read(5) == b"%PDF-"
+    with pytest.raises(ValueError):
+        OnboardingSheet.write(str(tmp_path / "sheet.svg"), devices)
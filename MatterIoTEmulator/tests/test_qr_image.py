@@ -0,0 +1,42 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import pytest
+from constants import QR_IMAGE_BOX_SIZE
+from utils.onboarding_sheet import OnboardingSheet
+
+pytest.importorskip("PySide2")
+from app import MainWindow  # noqa: E402
+
+PAYLOAD = "MT:Y.K9042C00KA0648G00"
+
+
+def test_render_qr_image_matches_the_matrix():
+    matrix = OnboardingSheet.get_matrix(PAYLOAD)
+    size = len(matrix) * QR_IMAGE_BOX_SIZE
+
+    image = MainWindow.render_qr_image(PAYLOAD)
+
+    assert (image.width(), image.height()) == (size, size)
+    for y, row in enumerate(matrix):
+        for x, module in enumerate(row):
+            pixel = image.pixelColor(x * QR_IMAGE_BOX_SIZE + QR_IMAGE_BOX_SIZE // 2,
+                                     y * QR_IMAGE_BOX_SIZE + QR_IMAGE_BOX_SIZE // 2)
+            assert pixel.lightness() == (0 if module else 255)
+
+
+def test_render_qr_image_is_cached():
+    assert MainWindow.render_qr_image(PAYLOAD) is MainWindow.render_qr_image(PAYLOAD)
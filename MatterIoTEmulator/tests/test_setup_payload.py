@@ -0,0 +1,76 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import random
+import pytest
+from setup_payload.generate_setup_payload import (
+    INVALID_PASSCODES, CommissioningFlow, generate_bulk)
+from setup_payload.parse_setup_payload import MAX_PINCODE, iter_log_payloads, parse
+from utils.onboarding_sheet import OnboardingSheet
+
+
+def random_devices(rng, count):
+    devices = []
+    while len(devices) < count:
+        pincode = rng.randint(1, MAX_PINCODE)
+        if pincode not in INVALID_PASSCODES:
+            devices.append((pincode, rng.randint(0, 4095), rng.randint(0, 0xFFFF),
+                            rng.randint(0, 0xFFFF)))
+    return devices
+
+
+@pytest.mark.parametrize("flow", list(CommissioningFlow))
+def test_generate_bulk_round_trip(flow):
+    devices = random_devices(random.Random(int(flow)), 200)
+
+    codes = generate_bulk(devices, flow=flow)
+
+    for (pincode, discriminator, vid, pid), (qrcode, manual_code) in zip(devices, codes):
+        fields = parse(qrcode)
+        assert (fields['pincode'], fields['discriminator'], fields['vid'],
+                fields['pid'], fields['flow']) == (pincode, discriminator, vid, pid, flow)
+        fields = parse(manual_code)
+        assert fields['pincode'] == pincode
+        assert fields['short_discriminator'] == discriminator >> 8
+        if flow == CommissioningFlow.Standard:
+            assert len(manual_code) == 11
+            assert (fields['vid'], fields['pid']) == (None, None)
+        else:
+            # The 21 digit form only tells the flow is not the standard one
+            assert len(manual_code) == 21
+            assert (fields['vid'], fields['pid']) == (vid, pid)
+            assert fields['flow'] != CommissioningFlow.Standard
+
+
+def test_log_manual_codes():
+    device = (20202021, 3840, 0xFFF1, 0x8000)
+    _, short_code = generate_bulk([device])[0]
+    _, long_code = generate_bulk([device], flow=CommissioningFlow.Custom)[0]
+    wrong_code = short_code[:-1] + str((int(short_code[-1]) + 1) % 10)
+    lines = [
+        "1700000000.123 [17000000001] started",
+        "Manual pairing code: [{}]".format(short_code),
+        "code {} and {}".format(OnboardingSheet.format_manual_code(long_code),
+                                OnboardingSheet.format_manual_code(wrong_code)),
+        "bare {} with a wrong check digit".format(wrong_code)]
+
+    payloads = [(number, payload) for number, payload, _ in iter_log_payloads(lines, {})]
+
+    assert payloads == [
+        (2, short_code),
+        (3, OnboardingSheet.format_manual_code(long_code)),
+        (3, OnboardingSheet.format_manual_code(wrong_code))]
+    assert parse(payloads[1][1])['pid'] == 0x8000
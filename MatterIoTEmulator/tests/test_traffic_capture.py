@@ -0,0 +1,42 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from utils.traffic_capture import TrafficCapture
+
+
+class BusySocket():
+    """A socket which always has a frame, it never times out"""
+
+    def __init__(self, capture, count):
+        self.capture = capture
+        self.count = count
+
+    def recv(self, size):
+        self.count -= 1
+        if self.count == 0:
+            self.capture._stop = True
+        return bytes(60)
+
+
+def test_busy_socket_reports(monkeypatch):
+    capture = TrafficCapture("lo", pcap_enabled=False)
+    capture._socket = BusySocket(capture, 5)
+    reports = []
+    monkeypatch.setattr(capture, "report", lambda: reports.append(1))
+
+    capture.read_socket()
+
+    assert len(reports) == 5
@@ -0,0 +1,118 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import copy
+import json
+import os
+import threading
+import time
+from utils.atomic_file import AtomicFile
+from constants import CONFIG_FILE, CONFIG_RECHECK_INTERVAL
+
+SOURCE_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+CONFIG_FILE_PATH = os.path.join(SOURCE_PATH, CONFIG_FILE)
+
+
+class AppConfig():
+    """
+    AppConfig class for sharing the parsed res/config/config.json.
+
+    The file is parsed once and parsed again only when its mtime or size
+    changed. The file is checked at most once every CONFIG_RECHECK_INTERVAL
+    seconds, so creating tabs in a row does not touch the disk. The
+    returned values are shared and must not be modified.
+    """
+    lock = threading.Lock()
+    configs = None
+    device_types_by_id = {}
+    file_state = None
+    checked_at = 0
+
+    @staticmethod
+    def get():
+        """
+        Return the config dictionary.
+
+        Raises:
+            OSError: if the config file can not be read the first time
+            ValueError: if the config file is not valid json the first time
+        """
+        now = time.monotonic()
+        if (AppConfig.configs is not None) and (
+                now - AppConfig.checked_at < CONFIG_RECHECK_INTERVAL):
+            return AppConfig.configs
+        with AppConfig.lock:
+            AppConfig.checked_at = now
+            try:
+                stat = os.stat(CONFIG_FILE_PATH)
+                file_state = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                if AppConfig.configs is not None:
+                    return AppConfig.configs
+                raise
+            if (file_state != AppConfig.file_state) or (AppConfig.configs is None):
+                AppConfig.load(file_state)
+        return AppConfig.configs
+
+    @staticmethod
+    def load(file_state):
+        """
+        Parse the config file. The caller must hold the lock.
+
+        Arguments:
+            file_state {tuple} -- the (mtime, size) of the parsed file
+        """
+        with open(CONFIG_FILE_PATH) as file:
+            configs = json.load(file)
+        AppConfig.device_types_by_id = {
+            device_type.get('device_id'): device_type
+            for device_type in configs.get('device_types', [])}
+        AppConfig.configs = configs
+        AppConfig.file_state = file_state
+
+    @staticmethod
+    def get_device_type(device_id):
+        """
+        Return the device_types entry of a device id.
+
+        Arguments:
+            device_id {str} -- the device id, e.g. "0x0100"
+        Return:
+            The entry dictionary, or "" if the device id is unknown
+        """
+        AppConfig.get()
+        return AppConfig.device_types_by_id.get(device_id, "")
+
+    @staticmethod
+    def update_device_config_info(device_id, config_info):
+        """
+        Update the config_info of a device type and save the config file.
+
+        Arguments:
+            device_id {str} -- the device id, e.g. "0x0100"
+            config_info {dict} -- the fields to update
+        """
+        with AppConfig.lock:
+            with open(CONFIG_FILE_PATH) as file:
+                configs = json.load(file)
+            for device_type in configs.get('device_types', []):
+                if device_type.get('device_id') == device_id:
+                    device_type['config_info'].update(copy.deepcopy(config_info))
+                    break
+            AtomicFile.write_json(CONFIG_FILE_PATH, configs)
+            stat = os.stat(CONFIG_FILE_PATH)
+            AppConfig.load((stat.st_mtime_ns, stat.st_size))
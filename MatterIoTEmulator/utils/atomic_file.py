@@ -0,0 +1,182 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+
+class AtomicFile():
+    """
+    AtomicFile class for replacing a file in one step.
+
+    The content is written to a temporary file in the same folder, synced
+    to disk and renamed over the target, then the folder is synced. A
+    reader (or a crash) sees either the old or the new file, never a
+    truncated one.
+    """
+
+    @staticmethod
+    def write_bytes(path, data):
+        """
+        Replace the content of a file.
+
+        Arguments:
+            path {str} -- the file path
+            data {bytes} -- the new content
+        Raises:
+            OSError: if the file can not be written, the old file is kept
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(
+            prefix="." + os.path.basename(path) + ".", suffix=".tmp",
+            dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            try:
+                os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+            except FileNotFoundError:
+                os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+        AtomicFile.sync_directory(directory)
+
+    @staticmethod
+    def write_text(path, text):
+        """
+        Replace the content of a text file.
+
+        Arguments:
+            path {str} -- the file path
+            text {str} -- the new content
+        """
+        AtomicFile.write_bytes(path, text.encode("utf-8"))
+
+    @staticmethod
+    def write_json(path, data, indent=4):
+        """
+        Replace the content of a json file.
+
+        Arguments:
+            path {str} -- the file path
+            data {object} -- the json serializable data
+            indent {int} -- the indent of the json text
+        """
+        AtomicFile.write_text(path, json.dumps(data, indent=indent))
+
+    @staticmethod
+    def sync_directory(directory):
+        """
+        Flush a folder entry so a rename survives a power loss.
+
+        Arguments:
+            directory {str} -- the folder path
+        """
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def read_ini_fields(path):
+        """
+        Return the key=value lines of a one section ini file in file order.
+
+        Arguments:
+            path {str} -- the file path
+        Return:
+            (section line, OrderedDict of fields), an empty section when the
+            file does not exist
+        """
+        section = "[DEFAULT]"
+        fields = OrderedDict()
+        try:
+            with open(path) as file:
+                for line in file.read().splitlines():
+                    if line.startswith("["):
+                        section = line.strip()
+                    elif "=" in line:
+                        key, value = line.split("=", 1)
+                        fields[key.strip()] = value.strip()
+        except FileNotFoundError:
+            pass
+        return section, fields
+
+    @staticmethod
+    def format_ini_fields(section, fields):
+        """
+        Return the text of a one section ini file.
+
+        Arguments:
+            section {str} -- the section line
+            fields {dict} -- the fields in order
+        """
+        return section + "\n" + "\n".join(
+            "{}={}".format(key, value) for key, value in fields.items())
+
+
+class AtomicIniBatch():
+    """
+    AtomicIniBatch class for grouping several field updates of an ini file
+    (chip_factory.ini) into one atomic write.
+
+        with AtomicIniBatch(path) as fields:
+            fields["ipv4"] = ipv4
+            fields["rpc-port"] = rpc_port
+    """
+
+    def __init__(self, path):
+        """
+        Initialize an AtomicIniBatch instance.
+
+        Arguments:
+            path {str} -- the ini file path
+        """
+        self.path = path
+        self.section = "[DEFAULT]"
+        self.fields = None
+
+    def __enter__(self):
+        """
+        Read the current fields.
+        """
+        self.section, self.fields = AtomicFile.read_ini_fields(self.path)
+        return self.fields
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Write all the fields at once, nothing is written on error.
+        """
+        if exc_type is None:
+            AtomicFile.write_text(
+                self.path, AtomicFile.format_ini_fields(self.section, self.fields))
+        return False
@@ -0,0 +1,285 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import errno
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from ipaddress import IPv4Address, IPv6Address
+from utils.atomic_file import AtomicFile, AtomicIniBatch
+from utils.device_registry import DeviceRegistry
+from utils.interface_state import InterfaceStateCache
+from utils.network_interface_priority import get_network_interface, get_network_if_name
+from utils.rpc_port_allocator import RpcPortAllocator
+from constants import *
+
+SOURCE_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+CURRENT_TEMP_DIR = SOURCE_PATH + TEMP_PATH
+SNAPSHOT_DIR = os.path.join(SOURCE_PATH, SNAPSHOT_PATH)
+SNAPSHOT_MANIFEST = "snapshot.json"
+KVS_PREFIX = "chip_kvs_"
+# ioctl FICLONE from linux/fs.h
+FICLONE = 0x40049409
+LINK_MODES = ("auto", "reflink", "hardlink", "copy")
+
+
+class DeviceCloner():
+    """
+    DeviceCloner class for capturing a commissioned device (KVS and factory
+    config) and deriving new devices from it.
+
+    Every clone gets its own serial number, target id, ip lease, virtual
+    interface index, rpc port and unique-id, and is marked as commissioned
+    so the application starts it like a recover device. The fabric data in
+    the KVS (node id, operational key, NOC) is shared by all clones of a
+    snapshot, so they are one node seen from several addresses by the
+    commissioner, not a fleet of distinct nodes. More than one clone is only
+    created when the caller accepts that (shared_identity).
+    """
+
+    @staticmethod
+    def link_file(src, dst, mode="auto"):
+        """
+        Copy a file, sharing its blocks when possible.
+
+        CHIP rewrites its ini/KVS files through a temporary file and a
+        rename, so a hardlinked copy is detached on the first write and
+        never modifies the source.
+
+        Arguments:
+            src {str} -- the source file
+            dst {str} -- the destination file
+            mode {str} -- auto, reflink, hardlink or copy
+        Return:
+            The method which was used
+        Raises:
+            OSError: if the requested method is not supported
+        """
+        if mode in ("auto", "reflink"):
+            try:
+                with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+                    fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+                shutil.copystat(src, dst)
+                return "reflink"
+            except OSError as err:
+                if os.path.exists(dst):
+                    os.unlink(dst)
+                if mode == "reflink" or err.errno not in (
+                        errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV,
+                        errno.EINVAL, errno.ENOSYS):
+                    raise
+        if mode in ("auto", "hardlink"):
+            try:
+                os.link(src, dst)
+                return "hardlink"
+            except OSError:
+                if mode == "hardlink":
+                    raise
+        shutil.copy2(src, dst)
+        return "copy"
+
+    @staticmethod
+    def snapshot(targetid, name=None, mode="auto"):
+        """
+        Capture the storage folder of a commissioned device.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+            name {str} -- the snapshot name (default = targetid)
+            mode {str} -- auto, reflink, hardlink or copy
+        Return:
+            The snapshot folder
+        Raises:
+            ValueError: if the device is unknown or not commissioned
+        """
+        dict_config = DeviceRegistry.get(targetid)
+        if dict_config is None:
+            DeviceRegistry.sync()
+            dict_config = DeviceRegistry.get(targetid)
+        if dict_config is None:
+            raise ValueError("Unknown device {}".format(targetid))
+        if dict_config.get('is_recover') not in ("1", 1):
+            raise ValueError("Device {} is not commissioned".format(targetid))
+        src_dir = os.path.join(CURRENT_TEMP_DIR, targetid)
+        snapshot_dir = os.path.join(SNAPSHOT_DIR, name or targetid)
+        if os.path.exists(snapshot_dir):
+            shutil.rmtree(snapshot_dir)
+        os.makedirs(snapshot_dir)
+        files = []
+        for entry in os.scandir(src_dir):
+            if not entry.is_file():
+                continue
+            target_name = entry.name
+            if entry.name == KVS_PREFIX + targetid:
+                target_name = KVS_PREFIX
+            DeviceCloner.link_file(
+                entry.path, os.path.join(snapshot_dir, target_name), mode)
+            files.append(target_name)
+        AtomicFile.write_json(os.path.join(snapshot_dir, SNAPSHOT_MANIFEST), {
+            "source": targetid,
+            "created": int(time.time()),
+            "files": sorted(files)})
+        logging.info("Snapshot of {} saved to {}".format(targetid, snapshot_dir))
+        return snapshot_dir
+
+    @staticmethod
+    def get_base_addresses():
+        """
+        Return the (ipv4, ipv6) base address of the uplink, the same ones
+        CreateIpAddress.scanAndCreateIp counts from.
+        """
+        network_if_name = get_network_if_name() or get_network_interface()
+        addr_info_list = InterfaceStateCache.get_addr_info(network_if_name)
+        ipv4 = [item["local"] for item in addr_info_list
+                if item.get("family") == IP_VERSION4]
+        ipv6 = [item["local"] for item in addr_info_list
+                if (item.get("family") == IP_VERSION6 and
+                    item.get("scope") == IP_VERSION6_SCOPE and
+                    item.get("prefixlen") == IP_VERSION6_PREFIXLEN)]
+        if (len(ipv4) == 0) or (len(ipv6) == 0):
+            raise ValueError(
+                "No base address on {}".format(network_if_name))
+        return ipv4[0], ipv6[-1], {item["local"] for item in addr_info_list}
+
+    @staticmethod
+    def next_free(base, used, limit, address_type):
+        """
+        Return the first address after base which is not used.
+
+        Arguments:
+            base {str} -- the base address
+            used {set} -- the used addresses, the result is added to it
+            limit {str} -- the first address out of range
+            address_type {class} -- IPv4Address or IPv6Address
+        Raises:
+            ValueError: if the range is exhausted
+        """
+        address = address_type(base) + 1
+        while address < address_type(limit):
+            if str(address) not in used:
+                used.add(str(address))
+                return str(address)
+            address += 1
+        raise ValueError("No free address after {}".format(base))
+
+    @staticmethod
+    def clone(snapshot_name, count, start_serial=None, mode="auto",
+              shared_identity=False):
+        """
+        Create new commissioned devices from a snapshot.
+
+        Arguments:
+            snapshot_name {str} -- the snapshot name
+            count {int} -- the number of devices to create
+            start_serial {int} -- the first serial number, the next free one
+                                  after the highest stored serial by default
+            mode {str} -- auto, reflink, hardlink or copy
+            shared_identity {bool} -- allow several clones which share the
+                                      node id, operational key and NOC
+        Return:
+            The list of created target ids
+        Raises:
+            ValueError: if the snapshot or the address range is not usable,
+                        or count > 1 without shared_identity
+        """
+        if (count > 1) and (not shared_identity):
+            raise ValueError(
+                "The clones of a snapshot share one operational identity (node "
+                "id, operational key and NOC): a commissioner sees one node, not "
+                "{} devices. Pass shared_identity to create them anyway.".format(count))
+        snapshot_dir = os.path.join(SNAPSHOT_DIR, snapshot_name)
+        try:
+            with open(os.path.join(snapshot_dir, SNAPSHOT_MANIFEST)) as file:
+                manifest = json.load(file)
+        except (OSError, ValueError) as err:
+            raise ValueError("Invalid snapshot {}: {}".format(snapshot_name, err))
+        _, template = AtomicFile.read_ini_fields(
+            os.path.join(snapshot_dir, CHIP_FACTORY_FILE))
+        vendor_id = int(template['vendor-id'])
+        product_id = int(template['product-id'])
+
+        DeviceRegistry.sync()
+        list_devices = DeviceRegistry.list_devices()
+        used_serials = {int(item['serial-num']) for item in list_devices
+                        if item['serial-num'].isdigit()}
+        used_ipv4 = {item['ipv4'] for item in list_devices}
+        used_ipv6 = {item['ipv6'] for item in list_devices}
+        used_index = {int(item['interface_index']) for item in list_devices
+                      if item['interface_index'].isdigit()}
+        for item in list_devices:
+            # Keep the ports of stored devices away from the clones
+            if item['rpc-port'].isdigit():
+                RpcPortAllocator.reserve(item['targetId'], int(item['rpc-port']))
+        base_ipv4, base_ipv6, host_addresses = DeviceCloner.get_base_addresses()
+        used_ipv4 |= host_addresses
+        used_ipv6 |= host_addresses
+        ipv4_limit = '.'.join(base_ipv4.split('.')[:-1] + ["255"])
+        ipv6_limit = ':'.join(base_ipv6.split(':')[:-1] + ["ffff"])
+
+        serial = start_serial if start_serial is not None else (
+            max(used_serials | {int(template['serial-num'])}) + 1)
+        interface_index = max(used_index | {0}) + 1
+        create_time = int(time.time())
+        list_targetid = []
+        while len(list_targetid) < count:
+            while (serial in used_serials):
+                serial += 1
+            if serial > MAX_SERIAL_NUMBER:
+                raise ValueError("Serial number out of range")
+            used_serials.add(serial)
+            targetid = (hex(vendor_id)[2:] + hex(product_id)[2:] + '-' +
+                        hex(serial)[2:])
+            device_dir = os.path.join(CURRENT_TEMP_DIR, targetid)
+            if os.path.exists(device_dir):
+                serial += 1
+                continue
+            rpc_port = RpcPortAllocator.allocate(targetid)
+            if rpc_port is None:
+                raise ValueError("No free rpc port")
+            os.makedirs(device_dir)
+            for file_name in manifest["files"]:
+                if file_name == CHIP_FACTORY_FILE:
+                    continue
+                target_name = KVS_PREFIX + targetid if file_name == KVS_PREFIX \
+                    else file_name
+                DeviceCloner.link_file(os.path.join(snapshot_dir, file_name),
+                                       os.path.join(device_dir, target_name), mode)
+            config_file = os.path.join(device_dir, CHIP_FACTORY_FILE)
+            shutil.copyfile(os.path.join(snapshot_dir, CHIP_FACTORY_FILE), config_file)
+            with AtomicIniBatch(config_file) as fields:
+                fields['serial-num'] = str(serial)
+                fields['create-time'] = str(create_time + len(list_targetid))
+                fields['ipv4'] = DeviceCloner.next_free(
+                    base_ipv4, used_ipv4, ipv4_limit, IPv4Address)
+                fields['ipv6'] = DeviceCloner.next_free(
+                    base_ipv6, used_ipv6, ipv6_limit, IPv6Address)
+                fields['rpc-port'] = str(rpc_port)
+                fields['interface_index'] = str(interface_index)
+                fields['is_recover'] = "1"
+                fields['unique-id'] = uuid.uuid4().hex.upper()
+                dict_config = dict(fields)
+            DeviceRegistry.upsert(targetid, dict_config)
+            interface_index += 1
+            serial += 1
+            list_targetid.append(targetid)
+        logging.info("Cloned {} devices from {}".format(
+            len(list_targetid), manifest["source"]))
+        return list_targetid
@@ -0,0 +1,243 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import configparser
+import logging
+import os
+import sqlite3
+import threading
+from constants import CHIP_FACTORY_FILE, TEMP_PATH, DEVICE_REGISTRY_FILE
+
+SOURCE_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+CURRENT_TEMP_DIR = SOURCE_PATH + TEMP_PATH
+REGISTRY_PATH = os.path.join(SOURCE_PATH, DEVICE_REGISTRY_FILE)
+
+# chip_factory.ini option -> column
+REGISTRY_FIELDS = [
+    ('product-id', 'product_id'),
+    ('serial-num', 'serial_num'),
+    ('discriminator', 'discriminator'),
+    ('pin-code', 'pin_code'),
+    ('device-type', 'device_type'),
+    ('create-time', 'create_time'),
+    ('ipv4', 'ipv4'),
+    ('ipv6', 'ipv6'),
+    ('rpc-port', 'rpc_port'),
+    ('interface_index', 'interface_index'),
+    ('is_recover', 'is_recover'),
+    ('vendor-id', 'vendor_id'),
+    ('unique-id', 'unique_id'),
+    ('provisioned', 'provisioned')]
+# Options an upsert keeps when the caller does not give them
+PRESERVED_OPTIONS = ['provisioned']
+REQUIRED_OPTIONS = ['product-id', 'device-type', 'serial-num', 'discriminator',
+                    'ipv4', 'ipv6', 'pin-code', 'rpc-port', 'vendor-id']
+
+
+class DeviceRegistry():
+    """
+    DeviceRegistry class for indexing the devices stored in temp/.
+
+    Every device folder temp/<targetId>/chip_factory.ini has one row with
+    its identity, network lease, rpc port, commissioning state and create
+    time. The rows use the option names of chip_factory.ini so they can be
+    used in place of HandleRecoverDevices.read_config_file. A folder is only
+    parsed again when its chip_factory.ini was modified outside the
+    application (e.g. unique-id written by the device).
+    """
+    lock = threading.RLock()
+    connection = None
+
+    @staticmethod
+    def connect():
+        """
+        Open the registry database. The caller must hold the lock.
+        """
+        if (DeviceRegistry.connection is not None):
+            return DeviceRegistry.connection
+        connection = sqlite3.connect(
+            REGISTRY_PATH, check_same_thread=False, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS devices (target_id TEXT PRIMARY KEY, " +
+            ", ".join("{} TEXT NOT NULL DEFAULT ''".format(column)
+                      for _, column in REGISTRY_FIELDS) +
+            ", ini_mtime INTEGER NOT NULL DEFAULT 0)")
+        existing = {row['name'] for row in connection.execute(
+            "PRAGMA table_info(devices)")}
+        missing = [column for _, column in REGISTRY_FIELDS if column not in existing]
+        for column in missing:
+            connection.execute(
+                "ALTER TABLE devices ADD COLUMN {} TEXT NOT NULL DEFAULT ''".format(column))
+        if missing:
+            # Parse every folder again to fill the new columns
+            connection.execute("UPDATE devices SET ini_mtime = 0")
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS devices_create_time "
+            "ON devices (CAST(create_time AS INTEGER), target_id)")
+        DeviceRegistry.connection = connection
+        return connection
+
+    @staticmethod
+    def row_to_dict(row):
+        """
+        Return a registry row as a chip_factory.ini dictionary.
+
+        Arguments:
+            row {sqlite3.Row} -- the row
+        """
+        dict_config = {option: row[column] for option, column in REGISTRY_FIELDS}
+        dict_config['targetId'] = row['target_id']
+        return dict_config
+
+    @staticmethod
+    def get(targetid):
+        """
+        Return the configuration of a device.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+        Return:
+            A chip_factory.ini dictionary, or None if it is not registered
+        """
+        with DeviceRegistry.lock:
+            row = DeviceRegistry.connect().execute(
+                "SELECT * FROM devices WHERE target_id = ?", (targetid,)).fetchone()
+        return DeviceRegistry.row_to_dict(row) if row is not None else None
+
+    @staticmethod
+    def list_devices():
+        """
+        Return the configuration of all devices ordered by create time.
+        """
+        with DeviceRegistry.lock:
+            rows = DeviceRegistry.connect().execute(
+                "SELECT * FROM devices ORDER BY CAST(create_time AS INTEGER), "
+                "target_id").fetchall()
+        return [DeviceRegistry.row_to_dict(row) for row in rows]
+
+    @staticmethod
+    def upsert(targetid, dict_config, ini_mtime=None):
+        """
+        Insert or update a device.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+            dict_config {dict} -- the chip_factory.ini options of the device
+            ini_mtime {int} -- the mtime (ns) of chip_factory.ini, read from
+                               the folder when not given
+        """
+        if ini_mtime is None:
+            try:
+                ini_mtime = os.stat(os.path.join(
+                    CURRENT_TEMP_DIR, targetid, CHIP_FACTORY_FILE)).st_mtime_ns
+            except OSError:
+                ini_mtime = 0
+        columns = [column for _, column in REGISTRY_FIELDS]
+        with DeviceRegistry.lock:
+            if any(option not in dict_config for option in PRESERVED_OPTIONS):
+                stored = DeviceRegistry.get(targetid) or {}
+                dict_config = dict(dict_config)
+                for option in PRESERVED_OPTIONS:
+                    dict_config.setdefault(option, stored.get(option, ""))
+            values = [str(dict_config.get(option, "")) for option, _ in REGISTRY_FIELDS]
+            DeviceRegistry.connect().execute(
+                "INSERT OR REPLACE INTO devices (target_id, {}, ini_mtime) "
+                "VALUES ({})".format(", ".join(columns),
+                                     ", ".join("?" * (len(columns) + 2))),
+                [targetid] + values + [ini_mtime])
+
+    @staticmethod
+    def delete(targetid):
+        """
+        Remove a device.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+        """
+        with DeviceRegistry.lock:
+            DeviceRegistry.connect().execute(
+                "DELETE FROM devices WHERE target_id = ?", (targetid,))
+
+    @staticmethod
+    def parse_config_file(config_file):
+        """
+        Return the options of a chip_factory.ini, or None if it lacks a
+        required option.
+
+        Arguments:
+            config_file {str} -- the chip_factory.ini path
+        """
+        config = configparser.ConfigParser()
+        try:
+            config.read(config_file)
+        except configparser.Error as err:
+            logging.error("Fail to parse {}: {}".format(config_file, err))
+            return None
+        for option in REQUIRED_OPTIONS:
+            if (not config.has_option('DEFAULT', option)):
+                return None
+        return {option: config.get('DEFAULT', option, fallback="")
+                for option, _ in REGISTRY_FIELDS}
+
+    @staticmethod
+    def sync():
+        """
+        Bring the registry in line with temp/ using a single directory
+        listing. New or externally modified folders are imported, folders
+        lacking a required option are not registered and rows without
+        folder are dropped.
+        """
+        try:
+            entries = [entry for entry in os.scandir(CURRENT_TEMP_DIR)
+                       if entry.is_dir()]
+        except OSError as err:
+            logging.error("Fail to get path of storage folder: {}".format(err))
+            return
+        with DeviceRegistry.lock:
+            connection = DeviceRegistry.connect()
+            known = {row['target_id']: row['ini_mtime'] for row in
+                     connection.execute("SELECT target_id, ini_mtime FROM devices")}
+            connection.execute("BEGIN")
+            try:
+                for entry in entries:
+                    config_file = os.path.join(entry.path, CHIP_FACTORY_FILE)
+                    try:
+                        ini_mtime = os.stat(config_file).st_mtime_ns
+                    except OSError:
+                        continue
+                    if (known.pop(entry.name, None) == ini_mtime):
+                        continue
+                    dict_config = DeviceRegistry.parse_config_file(config_file)
+                    if dict_config is None:
+                        # Left to StorageConsistencyChecker, it may be written
+                        connection.execute(
+                            "DELETE FROM devices WHERE target_id = ?", (entry.name,))
+                        logging.info(
+                            "Skip temp folder {}, reason lack option".format(
+                                entry.path))
+                        continue
+                    DeviceRegistry.upsert(entry.name, dict_config, ini_mtime)
+                for targetid in known:
+                    connection.execute(
+                        "DELETE FROM devices WHERE target_id = ?", (targetid,))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
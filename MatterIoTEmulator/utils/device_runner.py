@@ -19,7 +19,9 @@ import os
 import signal
 import subprocess
 import time
+from collections import OrderedDict
 from threading import Thread
+from utils.atomic_file import AtomicFile
 
 
 class DeviceRunner:
@@ -84,6 +86,38 @@ class DeviceRunner:
         except Exception as e:
             print("Error when killing process:" + str(e))
 
+    def pause(self):
+        """
+        Suspend the process executing the string command.
+
+        Raises:
+            Exception: if there is an error while signaling the current process
+        """
+        self.send_signal(signal.SIGSTOP)
+
+    def resume(self):
+        """
+        Continue the process suspended by pause().
+
+        Raises:
+            Exception: if there is an error while signaling the current process
+        """
+        self.send_signal(signal.SIGCONT)
+
+    def send_signal(self, sig):
+        """
+        Send a signal to the process group executing the string command.
+
+        Arguments:
+            sig {int} -- the signal number
+        """
+        try:
+            process_id = self._process.pid
+            if self.is_process(process_id):
+                os.killpg(os.getpgid(process_id), sig)
+        except Exception as e:
+            print("Error when signaling process:" + str(e))
+
     def run_cmd(self, cmd):
         """
         Return the result after executing the string command.
@@ -164,7 +198,8 @@ class DeviceRunner:
             interface_index="",
             is_recover="",
             vendor_id="",
-            unique_id=""):
+            unique_id="",
+            provisioned=None):
         """
         Update the device informations to config file.
 
@@ -183,55 +218,32 @@ class DeviceRunner:
             is_recover {str} -- flag marked a new created or recover device
             vendor_id {str} -- the vendor id of device (default = "")
             unique_id {str} -- the unique id of device (default = "")
+            provisioned {str} -- "1" for a device prepared from a fleet
+                                 manifest (default = keep the current value)
         Raises:
             Exception: if there is an error while writing to config file
         """
+        fields = OrderedDict([
+            ("product-id", product_id_value),
+            ("serial-num", serial_value),
+            ("discriminator", discriminator),
+            ("pin-code", pin_code),
+            ("device-type", device_type),
+            ("create-time", create_time),
+            ("ipv4", ipv4),
+            ("ipv6", ipv6),
+            ("rpc-port", rpc_port),
+            ("interface_index", interface_index),
+            ("is_recover", is_recover),
+            ("vendor-id", vendor_id)])
+        if unique_id:
+            fields["unique-id"] = unique_id
+        if provisioned is None:
+            provisioned = AtomicFile.read_ini_fields(file_path)[1].get("provisioned", "")
+        if provisioned:
+            fields["provisioned"] = provisioned
         try:
-            with open(file_path, 'w') as file:
-                line_1 = "[DEFAULT]\n"
-                line_2 = "product-id=" + str(product_id_value)
-                line_3 = "\nserial-num=" + str(serial_value)
-                line_4 = "\ndiscriminator=" + str(discriminator)
-                line_5 = "\npin-code=" + str(pin_code)
-                line_6 = "\ndevice-type=" + str(device_type)
-                line_7 = "\ncreate-time=" + str(create_time)
-                line_8 = "\nipv4=" + str(ipv4)
-                line_9 = "\nipv6=" + str(ipv6)
-                line_10 = "\nrpc-port=" + str(rpc_port)
-                line_11 = "\ninterface_index=" + str(interface_index)
-                line_12 = "\nis_recover=" + str(is_recover)
-                line_13 = "\nvendor-id=" + str(vendor_id)
-                if (not unique_id):
-                    file.writelines([line_1,
-                                     line_2,
-                                     line_3,
-                                     line_4,
-                                     line_5,
-                                     line_6,
-                                     line_7,
-                                     line_8,
-                                     line_9,
-                                     line_10,
-                                     line_11,
-                                     line_12,
-                                     line_13])
-                    file.close()
-                    return
-                line_14 = "\nunique-id=" + str(unique_id)
-                file.writelines([line_1,
-                                 line_2,
-                                 line_3,
-                                 line_4,
-                                 line_5,
-                                 line_6,
-                                 line_7,
-                                 line_8,
-                                 line_9,
-                                 line_10,
-                                 line_11,
-                                 line_12,
-                                 line_13,
-                                 line_14])
-                file.close()
+            AtomicFile.write_text(
+                file_path, AtomicFile.format_ini_fields("[DEFAULT]", fields))
         except Exception as e:
             print("Failed to create SN config file: error-->" + str(e))
@@ -0,0 +1,401 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import socket
+import tarfile
+import tempfile
+import time
+from ipaddress import IPv4Address, IPv6Address
+from credentials.development.gen_dac_cert import WORK_PATH as DAC_DIR
+from utils.atomic_file import AtomicIniBatch
+from utils.device_clone import DeviceCloner
+from utils.device_registry import DeviceRegistry
+from utils.rpc_port_allocator import RpcPortAllocator
+from constants import *
+
+SOURCE_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+CURRENT_TEMP_DIR = SOURCE_PATH + TEMP_PATH
+ARCHIVE_VERSION = 1
+ARCHIVE_MANIFEST = "manifest.json"
+DEVICES_PREFIX = "devices/"
+DAC_PREFIX = "dac/"
+READDRESS_MODES = ("auto", "always", "never")
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class HashingReader():
+    """
+    HashingReader class for computing the sha256 of a file while tarfile
+    reads it.
+    """
+
+    def __init__(self, file):
+        """
+        Initialize a HashingReader instance.
+
+        Arguments:
+            file {file} -- the file opened in binary mode
+        """
+        self.file = file
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        """
+        Read from the file and update the checksum.
+
+        Arguments:
+            size {int} -- the number of bytes
+        """
+        data = self.file.read(size)
+        self.sha256.update(data)
+        return data
+
+
+class FleetArchive():
+    """
+    FleetArchive class for moving commissioned devices between hosts as one
+    tar stream.
+
+    The archive holds devices/<targetId>/<file> for every file of the
+    storage folder (chip_factory.ini, KVS, config and counters) and
+    dac/<file> for the DAC files of the device. manifest.json is the last
+    member: the registry entry of every device and the sha256 and size of
+    every file. Both directions read and write the stream once, so a pipe
+    (e.g. ssh) can be used and nothing is buffered in memory.
+    """
+
+    @staticmethod
+    def get_dac_files(dict_config):
+        """
+        Return the DAC file names of a device in the DAC folder.
+
+        Arguments:
+            dict_config {dict} -- the registry entry of the device
+        """
+        try:
+            pid_hex = "{:x}".format(int(dict_config['product-id']))
+        except ValueError:
+            return []
+        marker = "-FFF1-{}-{}".format(pid_hex, dict_config['serial-num'])
+        try:
+            names = os.listdir(DAC_DIR)
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names
+                      if (marker + "-") in name or name.endswith(marker + ".txt"))
+
+    @staticmethod
+    def add_file(tar, path, arcname, manifest_files):
+        """
+        Append a file to the archive and record its checksum.
+
+        Arguments:
+            tar {TarFile} -- the archive
+            path {str} -- the file path
+            arcname {str} -- the name in the archive
+            manifest_files {dict} -- {arcname: {sha256, size}} to update
+        """
+        with open(path, "rb") as file:
+            tarinfo = tar.gettarinfo(arcname=arcname, fileobj=file)
+            tarinfo.uid = tarinfo.gid = 0
+            tarinfo.uname = tarinfo.gname = ""
+            reader = HashingReader(file)
+            tar.addfile(tarinfo, reader)
+        manifest_files[arcname] = {
+            "sha256": reader.sha256.hexdigest(), "size": tarinfo.size}
+
+    @staticmethod
+    def export_fleet(fileobj, list_targetid=None, compress=False):
+        """
+        Write the devices to a tar stream.
+
+        Arguments:
+            fileobj {file} -- the binary output stream
+            list_targetid {[str]} -- the devices (default = all commissioned)
+            compress {boolean} -- gzip the stream
+        Return:
+            The list of exported target ids
+        Raises:
+            ValueError: if a requested device is unknown
+        """
+        DeviceRegistry.sync()
+        if list_targetid is None:
+            list_config = [item for item in DeviceRegistry.list_devices()
+                           if item.get('is_recover') == "1"]
+        else:
+            list_config = []
+            for targetid in list_targetid:
+                dict_config = DeviceRegistry.get(targetid)
+                if dict_config is None:
+                    raise ValueError("Unknown device {}".format(targetid))
+                list_config.append(dict_config)
+
+        manifest = {"version": ARCHIVE_VERSION, "created": int(time.time()),
+                    "host": socket.gethostname(), "devices": []}
+        with tarfile.open(fileobj=fileobj, mode="w|gz" if compress else "w|") as tar:
+            for dict_config in list_config:
+                targetid = dict_config['targetId']
+                device_dir = CURRENT_TEMP_DIR + targetid
+                files = {}
+                for entry in sorted(os.scandir(device_dir), key=lambda item: item.name):
+                    if entry.is_file(follow_symlinks=False):
+                        FleetArchive.add_file(
+                            tar, entry.path, DEVICES_PREFIX + targetid + "/" + entry.name,
+                            files)
+                for name in FleetArchive.get_dac_files(dict_config):
+                    FleetArchive.add_file(
+                        tar, os.path.join(DAC_DIR, name), DAC_PREFIX + name, files)
+                manifest["devices"].append(
+                    {"targetId": targetid, "config": dict_config, "files": files})
+            data = json.dumps(manifest, indent=4).encode("utf-8")
+            tarinfo = tarfile.TarInfo(ARCHIVE_MANIFEST)
+            tarinfo.size = len(data)
+            tarinfo.mtime = manifest["created"]
+            tar.addfile(tarinfo, io.BytesIO(data))
+        logging.info("Exported {} devices".format(len(manifest["devices"])))
+        return [item["targetId"] for item in manifest["devices"]]
+
+    @staticmethod
+    def check_member_name(name):
+        """
+        Check an archive member name is one this format writes and stays
+        inside the staging folder.
+
+        Arguments:
+            name {str} -- the member name
+        Raises:
+            ValueError: if the name is not allowed
+        """
+        parts = name.split("/")
+        if (name == ARCHIVE_MANIFEST or
+                (name.startswith(DEVICES_PREFIX) and len(parts) == 3) or
+                (name.startswith(DAC_PREFIX) and len(parts) == 2)):
+            if all(part not in ("", ".", "..") for part in parts):
+                return
+        raise ValueError("Unexpected archive member {}".format(name))
+
+    @staticmethod
+    def stage(fileobj, staging_dir):
+        """
+        Extract a tar stream to a staging folder.
+
+        Arguments:
+            fileobj {file} -- the binary input stream
+            staging_dir {str} -- the staging folder
+        Return:
+            (manifest, {arcname: {sha256, size}} of the extracted files)
+        Raises:
+            ValueError: if the archive is not a fleet archive
+        """
+        manifest = None
+        extracted = {}
+        with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+            for member in tar:
+                FleetArchive.check_member_name(member.name)
+                if not member.isfile():
+                    raise ValueError("Unexpected archive member {}".format(member.name))
+                source = tar.extractfile(member)
+                if member.name == ARCHIVE_MANIFEST:
+                    manifest = json.loads(source.read().decode("utf-8"))
+                    continue
+                path = os.path.join(staging_dir, member.name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                sha256 = hashlib.sha256()
+                with open(path, "wb") as file:
+                    while True:
+                        data = source.read(COPY_BUFFER_SIZE)
+                        if not data:
+                            break
+                        sha256.update(data)
+                        file.write(data)
+                os.chmod(path, member.mode & 0o777)
+                os.utime(path, (member.mtime, member.mtime))
+                extracted[member.name] = {"sha256": sha256.hexdigest(),
+                                          "size": member.size}
+        if manifest is None or manifest.get("version") != ARCHIVE_VERSION:
+            raise ValueError("The archive has no supported manifest")
+        return manifest, extracted
+
+    @staticmethod
+    def verify(manifest, extracted):
+        """
+        Check every file of the manifest was extracted with its checksum.
+
+        Arguments:
+            manifest {dict} -- the archive manifest
+            extracted {dict} -- the extracted files from stage()
+        Raises:
+            ValueError: if a file is missing, unexpected or corrupted
+        """
+        expected = {}
+        for device in manifest["devices"]:
+            expected.update(device["files"])
+        for arcname, info in expected.items():
+            if extracted.get(arcname) != info:
+                raise ValueError("Checksum mismatch or missing file {}".format(arcname))
+        unexpected = set(extracted) - set(expected)
+        if unexpected:
+            raise ValueError("Files not in the manifest: {}".format(
+                ", ".join(sorted(unexpected))))
+
+    @staticmethod
+    def import_fleet(fileobj, readdress="auto", replace=False):
+        """
+        Restore the devices of a tar stream.
+
+        The archive is extracted and verified in a staging folder next to
+        temp/ first, nothing is restored when a checksum does not match.
+        Devices which already exist are skipped unless replace is set, devices
+        without chip_factory.ini are always skipped.
+
+        Arguments:
+            fileobj {file} -- the binary input stream
+            readdress {str} -- "auto" gives new addresses to the devices
+                               which are not on the subnet of this host or
+                               conflict with a stored device, "always" to all
+                               devices, "never" keeps the addresses
+            replace {boolean} -- overwrite the devices which already exist
+        Return:
+            The list of restored target ids
+        Raises:
+            ValueError: if the archive is not valid
+        """
+        if readdress not in READDRESS_MODES:
+            raise ValueError("Unknown readdress mode {}".format(readdress))
+        os.makedirs(CURRENT_TEMP_DIR, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix=".import-", dir=SOURCE_PATH)
+        try:
+            manifest, extracted = FleetArchive.stage(fileobj, staging_dir)
+            FleetArchive.verify(manifest, extracted)
+            return FleetArchive.restore(manifest, staging_dir, readdress, replace)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    @staticmethod
+    def restore(manifest, staging_dir, readdress, replace):
+        """
+        Move the verified devices from the staging folder to temp/.
+
+        Arguments:
+            manifest {dict} -- the archive manifest
+            staging_dir {str} -- the staging folder
+            readdress {str} -- see import_fleet()
+            replace {boolean} -- overwrite the devices which already exist
+        Return:
+            The list of restored target ids
+        """
+        DeviceRegistry.sync()
+        list_devices = DeviceRegistry.list_devices()
+        stored = {item['targetId'] for item in list_devices}
+        restored_ids = {device["targetId"] for device in manifest["devices"]}
+        # Addresses kept by the devices which are not replaced
+        others = [item for item in list_devices
+                  if not (replace and item['targetId'] in restored_ids)]
+        used_ipv4 = {item['ipv4'] for item in others}
+        used_ipv6 = {item['ipv6'] for item in others}
+        used_index = {int(item['interface_index']) for item in others
+                      if item['interface_index'].isdigit()}
+        for item in others:
+            if item['rpc-port'].isdigit():
+                RpcPortAllocator.reserve(item['targetId'], int(item['rpc-port']))
+        addresses = None
+        if readdress != "never":
+            base_ipv4, base_ipv6, host_addresses = DeviceCloner.get_base_addresses()
+            used_ipv4 |= host_addresses
+            used_ipv6 |= host_addresses
+            addresses = (base_ipv4, base_ipv6,
+                         '.'.join(base_ipv4.split('.')[:-1] + ["255"]),
+                         ':'.join(base_ipv6.split(':')[:-1] + ["ffff"]))
+        interface_index = max(used_index | {0}) + 1
+        os.makedirs(DAC_DIR, exist_ok=True)
+
+        list_targetid = []
+        for device in manifest["devices"]:
+            targetid = device["targetId"]
+            if (targetid in stored) and (not replace):
+                logging.warning("Skip {}, it already exists".format(targetid))
+                continue
+            if (DEVICES_PREFIX + targetid + "/" + CHIP_FACTORY_FILE) not in device["files"]:
+                # Nothing was staged for a device whose folder had no files
+                logging.warning("Skip {}, the archive has no {}".format(
+                    targetid, CHIP_FACTORY_FILE))
+                continue
+            device_dir = CURRENT_TEMP_DIR + targetid
+            if os.path.exists(device_dir):
+                shutil.rmtree(device_dir)
+            os.rename(os.path.join(staging_dir, DEVICES_PREFIX + targetid), device_dir)
+            for arcname in device["files"]:
+                if arcname.startswith(DAC_PREFIX):
+                    os.replace(os.path.join(staging_dir, arcname),
+                               os.path.join(DAC_DIR, arcname[len(DAC_PREFIX):]))
+
+            with AtomicIniBatch(os.path.join(device_dir, CHIP_FACTORY_FILE)) as fields:
+                if addresses is not None and FleetArchive.needs_new_address(
+                        fields, readdress, addresses, used_ipv4, used_ipv6):
+                    base_ipv4, base_ipv6, ipv4_limit, ipv6_limit = addresses
+                    fields['ipv4'] = DeviceCloner.next_free(
+                        base_ipv4, used_ipv4, ipv4_limit, IPv4Address)
+                    fields['ipv6'] = DeviceCloner.next_free(
+                        base_ipv6, used_ipv6, ipv6_limit, IPv6Address)
+                    fields['interface_index'] = str(interface_index)
+                    interface_index += 1
+                else:
+                    used_ipv4.add(fields.get('ipv4', ""))
+                    used_ipv6.add(fields.get('ipv6', ""))
+                port = fields.get('rpc-port', "")
+                if (not port.isdigit()) or (
+                        RpcPortAllocator.get_owner(port) not in (None, targetid)) or (
+                        not RpcPortAllocator.is_port_free(int(port))):
+                    port = RpcPortAllocator.allocate(targetid)
+                    if port is None:
+                        raise ValueError("No free rpc port")
+                    fields['rpc-port'] = str(port)
+                else:
+                    RpcPortAllocator.reserve(targetid, int(port))
+                dict_config = dict(fields)
+            DeviceRegistry.upsert(targetid, dict_config)
+            list_targetid.append(targetid)
+        logging.info("Imported {} devices".format(len(list_targetid)))
+        return list_targetid
+
+    @staticmethod
+    def needs_new_address(fields, readdress, addresses, used_ipv4, used_ipv6):
+        """
+        Check a restored device must get new addresses.
+
+        Arguments:
+            fields {dict} -- the chip_factory.ini fields of the device
+            readdress {str} -- "auto" or "always"
+            addresses {tuple} -- (base ipv4, base ipv6, ipv4 limit, ipv6 limit)
+            used_ipv4 {set} -- the ipv4 addresses already given
+            used_ipv6 {set} -- the ipv6 addresses already given
+        """
+        if readdress == "always":
+            return True
+        base_ipv4, base_ipv6, _, _ = addresses
+        ipv4 = fields.get('ipv4', "")
+        ipv6 = fields.get('ipv6', "")
+        same_ipv4_subnet = ipv4.split('.')[:-1] == base_ipv4.split('.')[:-1]
+        same_ipv6_subnet = ipv6.split(':')[:-1] == base_ipv6.split(':')[:-1]
+        return ((not same_ipv4_subnet) or (not same_ipv6_subnet) or
+                (ipv4 in used_ipv4) or (ipv6 in used_ipv6))
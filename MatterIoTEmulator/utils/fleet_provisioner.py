@@ -0,0 +1,452 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import csv
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ipaddress import IPv4Address, IPv6Address
+from credentials.development.gen_dac_cert import GenDacTool
+from setup_payload.generate_setup_payload import SetupPayload
+from utils.app_config import AppConfig
+from utils.device_clone import DeviceCloner
+from utils.device_registry import DeviceRegistry
+from utils.device_runner import DeviceRunner
+from utils.identity_allocator import IdentityAllocator
+from utils.rpc_port_allocator import RpcPortAllocator
+from utils.running_devices import RunningDeviceRegistry
+from constants import *
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+SOURCE_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+CURRENT_TEMP_DIR = SOURCE_PATH + TEMP_PATH
+
+# manifest column, parameter_constraints key, chip_factory.ini option
+MANIFEST_IDENTITY_FIELDS = [
+    ('vendor_id', 'vendor_id', 'vendor-id'),
+    ('product_id', 'product_id', 'product-id'),
+    ('serial_start', 'serial_number', 'serial-num'),
+    ('discriminator_start', 'discriminator', 'discriminator'),
+    ('pin_code_start', 'pin_code', 'pin-code')]
+
+
+class FleetManifest():
+    """
+    FleetManifest class for reading a fleet manifest and expanding it into
+    device identities.
+
+    A manifest is a CSV file with a header line, or a YAML file (when PyYAML
+    is installed) holding a list of mappings or a mapping with a "devices"
+    list. Every entry has the columns:
+
+        device_type          -- "On/Off Light(0x0100)", "On/Off Light" or "0x0100"
+        count                -- number of devices (default = 1)
+        vendor_id            -- default: parameter_constraints
+        product_id           -- default: config_info of the device type
+        serial_start         -- default: next serial after the stored devices
+        discriminator_start  -- default: allocated
+        pin_code_start       -- default: allocated
+
+    The n-th device of an entry uses serial_start + n and
+    discriminator_start + n, pin codes count up from pin_code_start skipping
+    the insecure ones. When an entry gives neither start, its discriminators
+    and pin codes are handed out by IdentityAllocator, unique across the
+    stored devices. Expanding only previews the values, nothing is
+    allocated before FleetProvisioner.prepare().
+    """
+
+    @staticmethod
+    def load(path):
+        """
+        Return the entries of a manifest file.
+
+        Arguments:
+            path {str} -- the manifest file (.csv, .yaml or .yml)
+        Raises:
+            OSError: if the file can not be read
+            ValueError: if the file format is not supported
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension in (".yaml", ".yml"):
+            if yaml is None:
+                raise ValueError("PyYAML is required to read {}".format(path))
+            with open(path) as file:
+                data = yaml.safe_load(file) or []
+            if isinstance(data, dict):
+                data = data.get("devices", [])
+            if (not isinstance(data, list)) or (
+                    not all(isinstance(item, dict) for item in data)):
+                raise ValueError("{} must hold a list of devices".format(path))
+            entries = data
+        elif extension == ".csv":
+            with open(path, newline="") as file:
+                entries = [row for row in csv.DictReader(file)
+                           if any((value or "").strip() for value in row.values())]
+        else:
+            raise ValueError("Unsupported manifest format {}".format(extension))
+        return [{str(key).strip(): (str(value).strip() if value is not None else "")
+                 for key, value in entry.items() if key is not None}
+                for entry in entries]
+
+    @staticmethod
+    def find_device_type(device_list, device_type):
+        """
+        Return the device_list name of a device type, or None.
+
+        Arguments:
+            device_list {[str]} -- the device_list of config.json
+            device_type {str} -- the name, the name with id or the id
+        """
+        for name in device_list:
+            device_id = name[-7:-1]
+            if (device_type == name or device_type == name[:-8] or
+                    device_type.lower() == device_id.lower()):
+                return name
+        return None
+
+    @staticmethod
+    def in_range(value, constraint):
+        """
+        Check a value against a parameter_constraints range, a range with one
+        element allows that value only.
+
+        Arguments:
+            value {int} -- the value
+            constraint {dict} -- the constraint with its "range"
+        """
+        bounds = constraint["range"]
+        if len(bounds) == 1:
+            return value == bounds[0]
+        return bounds[0] <= value <= bounds[1]
+
+    @staticmethod
+    def next_free_serial():
+        """
+        Return the serial number after the highest stored one.
+        """
+        DeviceRegistry.sync()
+        serials = [int(item['serial-num']) for item in DeviceRegistry.list_devices()
+                   if item['serial-num'].isdigit()]
+        return max(serials, default=0) + 1
+
+    @staticmethod
+    def expand(entries, limit=None):
+        """
+        Validate the entries and return one identity per device.
+
+        Arguments:
+            entries {[dict]} -- the manifest entries
+            limit {int} -- the maximum number of devices
+                           (default = max_number_of_device of config.json)
+        Return:
+            The list of {targetId, device-type, vendor-id, product-id,
+            serial-num, discriminator, pin-code, allocated} dictionaries,
+            allocated is True when IdentityAllocator chooses the
+            discriminator and pin code
+        Raises:
+            ValueError: with one line per problem if the manifest is invalid
+        """
+        configs = AppConfig.get()
+        constraints = configs['parameter_constraints']
+        device_list = configs['device_list']
+        if limit is None:
+            limit = configs['max_number_of_device']
+        errors = []
+        devices = []
+        target_ids = set()
+        next_serial = None
+        for number, entry in enumerate(entries, 1):
+            device_type = FleetManifest.find_device_type(
+                device_list, entry.get('device_type', ""))
+            if device_type is None:
+                errors.append("Entry {}: unsupported device type '{}'".format(
+                    number, entry.get('device_type', "")))
+                continue
+            config_info = (AppConfig.get_device_type(device_type[-7:-1]) or {}).get(
+                'config_info', {})
+            values = {}
+            allocated = all(entry.get(field, "") == ""
+                            for field in ('discriminator_start', 'pin_code_start'))
+            try:
+                values['count'] = int(entry.get('count') or 1)
+                for field, key, _ in MANIFEST_IDENTITY_FIELDS:
+                    value = entry.get(field, "")
+                    if value == "" and key == 'serial_number':
+                        if next_serial is None:
+                            next_serial = FleetManifest.next_free_serial()
+                        value = next_serial
+                    elif value == "":
+                        value = config_info.get(
+                            key, constraints[key]['default_value'])
+                    values[field] = int(value)
+            except ValueError as err:
+                errors.append("Entry {}: {}".format(number, err))
+                continue
+            if values['count'] < 1:
+                errors.append("Entry {}: count must be positive".format(number))
+                continue
+
+            pin_code = values['pin_code_start']
+            for index in range(values['count']):
+                while pin_code in INVALID_PASSCODES:
+                    pin_code += 1
+                device = {
+                    'device-type': device_type,
+                    'vendor-id': values['vendor_id'],
+                    'product-id': values['product_id'],
+                    'serial-num': values['serial_start'] + index,
+                    'discriminator': values['discriminator_start'] + index,
+                    'pin-code': pin_code,
+                    'allocated': allocated}
+                pin_code += 1
+                targetid = (hex(device['vendor-id'])[2:] + hex(device['product-id'])[2:] +
+                            '-' + hex(device['serial-num'])[2:])
+                for _, key, option in MANIFEST_IDENTITY_FIELDS:
+                    if allocated and key in ('discriminator', 'pin_code'):
+                        # Moved in range by IdentityAllocator
+                        continue
+                    if not FleetManifest.in_range(device[option], constraints[key]):
+                        errors.append("Entry {} device {}: {} {} is out of range {}".format(
+                            number, index + 1, key, device[option],
+                            constraints[key]['range']))
+                device['targetId'] = targetid
+                if targetid in target_ids:
+                    errors.append("Entry {} device {}: {} is listed twice".format(
+                        number, index + 1, targetid))
+                elif RunningDeviceRegistry.contains(targetid):
+                    errors.append("Entry {} device {}: {} is already running".format(
+                        number, index + 1, targetid))
+                else:
+                    stored = DeviceRegistry.get(targetid)
+                    if stored is not None and stored.get('is_recover') in ("1", 1):
+                        errors.append("Entry {} device {}: {} is already commissioned".format(
+                            number, index + 1, targetid))
+                target_ids.add(targetid)
+                devices.append(device)
+            if values['serial_start'] + values['count'] > (next_serial or 0):
+                next_serial = values['serial_start'] + values['count']
+
+        if len(devices) > limit:
+            errors.append("The manifest has {} devices, only {} are supported".format(
+                len(devices), limit))
+        if errors:
+            raise ValueError("\n".join(errors))
+        return FleetManifest.apply_identities(devices, IdentityAllocator.plan)
+
+    @staticmethod
+    def apply_identities(devices, assign):
+        """
+        Return the devices with the discriminator and pin code handed out by
+        IdentityAllocator.
+
+        Arguments:
+            devices {[dict]} -- the devices from expand()
+            assign {function} -- IdentityAllocator.plan to preview the
+                                 values or IdentityAllocator.assign to keep them
+        """
+        # The values given by the manifest first, the allocated ones avoid them
+        order = sorted(range(len(devices)), key=lambda index: devices[index]['allocated'])
+        identities = dict(zip(order, assign([
+            (devices[index]['targetId'], devices[index]['discriminator'],
+             devices[index]['pin-code'], devices[index]['allocated'])
+            for index in order])))
+        result = []
+        for index, device in enumerate(devices):
+            (discriminator, pincode), shared = identities[index]
+            if shared:
+                logging.warning("{} shares its discriminator or pin code with {}".format(
+                    device['targetId'], ", ".join(shared)))
+            result.append(dict(device, discriminator=discriminator, **{'pin-code': pincode}))
+        return result
+
+
+class FleetProvisioner():
+    """
+    FleetProvisioner class for preparing the devices of a manifest before
+    they are started.
+
+    The IPv4/IPv6 addresses and interface index of every device are leased
+    in manifest order, like DeviceCloner does for clones. The storage folder
+    with chip_factory.ini, the DAC, the onboarding payload and the rpc port
+    lease of every device are then created by a pool of threads. The devices are not started here, the application starts them
+    one by one with the normal Start Device flow which finds everything in
+    place.
+    """
+
+    @staticmethod
+    def get_onboarding_codes(device):
+        """
+        Return the (QR code, manual pairing code) of a device.
+
+        Arguments:
+            device {dict} -- a device from FleetManifest.expand()
+        """
+        payloads = SetupPayload()
+        qrcode = payloads.generate_qrcode(
+            device['pin-code'], discriminator=device['discriminator'],
+            vid=device['vendor-id'], pid=device['product-id'])
+        manual_code = payloads.generate_manualcode(
+            device['pin-code'], discriminator=device['discriminator'],
+            vid=device['vendor-id'], pid=device['product-id'])
+        return qrcode, manual_code
+
+    @staticmethod
+    def lease_addresses(devices):
+        """
+        Return the devices with the IPv4/IPv6 address and interface index
+        they start with, the first ones not used by a stored device.
+
+        Arguments:
+            devices {[dict]} -- the devices from FleetManifest.expand()
+        Raises:
+            ValueError: if the uplink has no base address or the address
+                        range is exhausted
+        """
+        DeviceRegistry.sync()
+        target_ids = {device['targetId'] for device in devices}
+        # A prepared device which is prepared again gets new addresses
+        others = [item for item in DeviceRegistry.list_devices()
+                  if item['targetId'] not in target_ids]
+        used_ipv4 = {item['ipv4'] for item in others}
+        used_ipv6 = {item['ipv6'] for item in others}
+        used_index = {int(item['interface_index']) for item in others
+                      if item['interface_index'].isdigit()}
+        base_ipv4, base_ipv6, host_addresses = DeviceCloner.get_base_addresses()
+        used_ipv4 |= host_addresses
+        used_ipv6 |= host_addresses
+        ipv4_limit = '.'.join(base_ipv4.split('.')[:-1] + ["255"])
+        ipv6_limit = ':'.join(base_ipv6.split(':')[:-1] + ["ffff"])
+        interface_index = max(used_index | {0}) + 1
+        result = []
+        for device in devices:
+            result.append(dict(device, **{
+                'ipv4': DeviceCloner.next_free(
+                    base_ipv4, used_ipv4, ipv4_limit, IPv4Address),
+                'ipv6': DeviceCloner.next_free(
+                    base_ipv6, used_ipv6, ipv6_limit, IPv6Address),
+                'interface_index': str(interface_index)}))
+            interface_index += 1
+        return result
+
+    @staticmethod
+    def prepare_device(device):
+        """
+        Create the storage folder, rpc port lease, DAC and payload of a device.
+
+        Arguments:
+            device {dict} -- a device from lease_addresses()
+        Return:
+            The device dictionary with create-time, rpc-port, qrcode,
+            manual-code and error ("" on success)
+        """
+        result = dict(device)
+        result['error'] = ""
+        targetid = device['targetId']
+        device_dir = CURRENT_TEMP_DIR + targetid
+        created = not os.path.isdir(device_dir)
+        try:
+            os.makedirs(device_dir, exist_ok=True)
+            create_time = int(time.time())
+            rpc_port = RpcPortAllocator.allocate(targetid)
+            if rpc_port is None:
+                raise ValueError("no free rpc port")
+            DeviceRunner("cd").update_SN_config_file(
+                os.path.join(device_dir, CHIP_FACTORY_FILE),
+                str(device['serial-num']),
+                str(device['product-id']),
+                str(device['discriminator']),
+                str(device['pin-code']),
+                device['device-type'],
+                create_time,
+                ipv4=device['ipv4'],
+                ipv6=device['ipv6'],
+                rpc_port=str(rpc_port),
+                interface_index=device['interface_index'],
+                vendor_id=str(device['vendor-id']),
+                provisioned="1")
+            DeviceRegistry.upsert(targetid, {
+                'product-id': device['product-id'],
+                'serial-num': device['serial-num'],
+                'discriminator': device['discriminator'],
+                'pin-code': device['pin-code'],
+                'device-type': device['device-type'],
+                'create-time': create_time,
+                'ipv4': device['ipv4'],
+                'ipv6': device['ipv6'],
+                'rpc-port': rpc_port,
+                'interface_index': device['interface_index'],
+                'is_recover': "",
+                'vendor-id': device['vendor-id'],
+                'unique-id': "",
+                'provisioned': "1"})
+            try:
+                is_gen_dac_done = GenDacTool(targetid).gen_dac_cert()
+            except SystemExit:
+                # GenDacTool exits when chip-cert reports an error
+                is_gen_dac_done = False
+            if not is_gen_dac_done:
+                raise ValueError("fail to create DAC")
+            result['qrcode'], result['manual-code'] = \
+                FleetProvisioner.get_onboarding_codes(device)
+            result['create-time'] = create_time
+            result['rpc-port'] = rpc_port
+        except (OSError, ValueError) as err:
+            result['error'] = str(err)
+            logging.error("Fail to prepare device {}: {}".format(targetid, err))
+            if created:
+                # Leave nothing of a device which was not there before
+                shutil.rmtree(device_dir, ignore_errors=True)
+                DeviceRegistry.delete(targetid)
+                RpcPortAllocator.release_device(targetid)
+                IdentityAllocator.release(targetid)
+        return result
+
+    @staticmethod
+    def prepare(devices, workers=PROVISION_WORKERS):
+        """
+        Lease the addresses and allocate the discriminators and pin codes of
+        the devices in manifest order, then prepare the devices in parallel.
+
+        Arguments:
+            devices {[dict]} -- the devices from FleetManifest.expand()
+            workers {int} -- the number of threads
+        Return:
+            (the results in manifest order, elapsed seconds), every device
+            fails when no address can be leased
+        """
+        start = time.perf_counter()
+        try:
+            devices = FleetProvisioner.lease_addresses(devices)
+        except ValueError as err:
+            logging.error("Fail to lease the device addresses: {}".format(err))
+            return ([dict(device, error=str(err)) for device in devices],
+                    time.perf_counter() - start)
+        devices = FleetManifest.apply_identities(devices, IdentityAllocator.assign)
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            results = list(executor.map(FleetProvisioner.prepare_device, devices))
+        elapsed = time.perf_counter() - start
+        prepared = len([item for item in results if not item['error']])
+        logging.info("Prepared {} of {} devices in {:.2f}s ({:.1f} devices/s)".format(
+            prepared, len(devices), elapsed,
+            prepared / elapsed if elapsed > 0 else 0.0))
+        return results, elapsed
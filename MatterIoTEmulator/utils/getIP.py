@@ -19,6 +19,8 @@ import subprocess
 import shlex
 import re
 from utils.handle_recover import HandleRecoverDevices
+from utils.interface_state import InterfaceStateCache
+from utils.rpc_port_allocator import RpcPortAllocator
 from ipaddress import IPv4Address, IPv6Address
 from constants import *
 from utils.network_interface_priority import *
@@ -42,18 +44,19 @@ class CreateIpAddress:
         self.listIpv6 = []
         self.rpc_port = 33000
         self.interface = ""
+        self.network_if_name = get_network_if_name()
         self.is_base_ip = True
         self.interface_index = 0
 
     def releaseRpcPort(self, rpc_port):
         """
-        Release a port which a process is running on.
+        Release the reservation of a port which a device was running on.
+        The device process itself is killed by DeviceRunner.stop().
 
         Arguments:
             rpc_port {str} -- the port number
         """
-        port = "{}/tcp".format(str(rpc_port))
-        subprocess.run(["fuser", "-k", str(port)])
+        RpcPortAllocator.release(rpc_port)
 
     def generateTargetId(self, vendorID, productID, serialNumber):
         """
@@ -190,9 +193,10 @@ class CreateIpAddress:
                 print("-----------Interface index: ", self.interface_index)
 
                 self.interface = "{}:{}".format(
-                    NETWORK_IF_NAME, str(self.interface_index))
+                    self.network_if_name, str(self.interface_index))
                 subprocess.run(
                     ["sudo", "ifconfig", self.interface, "inet", self.Ipv4Address, "up"])
+                InterfaceStateCache.invalidate()
                 return ModifyAddress
             else:
                 self.countV4 = self.countV4 + INDEX_INCREASE
@@ -248,8 +252,9 @@ class CreateIpAddress:
                     self.pingOnlyOne(ModifyAddress))):
                 print("FPT--> ipv6 address is available: ", ModifyAddress)
                 self.Ipv6Address = str(ModifyAddress).strip()
-                subprocess.run(["sudo", "ifconfig", NETWORK_IF_NAME,
+                subprocess.run(["sudo", "ifconfig", self.network_if_name,
                                "inet6", "add", self.Ipv6Address, "up"])
+                InterfaceStateCache.invalidate()
                 return ModifyAddress
             else:
                 self.countV6 = self.countV6 + INDEX_INCREASE
@@ -272,7 +277,7 @@ class CreateIpAddress:
         outputlist = []
         # Iterate over all the servers in the list and ping each server
         for server in IpAddresses:
-            cmdStr = f'ping -I {NETWORK_IF_NAME} -c 1 '
+            cmdStr = f'ping -I {get_network_if_name()} -c 1 '
             cmdStr = cmdStr + server
             cmd = shlex.split(cmdStr)
             temp = subprocess.Popen(cmd, stdout=subprocess.PIPE)
@@ -292,7 +297,7 @@ class CreateIpAddress:
             True : if the ip address ping is alive
             False : if the ip address ping is dead
         """
-        cmdStr = f'ping -I {NETWORK_IF_NAME} -c 1 '
+        cmdStr = f'ping -I {get_network_if_name()} -c 1 '
         outputlist = []
         bytesDatas = []
         # Iterate over all the servers in the list and ping each server
@@ -315,10 +320,32 @@ class CreateIpAddress:
         print(
             f"FPT -->Stop device and Remove ip: {self.interface}-->{self.Ipv6Address} || {self.Ipv4Address}")
         subprocess.run(["sudo", "ip", "addr", "del",
-                       self.Ipv4Address, "dev", NETWORK_IF_NAME])
+                       self.Ipv4Address, "dev", self.network_if_name])
         # remove ipv6
         subprocess.run(["sudo", "ip", "addr", "del",
-                       self.Ipv6Address, "dev", NETWORK_IF_NAME])
+                       self.Ipv6Address, "dev", self.network_if_name])
+        InterfaceStateCache.invalidate()
+
+    def rehome(self, network_if_name):
+        """
+        Move the ip addresses of the device to another network interface.
+
+        Arguments:
+            network_if_name {str} -- the new network interface name
+        """
+        if (network_if_name == self.network_if_name):
+            return
+        print(
+            f"FPT --> Move ip {self.Ipv4Address} || {self.Ipv6Address}: {self.network_if_name} -> {network_if_name}")
+        self.removeIpAfterStopDevice()
+        self.network_if_name = network_if_name
+        self.interface = "{}:{}".format(
+            self.network_if_name, str(self.interface_index))
+        subprocess.run(
+            ["sudo", "ifconfig", self.interface, "inet", self.Ipv4Address, "up"])
+        subprocess.run(["sudo", "ifconfig", self.network_if_name,
+                       "inet6", "add", self.Ipv6Address, "up"])
+        InterfaceStateCache.invalidate()
 
     def scanAndCreateIp(self, list_ip=[]):
         """
@@ -329,40 +356,29 @@ class CreateIpAddress:
         Return:
             The ipv4 and ipv6 address of the device
         """
+        self.network_if_name = get_network_if_name()
         if len(list_ip) == 2:
             print("recover ip ", list_ip[0], list_ip[1])
             self.createAllIp(list_ip[0], list_ip[1])
             return list_ip
         else:
-            cmd = f"ifconfig {NETWORK_IF_NAME}"
-            argus = shlex.split(cmd)
-            temp = subprocess.Popen(argus, stdout=subprocess.PIPE)
-            # get the output as a string
-            output = str(temp.communicate())
             outputlist = []
+            addr_info_list = InterfaceStateCache.get_addr_info(self.network_if_name)
 
             # getIPv4
-            outv4 = re.findall(
-                'inet ([0-9]{1,3}\\.[0-9]{1,3}\\.[0-9]{1,3}\\.[0-9]{1,3}).*', output)
-
-            # getIPv6
-            inet6OutputList = output.split('\\n')
-            outv6 = []
+            outv4 = [item["local"] for item in addr_info_list
+                     if item.get("family") == IP_VERSION4]
 
             # get list ipv6
-            for inet6 in inet6OutputList:
-                if ("inet6" in inet6):
-                    tempstr = re.findall('inet6 (.*)  prefixlen', inet6)
-                    if (len(tempstr) > 0):
-                        self.listIpv6.append(tempstr[0])
-
-            for inet6Output in inet6OutputList:
-                if (("inet6" in inet6Output) and (
-                        "link" in inet6Output) and ("64" in inet6Output)):
-                    outv6 = re.findall('inet6 (.*)  prefixlen', inet6Output)
-
-            if ((len(outv6) == 0) and (len(inet6OutputList) >= 1)):
-                outv6 = re.findall('inet6 (.*)  prefixlen', inet6OutputList[0])
+            for item in addr_info_list:
+                if (item.get("family") == IP_VERSION6):
+                    self.listIpv6.append(item["local"])
+
+            # getIPv6
+            outv6 = [item["local"] for item in addr_info_list
+                     if (item.get("family") == IP_VERSION6 and
+                         item.get("scope") == IP_VERSION6_SCOPE and
+                         item.get("prefixlen") == IP_VERSION6_PREFIXLEN)][-1:]
 
             if (len(outv4) > 0):
                 outputlist.append(outv4[0])
@@ -25,7 +25,10 @@ import configparser
 import time
 import datetime
 from datetime import date
-from constants import CHIP_FACTORY_FILE, TEMP_PATH, NUMBER_STORAGE_FILE
+from constants import TEMP_PATH
+from utils.device_registry import DeviceRegistry
+from utils.rpc_port_allocator import RpcPortAllocator
+from utils.storage_consistency import StorageConsistencyChecker
 
 SOURCE_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
 CURRENT_TEMP_DIR = SOURCE_PATH + TEMP_PATH
@@ -41,7 +44,7 @@ class HandleRecoverDevices():
     list_recover_ipv6 = []
     list_recover_ipv4 = []
     list_recover_interface_index = []
-    list_recover_rpc_port = []
+    list_recover_rpc_port = RpcPortAllocator.recover_ports
     is_recover = False
 
     def __init__(self):
@@ -101,6 +104,7 @@ class HandleRecoverDevices():
             if (os.path.exists(path)):
                 shutil.rmtree(path)
                 print("Remove temp folder {}".format(path))
+            DeviceRegistry.delete(folder_name)
 
     def get_folder_name_from_file_path(self, filepath):
         """
@@ -146,123 +150,73 @@ class HandleRecoverDevices():
                   HandleRecoverDevices.list_recover_devices)
 
     @staticmethod
-    def get_all_storage_folders():
+    def get_all_storage_folders(sync=True):
         """
-        Return all the devices working directory.
+        Return all the devices working directory ordered by create time.
 
-        Raise:
-            Exception: if can not get storage path
+        Arguments:
+            sync {boolean} -- update the device registry from temp/ first
         """
-        path_storage = CURRENT_TEMP_DIR
-        try:
-            list_dir = os.listdir(path_storage)
-        except OSError as err:
-            print("Fail to get path of storage folder: {}".format(err))
+        if sync:
+            DeviceRegistry.sync()
         dict_dir_time = {}
-        for dir in list_dir:
-            fullPath = path_storage + str(dir)
-            if (not os.path.isdir(fullPath)):
-                continue
-            tmp_time = HandleRecoverDevices.get_order_created_folder(fullPath)
-            create_time = int(tmp_time) if tmp_time is not None else 0
+        for dict_config in DeviceRegistry.list_devices():
+            create_time = HandleRecoverDevices.get_order_created_folder(
+                dict_config)
             if (create_time != 0):
-                dict_dir_time[str(dir)] = create_time
+                dict_dir_time[dict_config['targetId']] = create_time
 
         list_folder_names = HandleRecoverDevices.sort_all_dirs(dict_dir_time)
         return list_folder_names
 
     @staticmethod
-    def get_order_created_folder(path):
+    def get_order_created_folder(dict_config):
         """
-        Return the created time of a folder path.
+        Return the created time of a device, or 0 if it can not be recovered.
 
         Arguments:
-            path {str} -- the path folder
+            dict_config {dict} -- the registry entry of the device
         """
-        config_file = path + "/" + CHIP_FACTORY_FILE
-        dict_config = HandleRecoverDevices.read_config_file(config_file, "")
-        if (len(dict_config) == 0):
-            return 0
         if (dict_config.get('device-type') != "" and dict_config.get('ipv4') !=
                 "" and dict_config.get('ipv6') != "" and dict_config.get('create-time') != ""):
-            return dict_config.get('create-time', 0)
-        elif (os.path.exists(path)):
-            shutil.rmtree(path)
+            try:
+                return int(dict_config.get('create-time'))
+            except ValueError:
+                StorageConsistencyChecker.mark_dirty(dict_config['targetId'])
         return 0
 
     @staticmethod
     def sort_all_dirs(dict_dir_time):
         """
-        Return the sorted list directory.
-
-        Arguments:
-            dict_dir_time {str} -- the dict of folder with time
-        """
-        list_folder_names = []
-        list_time_value = list(dict_dir_time.values())
-        if (len(list_time_value) > 0):
-            list_time_value.sort(reverse=False)
-            for val in list_time_value:
-                key = HandleRecoverDevices.get_key_dic(val, dict_dir_time)
-                if ("None" not in key):
-                    list_folder_names.append(str(key))
-        return list_folder_names
-
-    @staticmethod
-    def get_key_dic(val, dict):
-        """
-        Return the key with value in a dict.
+        Return the folder names sorted by create time, then by name.
 
         Arguments:
-            val {str} -- the value of a dict
-            dict {dict} -- the dict
-        Return:
-            Key: if the key is found
-            "None": if the key is not found
-        """
-        for key, value in dict.items():
-            if val == value:
-                return key
-        return "None"
-    
-    @staticmethod
-    def remove_storage_folder_lack_file():
+            dict_dir_time {dict} -- the dict of folder with time
         """
-        Remove storage folder of device which 
-        has lack config file.
-        """
-        path_storage = CURRENT_TEMP_DIR
-        try: 
-            list_dir = os.listdir(path_storage)
-        except OSError as err:
-            print("Fail to get path of storage folder: {}".format(err))    
-        for dir in list_dir:
-            fullPath = path_storage + str(dir)
-            entries = os.listdir(fullPath)
-            # Count the files in storage folder
-            file_count = sum(os.path.isfile(os.path.join(fullPath, entry)) for entry in entries)
-            if((file_count < NUMBER_STORAGE_FILE) and (os.path.exists(fullPath))):
-                shutil.rmtree(fullPath)
-                print("Remove temp folder {}, reason lack file".format(fullPath)) 
+        return sorted(dict_dir_time, key=lambda name: (dict_dir_time[name], name))
 
     @staticmethod
     def remove_un_commissioned_storage_folder():
         """
         Remove storage folder of device which 
-        has not commissioned yet.
+        has not commissioned yet. Folders prepared from a fleet manifest
+        (provisioned=1) are kept. Broken folders are left to the first pass
+        of StorageConsistencyChecker in the background.
         """
         try:
-            HandleRecoverDevices.remove_storage_folder_lack_file()
-            HandleRecoverDevices.list_recover_devices = HandleRecoverDevices.get_all_storage_folders()
-            for i, subdir in enumerate(HandleRecoverDevices.list_recover_devices):
+            DeviceRegistry.sync()
+            for dict_config in DeviceRegistry.list_devices():
+                subdir = dict_config['targetId']
                 path = CURRENT_TEMP_DIR + subdir
-                if(os.path.isdir(path)):
-                    config_file = path + "/" + CHIP_FACTORY_FILE
-                    dict_config = HandleRecoverDevices.read_config_file(config_file, subdir)
-                    is_recover = (dict_config.get('is_recover') is not None) and (int(dict_config.get('is_recover')))
-                    if(not is_recover):
-                        print(f"Remove un-commissioned device: {path}")
-                        shutil.rmtree(path)
+                is_recover = (dict_config.get('is_recover') not in (None, "")) and (
+                    int(dict_config.get('is_recover')))
+                if (not is_recover) and (dict_config.get('provisioned') != "1"):
+                    print(f"Remove un-commissioned device: {path}")
+                    shutil.rmtree(path, ignore_errors=True)
+                    DeviceRegistry.delete(subdir)
+                    RpcPortAllocator.release_device(subdir)
+            HandleRecoverDevices.list_recover_devices = HandleRecoverDevices.get_all_storage_folders(
+                sync=False)
         except Exception as err:
             print("Fail to remove uncommissioned storage folder: {}".format(err))  
 
@@ -384,8 +338,9 @@ class HandleRecoverDevices():
                     if (targetid in HandleRecoverDevices.list_recover_devices):
                         HandleRecoverDevices.list_recover_devices.remove(
                             targetid)
-                    path = os.path.dirname(config_file)
-                    shutil.rmtree(path)
+                    # The folder may be in the middle of a write, let the
+                    # consistency checker decide
+                    StorageConsistencyChecker.mark_dirty(targetid)
                     return dict_config
                 try:
                     dict_config['product-id'] = config.get(
@@ -447,13 +402,8 @@ class HandleRecoverDevices():
 
             for i, subdir in enumerate(
                     HandleRecoverDevices.list_recover_devices):
-                path = CURRENT_TEMP_DIR + subdir + "/"
-                if (os.path.isdir(path)):
-                    # list_recover_devices.append(subdir)
-                    config_file = path + CHIP_FACTORY_FILE
-                    # HandleRecoverDevices.execute_cmd("cat " + config_file)
-                    dict_config = HandleRecoverDevices.read_config_file(
-                        config_file, subdir)
+                dict_config = DeviceRegistry.get(subdir)
+                if (dict_config is not None):
                     if ((len(dict_config) != 0) and dict_config.get(
                             'ipv4') != "" and dict_config.get('ipv6') != ""):
                         HandleRecoverDevices.list_recover_ipv4.append(
@@ -516,15 +466,12 @@ class HandleRecoverDevices():
         """
         HandleRecoverDevices.list_recover_devices.clear()
         try:
-            HandleRecoverDevices.list_recover_devices = HandleRecoverDevices.get_all_storage_folders()
+            HandleRecoverDevices.list_recover_devices = HandleRecoverDevices.get_all_storage_folders(
+                sync=False)
             print("list: ", HandleRecoverDevices.list_recover_devices, targetid)
             if (targetid in HandleRecoverDevices.list_recover_devices):
-                path = CURRENT_TEMP_DIR + targetid + "/"
-                if (os.path.isdir(path)):
-                    config_file = path + CHIP_FACTORY_FILE
-                    print("Read Config File : %s", config_file)
-                    dict_config = HandleRecoverDevices.read_config_file(
-                        config_file, targetid)
+                dict_config = DeviceRegistry.get(targetid)
+                if (dict_config is not None):
                     if ((len(dict_config) != 0) and dict_config.get(
                             'ipv4') != "" and dict_config.get('ipv6') != ""):
                         device_instance.ipv4 = dict_config.get('ipv4')
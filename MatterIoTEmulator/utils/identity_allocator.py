@@ -0,0 +1,283 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import logging
+import threading
+from setup_payload.generate_setup_payload import INVALID_PASSCODES
+from utils.app_config import AppConfig
+from utils.device_registry import DeviceRegistry
+
+# parameter_constraints key of each allocated value
+IDENTITY_KEYS = ['discriminator', 'pin_code']
+
+
+class IdentityAllocator():
+    """
+    IdentityAllocator class for handing out discriminators and pin codes
+    which no other device uses.
+
+    The index maps every discriminator and pin code to the owners using it.
+    An owner is the target id of a stored device, or any key a caller holds
+    values for before the device exists (e.g. an open tab). The index is
+    seeded with the stored devices the first time it is used, so the values
+    stay unique across the provisioned fleet and not only the running one.
+
+    Free values are searched from a cursor which only moves forward, an
+    allocation costs O(1) amortized. When all discriminators are taken they
+    are given out again in turn, a fleet larger than the range can not have
+    unique discriminators.
+    """
+    lock = threading.RLock()
+    owners = {}
+    values = {key: {} for key in IDENTITY_KEYS}
+    cursors = {key: None for key in IDENTITY_KEYS}
+    loaded = False
+
+    @staticmethod
+    def get_range(key):
+        """
+        Return the (first, last) allowed value of parameter_constraints.
+
+        Arguments:
+            key {str} -- "discriminator" or "pin_code"
+        """
+        bounds = AppConfig.get()['parameter_constraints'][key]['range']
+        return bounds[0], bounds[-1]
+
+    @staticmethod
+    def is_valid(key, value, first, last):
+        """
+        Check a value is in range and, for a pin code, not insecure.
+
+        Arguments:
+            key {str} -- "discriminator" or "pin_code"
+            value {int} -- the value
+            first {int}, last {int} -- the allowed range
+        """
+        if not (first <= value <= last):
+            return False
+        return (key != 'pin_code') or (value not in INVALID_PASSCODES)
+
+    @staticmethod
+    def load():
+        """
+        Index the stored devices the first time. The caller must hold the lock.
+        """
+        if IdentityAllocator.loaded:
+            return
+        IdentityAllocator.loaded = True
+        DeviceRegistry.sync()
+        for item in DeviceRegistry.list_devices():
+            try:
+                IdentityAllocator.add(item['targetId'], int(item['discriminator']),
+                                      int(item['pin-code']))
+            except ValueError:
+                continue
+
+    @staticmethod
+    def add(owner, discriminator, pincode):
+        """
+        Record the values of an owner. The caller must hold the lock.
+
+        Arguments:
+            owner {str} -- the target id or key of the owner
+            discriminator {int} -- the discriminator
+            pincode {int} -- the pin code
+        """
+        IdentityAllocator.remove(owner)
+        IdentityAllocator.owners[owner] = (discriminator, pincode)
+        for key, value in zip(IDENTITY_KEYS, (discriminator, pincode)):
+            IdentityAllocator.values[key].setdefault(value, set()).add(owner)
+
+    @staticmethod
+    def remove(owner):
+        """
+        Forget the values of an owner. The caller must hold the lock.
+
+        Arguments:
+            owner {str} -- the target id or key of the owner
+        """
+        identity = IdentityAllocator.owners.pop(owner, None)
+        if identity is None:
+            return
+        for key, value in zip(IDENTITY_KEYS, identity):
+            users = IdentityAllocator.values[key][value]
+            users.discard(owner)
+            if not users:
+                del IdentityAllocator.values[key][value]
+
+    @staticmethod
+    def find_free(key, hint):
+        """
+        Return a free value of a key, the hint when it is free. The caller
+        must hold the lock.
+
+        Arguments:
+            key {str} -- "discriminator" or "pin_code"
+            hint {int} -- the preferred value, None for the next free one
+        """
+        used = IdentityAllocator.values[key]
+        first, last = IdentityAllocator.get_range(key)
+        if (hint is not None) and (hint not in used) and (
+                IdentityAllocator.is_valid(key, hint, first, last)):
+            return hint
+        value = IdentityAllocator.cursors[key]
+        if value is None:
+            value = hint if (hint is not None) and (first <= hint <= last) else first
+        elif not (first <= value <= last):
+            value = first
+        if len(used) <= last - first:
+            for _ in range(last - first + 1):
+                if (value not in used) and IdentityAllocator.is_valid(key, value, first, last):
+                    IdentityAllocator.cursors[key] = value + 1
+                    return value
+                value = value + 1 if value < last else first
+        # Every value is taken, share them in turn
+        while not IdentityAllocator.is_valid(key, value, first, last):
+            value = value + 1 if value < last else first
+        if value == first:
+            logging.warning("No free {}, the values are shared".format(key))
+        IdentityAllocator.cursors[key] = value + 1
+        return value
+
+    @staticmethod
+    def allocate(owner, discriminator=None, pincode=None):
+        """
+        Hand out a discriminator and a pin code no other owner uses.
+
+        Arguments:
+            owner {str} -- the target id or key of the owner
+            discriminator {int} -- the preferred discriminator
+            pincode {int} -- the preferred pin code
+        Return:
+            The (discriminator, pincode) of the owner
+        """
+        with IdentityAllocator.lock:
+            IdentityAllocator.load()
+            IdentityAllocator.remove(owner)
+            identity = (IdentityAllocator.find_free('discriminator', discriminator),
+                        IdentityAllocator.find_free('pin_code', pincode))
+            IdentityAllocator.add(owner, *identity)
+        return identity
+
+    @staticmethod
+    def reserve(owner, discriminator, pincode):
+        """
+        Record the values chosen for an owner.
+
+        Arguments:
+            owner {str} -- the target id or key of the owner
+            discriminator {int} -- the discriminator
+            pincode {int} -- the pin code
+        Return:
+            The other owners using the same discriminator or pin code
+        """
+        with IdentityAllocator.lock:
+            IdentityAllocator.load()
+            IdentityAllocator.add(owner, discriminator, pincode)
+            shared = (IdentityAllocator.values['discriminator'][discriminator] |
+                      IdentityAllocator.values['pin_code'][pincode])
+        return sorted(shared - {owner})
+
+    @staticmethod
+    def assign(requests):
+        """
+        Allocate or reserve the values of several owners in turn.
+
+        Arguments:
+            requests {[(str, int, int, bool)]} -- the (owner, discriminator,
+                pincode, allocate) of each owner, allocate is False to keep
+                the given values
+        Return:
+            The list of ((discriminator, pincode), shared owners) in order
+        """
+        results = []
+        with IdentityAllocator.lock:
+            for owner, discriminator, pincode, allocate in requests:
+                if allocate:
+                    results.append((IdentityAllocator.allocate(
+                        owner, discriminator, pincode), []))
+                else:
+                    results.append(((discriminator, pincode), IdentityAllocator.reserve(
+                        owner, discriminator, pincode)))
+        return results
+
+    @staticmethod
+    def plan(requests):
+        """
+        Return what assign() would hand out now, without keeping anything.
+
+        Arguments:
+            requests {[(str, int, int, bool)]} -- as for assign()
+        Return:
+            The list of ((discriminator, pincode), shared owners) in order
+        """
+        with IdentityAllocator.lock:
+            IdentityAllocator.load()
+            owners = dict(IdentityAllocator.owners)
+            values = {key: {value: set(users) for value, users in used.items()}
+                      for key, used in IdentityAllocator.values.items()}
+            cursors = dict(IdentityAllocator.cursors)
+            try:
+                return IdentityAllocator.assign(requests)
+            finally:
+                IdentityAllocator.owners = owners
+                IdentityAllocator.values = values
+                IdentityAllocator.cursors = cursors
+
+    @staticmethod
+    def release(owner):
+        """
+        Free the values of an owner.
+
+        Arguments:
+            owner {str} -- the target id or key of the owner
+        """
+        with IdentityAllocator.lock:
+            IdentityAllocator.remove(owner)
+
+    @staticmethod
+    def get(owner):
+        """
+        Return the (discriminator, pincode) of an owner, or None.
+
+        Arguments:
+            owner {str} -- the target id or key of the owner
+        """
+        with IdentityAllocator.lock:
+            IdentityAllocator.load()
+            return IdentityAllocator.owners.get(owner)
+
+    @staticmethod
+    def lookup_discriminator(discriminator, short=False):
+        """
+        Return the owners using a discriminator.
+
+        Arguments:
+            discriminator {int} -- the 12 bit discriminator, or the upper 4
+                                   bits of a manual pairing code
+            short {bool} -- True for a short discriminator
+        """
+        with IdentityAllocator.lock:
+            IdentityAllocator.load()
+            used = IdentityAllocator.values['discriminator']
+            if not short:
+                return sorted(used.get(discriminator, ()))
+            owners = set()
+            for value in range(discriminator << 8, (discriminator + 1) << 8):
+                owners |= used.get(value, set())
+        return sorted(owners)
@@ -0,0 +1,419 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import copy
+import ipaddress
+import logging
+import os
+import socket
+import struct
+import threading
+
+# Netlink message types and flags (linux/netlink.h, linux/rtnetlink.h)
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+
+IFLA_IFNAME = 3
+IFLA_OPERSTATE = 16
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+IFA_FLAGS = 8
+IFA_F_SECONDARY = 0x01
+
+NLMSG_HEADER = struct.Struct("=LHHLL")
+IFINFOMSG = struct.Struct("=BxHiII")
+IFADDRMSG = struct.Struct("=BBBBI")
+RTATTR = struct.Struct("=HH")
+
+OPERSTATES = ["UNKNOWN", "NOTPRESENT", "DOWN", "LOWERLAYERDOWN",
+              "TESTING", "DORMANT", "UP"]
+SCOPES = {0: "global", 200: "site", 253: "link", 254: "host", 255: "nowhere"}
+RECV_BUFFER_SIZE = 65536
+
+
+class InterfaceStateCache():
+    """
+    InterfaceStateCache class for sharing one snapshot of the network
+    interfaces between all the tabs.
+
+    The snapshot has the same layout as `ip -j addr show`, so callers which
+    used to parse that output can read it directly. It is refreshed from a
+    netlink dump (or psutil when netlink is not available) and marked dirty
+    by netlink change events, so reading it never forks a process.
+    """
+    lock = threading.Lock()
+    snapshot = {}
+    is_dirty = True
+    listeners = []
+    monitor_thread = None
+    use_netlink = hasattr(socket, "AF_NETLINK")
+
+    @staticmethod
+    def start():
+        """
+        Start the netlink monitor which keeps the snapshot up to date.
+        """
+        with InterfaceStateCache.lock:
+            if (InterfaceStateCache.monitor_thread is not None):
+                return
+            if (not InterfaceStateCache.use_netlink):
+                logging.info("Netlink is not available, interface state "
+                             "is refreshed on every read")
+                return
+            InterfaceStateCache.monitor_thread = threading.Thread(
+                target=InterfaceStateCache.monitor, name="InterfaceMonitor")
+            InterfaceStateCache.monitor_thread.daemon = True
+            InterfaceStateCache.monitor_thread.start()
+
+    @staticmethod
+    def add_listener(callback):
+        """
+        Register a function called after every interface change.
+
+        Arguments:
+            callback {function} -- called with the changed interface name
+        """
+        with InterfaceStateCache.lock:
+            if (callback not in InterfaceStateCache.listeners):
+                InterfaceStateCache.listeners.append(callback)
+
+    @staticmethod
+    def remove_listener(callback):
+        """
+        Unregister a function added by add_listener.
+
+        Arguments:
+            callback {function} -- the registered function
+        """
+        with InterfaceStateCache.lock:
+            if (callback in InterfaceStateCache.listeners):
+                InterfaceStateCache.listeners.remove(callback)
+
+    @staticmethod
+    def invalidate():
+        """
+        Mark the snapshot as outdated, e.g. after adding or deleting an ip.
+        """
+        InterfaceStateCache.is_dirty = True
+
+    @staticmethod
+    def get_snapshot():
+        """
+        Return the cached interfaces, refreshing them only when outdated.
+
+        Return:
+            A dictionary of interface name and its `ip -j addr show` entry
+        """
+        with InterfaceStateCache.lock:
+            if (InterfaceStateCache.is_dirty or
+                    InterfaceStateCache.monitor_thread is None):
+                InterfaceStateCache.refresh()
+            return InterfaceStateCache.snapshot
+
+    @staticmethod
+    def get_interface(ifname):
+        """
+        Return a copy of the cached entry of an interface.
+
+        Arguments:
+            ifname {str} -- the interface name
+        Return:
+            The interface dictionary or None if the interface does not exist
+        """
+        interface = InterfaceStateCache.get_snapshot().get(ifname)
+        return copy.deepcopy(interface) if interface is not None else None
+
+    @staticmethod
+    def get_addr_info(ifname):
+        """
+        Return the address list of an interface.
+
+        Arguments:
+            ifname {str} -- the interface name
+        """
+        interface = InterfaceStateCache.get_snapshot().get(ifname)
+        if (interface is None):
+            return []
+        return [dict(item) for item in interface["addr_info"]]
+
+    @staticmethod
+    def get_operstate(ifname):
+        """
+        Return the operational state of an interface ("UP", "DOWN", ...).
+
+        Arguments:
+            ifname {str} -- the interface name
+        """
+        interface = InterfaceStateCache.get_snapshot().get(ifname)
+        if (interface is None):
+            return "NOTPRESENT"
+        return interface["operstate"]
+
+    @staticmethod
+    def has_address(ifname, address, prefixlen=None):
+        """
+        Check an address is assigned to an interface.
+
+        Arguments:
+            ifname {str} -- the interface name
+            address {str} -- the ipv4 or ipv6 address
+            prefixlen {int} -- the prefix length, any if None
+        Return:
+            True: if the address is assigned
+            False: if the address is not assigned
+        """
+        for item in InterfaceStateCache.get_addr_info(ifname):
+            if ((item.get("local") == address) and (
+                    prefixlen is None or item.get("prefixlen") == prefixlen)):
+                return True
+        return False
+
+    @staticmethod
+    def refresh():
+        """
+        Reload the snapshot. The caller must hold the lock.
+        """
+        InterfaceStateCache.is_dirty = False
+        try:
+            if (InterfaceStateCache.use_netlink):
+                InterfaceStateCache.snapshot = \
+                    InterfaceStateCache.read_netlink()
+                return
+        except OSError as err:
+            logging.warning(
+                "Fail to dump netlink, fall back to psutil: {}".format(err))
+            InterfaceStateCache.use_netlink = False
+        InterfaceStateCache.snapshot = InterfaceStateCache.read_psutil()
+
+    @staticmethod
+    def monitor():
+        """
+        Wait for netlink link/address events and mark the snapshot dirty.
+        """
+        try:
+            sock = socket.socket(
+                socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+        except OSError as err:
+            logging.warning("Fail to start interface monitor: {}".format(err))
+            with InterfaceStateCache.lock:
+                InterfaceStateCache.monitor_thread = None
+            return
+        while True:
+            try:
+                data = sock.recv(RECV_BUFFER_SIZE)
+            except OSError as err:
+                logging.warning("Interface monitor error: {}".format(err))
+                InterfaceStateCache.invalidate()
+                continue
+            changed = set()
+            for msg_type, payload in InterfaceStateCache.parse_messages(data):
+                if (msg_type in (RTM_NEWLINK, RTM_DELLINK)):
+                    changed.add(InterfaceStateCache.parse_link(payload)[0])
+                elif (msg_type in (RTM_NEWADDR, RTM_DELADDR)):
+                    changed.add(InterfaceStateCache.parse_addr(payload)[0])
+            if (len(changed) == 0):
+                continue
+            with InterfaceStateCache.lock:
+                InterfaceStateCache.refresh()
+                listeners = list(InterfaceStateCache.listeners)
+                index_to_name = {value["ifindex"]: name for name, value in
+                                 InterfaceStateCache.snapshot.items()}
+            for changed_if in changed:
+                ifname = index_to_name.get(changed_if, changed_if)
+                for callback in listeners:
+                    try:
+                        callback(ifname)
+                    except Exception as e:
+                        logging.error(
+                            "Interface listener failed: {}".format(e))
+
+    @staticmethod
+    def parse_messages(data):
+        """
+        Split a netlink buffer into (message type, payload) tuples.
+
+        Arguments:
+            data {bytes} -- the buffer received from the netlink socket
+        """
+        offset = 0
+        while offset + NLMSG_HEADER.size <= len(data):
+            length, msg_type, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+            if (length < NLMSG_HEADER.size):
+                break
+            yield msg_type, data[offset + NLMSG_HEADER.size:offset + length]
+            offset += (length + 3) & ~3
+
+    @staticmethod
+    def parse_attributes(payload, offset):
+        """
+        Return the route attributes of a payload as a dictionary.
+
+        Arguments:
+            payload {bytes} -- the message payload
+            offset {int} -- the offset of the first attribute
+        """
+        attributes = {}
+        while offset + RTATTR.size <= len(payload):
+            length, attr_type = RTATTR.unpack_from(payload, offset)
+            if (length < RTATTR.size):
+                break
+            attributes[attr_type] = payload[offset + RTATTR.size:offset + length]
+            offset += (length + 3) & ~3
+        return attributes
+
+    @staticmethod
+    def parse_link(payload):
+        """
+        Return (name, index, operstate) of a RTM_NEWLINK payload.
+
+        Arguments:
+            payload {bytes} -- the message payload
+        """
+        _, _, index, _, _ = IFINFOMSG.unpack_from(payload)
+        attributes = InterfaceStateCache.parse_attributes(
+            payload, IFINFOMSG.size)
+        name = attributes.get(IFLA_IFNAME, b"").rstrip(b"\0").decode()
+        state = attributes.get(IFLA_OPERSTATE, b"\0")[0]
+        operstate = OPERSTATES[state] if state < len(OPERSTATES) else "UNKNOWN"
+        return name, index, operstate
+
+    @staticmethod
+    def parse_addr(payload):
+        """
+        Return (index, addr_info) of a RTM_NEWADDR payload.
+
+        Arguments:
+            payload {bytes} -- the message payload
+        """
+        family, prefixlen, flags, scope, index = IFADDRMSG.unpack_from(payload)
+        attributes = InterfaceStateCache.parse_attributes(
+            payload, IFADDRMSG.size)
+        if (IFA_FLAGS in attributes):
+            flags = struct.unpack("=I", attributes[IFA_FLAGS][:4])[0]
+        raw_address = attributes.get(IFA_LOCAL, attributes.get(IFA_ADDRESS))
+        if (raw_address is None or family not in (socket.AF_INET,
+                                                  socket.AF_INET6)):
+            return index, None
+        item = {
+            "family": "inet" if family == socket.AF_INET else "inet6",
+            "local": socket.inet_ntop(family, raw_address),
+            "prefixlen": prefixlen,
+            "scope": SCOPES.get(scope, str(scope))
+        }
+        if (family == socket.AF_INET):
+            if (flags & IFA_F_SECONDARY):
+                item["secondary"] = True
+            if (IFA_LABEL in attributes):
+                item["label"] = attributes[IFA_LABEL].rstrip(b"\0").decode()
+        elif (flags & IFA_F_SECONDARY):
+            item["temporary"] = True
+        return index, item
+
+    @staticmethod
+    def dump(sock, msg_type, header):
+        """
+        Send a netlink dump request and yield the reply payloads.
+
+        Arguments:
+            sock {socket} -- the netlink socket
+            msg_type {int} -- RTM_GETLINK or RTM_GETADDR
+            header {bytes} -- the family specific request header
+        """
+        request = NLMSG_HEADER.pack(NLMSG_HEADER.size + len(header), msg_type,
+                                    NLM_F_REQUEST | NLM_F_DUMP, 1, 0) + header
+        sock.send(request)
+        while True:
+            data = sock.recv(RECV_BUFFER_SIZE)
+            for reply_type, payload in InterfaceStateCache.parse_messages(data):
+                if (reply_type == NLMSG_DONE):
+                    return
+                if (reply_type == NLMSG_ERROR):
+                    error = struct.unpack_from("=i", payload)[0]
+                    raise OSError(-error, os.strerror(-error))
+                yield reply_type, payload
+
+    @staticmethod
+    def read_netlink():
+        """
+        Return the interfaces read with one netlink link and address dump.
+        """
+        interfaces = {}
+        index_to_name = {}
+        with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                           socket.NETLINK_ROUTE) as sock:
+            for _, payload in InterfaceStateCache.dump(
+                    sock, RTM_GETLINK, IFINFOMSG.pack(0, 0, 0, 0, 0)):
+                name, index, operstate = InterfaceStateCache.parse_link(
+                    payload)
+                index_to_name[index] = name
+                interfaces[name] = {"ifindex": index, "ifname": name,
+                                    "operstate": operstate, "addr_info": []}
+            for _, payload in InterfaceStateCache.dump(
+                    sock, RTM_GETADDR, IFADDRMSG.pack(0, 0, 0, 0, 0)):
+                index, item = InterfaceStateCache.parse_addr(payload)
+                name = index_to_name.get(index)
+                if (item is not None and name is not None):
+                    interfaces[name]["addr_info"].append(item)
+        return interfaces
+
+    @staticmethod
+    def read_psutil():
+        """
+        Return the interfaces read with psutil (no labels and flags).
+        """
+        import psutil
+        interfaces = {}
+        stats = psutil.net_if_stats()
+        for index, (name, addresses) in enumerate(
+                sorted(psutil.net_if_addrs().items())):
+            base_name = name.split(":")[0]
+            if (base_name not in interfaces):
+                is_up = stats.get(base_name) is not None and \
+                    stats[base_name].isup
+                interfaces[base_name] = {
+                    "ifindex": index + 1, "ifname": base_name,
+                    "operstate": "UP" if is_up else "DOWN", "addr_info": []}
+            for address in addresses:
+                if (address.family not in (socket.AF_INET, socket.AF_INET6)):
+                    continue
+                local = address.address.split("%")[0]
+                prefixlen = ipaddress.ip_network(
+                    "{}/{}".format(local, address.netmask),
+                    strict=False).prefixlen if address.netmask else 0
+                ip = ipaddress.ip_address(local)
+                scope = "link" if ip.is_link_local else (
+                    "host" if ip.is_loopback else "global")
+                item = {"family": "inet" if address.family == socket.AF_INET
+                        else "inet6",
+                        "local": local, "prefixlen": prefixlen, "scope": scope}
+                if (address.family == socket.AF_INET):
+                    item["label"] = name
+                interfaces[base_name]["addr_info"].append(item)
+        return interfaces
@@ -0,0 +1,274 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import gzip
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import date
+from constants import *
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSED_SUFFIXES = (".gz", ".zst")
+TEMP_SUFFIX = ".tmp"
+
+
+class LogRetentionService():
+    """
+    LogRetentionService class for keeping the device logs under log/ within
+    their limits in a background thread.
+
+    A device writes log/<date>/<time>--<device id>--<target id>. The writer
+    rotates the file to <name>.<n> when it reaches LOG_SEGMENT_MAX_BYTES
+    (see rotate()). A log is closed when it was rotated or has not been
+    written for LOG_IDLE_SECONDS. Closed logs are compressed, and the oldest
+    closed logs are removed when they are older than LOG_MAX_AGE_DAYS, when a
+    device uses more than LOG_DEVICE_MAX_BYTES or when log/ uses more than
+    LOG_TOTAL_MAX_BYTES. A log which is still written is never touched.
+    """
+
+    def __init__(self, log_dir, interval=LOG_RETENTION_INTERVAL):
+        """
+        Initialize a LogRetentionService instance.
+
+        Arguments:
+            log_dir {str} -- the log folder
+            interval {int} -- seconds between two passes
+        """
+        self.log_dir = log_dir
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def get_key(name):
+        """
+        Return the name of the log without its segment and compression
+        suffixes, e.g. "10-01-02--0x0100--fff18000-7e6".
+
+        Arguments:
+            name {str} -- the file name
+        """
+        return name.split(".")[0]
+
+    @staticmethod
+    def get_targetid(name):
+        """
+        Return the target id of a log file name.
+
+        Arguments:
+            name {str} -- the file name
+        """
+        return LogRetentionService.get_key(name).split("--")[-1]
+
+    @staticmethod
+    def next_segment_path(path):
+        """
+        Return the first <path>.<n> which is not used, compressed or not.
+
+        Arguments:
+            path {str} -- the log file path
+        """
+        number = 1
+        while any(os.path.exists("{}.{}{}".format(path, number, suffix))
+                  for suffix in ("",) + COMPRESSED_SUFFIXES):
+            number += 1
+        return "{}.{}".format(path, number)
+
+    @staticmethod
+    def rotate(path):
+        """
+        Close a log so the next line starts a new file.
+
+        Arguments:
+            path {str} -- the log file path
+        Return:
+            The path of the closed segment, or None if the file is missing
+        """
+        segment_path = LogRetentionService.next_segment_path(path)
+        try:
+            os.rename(path, segment_path)
+        except FileNotFoundError:
+            return None
+        return segment_path
+
+    @staticmethod
+    def compress(path):
+        """
+        Compress a closed log with zstd when zstandard is installed and
+        LOG_COMPRESSION asks for it, with gzip otherwise.
+
+        Arguments:
+            path {str} -- the closed log path
+        Return:
+            The compressed file path
+        """
+        if (LOG_COMPRESSION == "zstd") and (zstandard is not None):
+            target_path = path + ".zst"
+            with open(path, "rb") as src, open(target_path + TEMP_SUFFIX, "wb") as dst:
+                zstandard.ZstdCompressor(level=LOG_COMPRESSION_LEVEL).copy_stream(src, dst)
+        else:
+            target_path = path + ".gz"
+            with open(path, "rb") as src, gzip.open(
+                    target_path + TEMP_SUFFIX, "wb",
+                    compresslevel=LOG_COMPRESSION_LEVEL) as dst:
+                shutil.copyfileobj(src, dst)
+        shutil.copystat(path, target_path + TEMP_SUFFIX)
+        os.replace(target_path + TEMP_SUFFIX, target_path)
+        os.unlink(path)
+        return target_path
+
+    def start(self):
+        """
+        Run the retention passes in a background thread, the first one now.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="LogRetention")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread after the current pass.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def run(self):
+        """
+        Run a pass every interval seconds until stop() is called.
+        """
+        while not self._stop.is_set():
+            try:
+                report = self.run_once()
+                if report["compressed"] or report["removed"]:
+                    logging.info("Log retention: {}".format(report))
+            except OSError as err:
+                logging.error("Log retention failed: {}".format(err))
+            self._stop.wait(self.interval)
+
+    def scan(self):
+        """
+        Return the {path: stat} of all files in the date folders.
+        """
+        files = {}
+        try:
+            date_dirs = [entry for entry in os.scandir(self.log_dir) if entry.is_dir()]
+        except FileNotFoundError:
+            return files
+        for date_dir in date_dirs:
+            for entry in os.scandir(date_dir.path):
+                if entry.is_file(follow_symlinks=False):
+                    try:
+                        files[entry.path] = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+        return files
+
+    def run_once(self, now=None):
+        """
+        Apply the retention rules once.
+
+        Arguments:
+            now {float} -- the current time (default = time.time())
+        Return:
+            The report {compressed, removed, freed, total} of the pass
+        """
+        now = time.time() if now is None else now
+        report = {"compressed": 0, "removed": 0, "freed": 0, "total": 0}
+        files = self.scan()
+
+        # Close idle logs and compress closed ones
+        for path, stat in list(files.items()):
+            name = os.path.basename(path)
+            if name.endswith(TEMP_SUFFIX):
+                # left by an interrupted compression
+                os.unlink(path)
+                del files[path]
+                continue
+            if name.endswith(COMPRESSED_SUFFIXES) or (
+                    now - stat.st_mtime > LOG_MAX_AGE_DAYS * 86400):
+                continue
+            if "." not in name:
+                if now - stat.st_mtime < LOG_IDLE_SECONDS:
+                    continue
+                path = LogRetentionService.rotate(path)
+                if path is None:
+                    continue
+                del files[os.path.splitext(path)[0]]
+            try:
+                compressed_path = LogRetentionService.compress(path)
+            except OSError as err:
+                logging.warning("Fail to compress {}: {}".format(path, err))
+                continue
+            files.pop(path, None)
+            files[compressed_path] = os.stat(compressed_path)
+            report["compressed"] += 1
+
+        # Oldest first, the open logs can not be removed
+        closed = sorted((path for path, stat in files.items()
+                         if ("." in os.path.basename(path)) or
+                         (now - stat.st_mtime >= LOG_IDLE_SECONDS)),
+                        key=lambda path: (files[path].st_mtime, path))
+        device_usage = {}
+        for path, stat in files.items():
+            targetid = LogRetentionService.get_targetid(os.path.basename(path))
+            device_usage[targetid] = device_usage.get(targetid, 0) + stat.st_size
+        total = sum(stat.st_size for stat in files.values())
+
+        for path in closed:
+            size = files[path].st_size
+            targetid = LogRetentionService.get_targetid(os.path.basename(path))
+            if ((now - files[path].st_mtime > LOG_MAX_AGE_DAYS * 86400) or
+                    (device_usage[targetid] > LOG_DEVICE_MAX_BYTES) or
+                    (total > LOG_TOTAL_MAX_BYTES)):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                device_usage[targetid] -= size
+                total -= size
+                report["removed"] += 1
+                report["freed"] += size
+        report["total"] = total
+        self.remove_empty_folders()
+        return report
+
+    def remove_empty_folders(self):
+        """
+        Remove the empty date folders except the one of today.
+        """
+        today = str(date.today())
+        try:
+            date_dirs = [entry for entry in os.scandir(self.log_dir) if entry.is_dir()]
+        except FileNotFoundError:
+            return
+        for date_dir in date_dirs:
+            if date_dir.name == today:
+                continue
+            try:
+                os.rmdir(date_dir.path)
+            except OSError:
+                pass
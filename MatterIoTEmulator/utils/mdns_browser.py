@@ -0,0 +1,602 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import logging
+import select
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from constants import *
+
+DNS_HEADER = struct.Struct("!HHHHHH")
+DNS_RECORD = struct.Struct("!HHIH")
+DNS_TYPE_A = 1
+DNS_TYPE_PTR = 12
+DNS_TYPE_TXT = 16
+DNS_TYPE_AAAA = 28
+DNS_TYPE_SRV = 33
+DNS_CLASS_IN = 1
+DNS_FLAG_RESPONSE = 0x8000
+SERVICE_COMMISSIONABLE = "commissionable"
+SERVICE_OPERATIONAL = "operational"
+SERVICE_TYPES = {
+    MDNS_COMMISSIONABLE_SERVICE: SERVICE_COMMISSIONABLE,
+    MDNS_OPERATIONAL_SERVICE: SERVICE_OPERATIONAL}
+
+
+class DnsParseError(Exception):
+    """
+    Raised when a mDNS packet is malformed.
+    """
+
+
+class MdnsBrowser:
+    """
+    MdnsBrowser class for watching the Matter DNS-SD advertisements
+    (_matterc._udp and _matter._tcp) of the emulated devices.
+
+    Every advertisement is timestamped when it appears, when its TTL is
+    refreshed and when it is withdrawn (goodbye or expired TTL). The time
+    between FLAG_DEVICE_STARTED / FLAG_CONNECTED of a device and its
+    advertisement becoming visible is recorded per device type (fleet), the
+    last MDNS_LATENCY_SAMPLES per service of the devices still followed.
+    """
+    lock = threading.Lock()
+    # instance name -> advertisement dict
+    advertisements = {}
+    # target id -> device dict
+    devices = {}
+    # fleet -> {service: deque([(target id, latency)])}
+    latencies = {}
+
+    def __init__(self, network_if_name=None, group=MDNS_IPV4_GROUP,
+                 port=MDNS_UDP_PORT, group_v6=MDNS_IPV6_GROUP):
+        """
+        Initialize a MdnsBrowser instance.
+
+        Arguments:
+            network_if_name {str} -- the interface to listen on, None for all
+            group {str} -- the ipv4 multicast group
+            port {int} -- the udp port
+            group_v6 {str} -- the ipv6 multicast group, None to skip ipv6
+        """
+        self.network_if_name = network_if_name
+        self.group = group
+        self.port = port
+        self.group_v6 = group_v6
+        self._sockets = []
+        self._if_index = 0
+        self._thread = None
+        self._stop = False
+        self._last_query = 0
+
+    @staticmethod
+    def mark_started(targetid, discriminator, fleet, list_ip=()):
+        """
+        Record that a device printed FLAG_DEVICE_STARTED.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+            discriminator {int} -- the discriminator of the device
+            fleet {str} -- the device type of the device
+            list_ip {[str]} -- the ip addresses of the device
+        """
+        with MdnsBrowser.lock:
+            MdnsBrowser.devices[targetid] = {
+                "targetId": targetid,
+                "discriminator": int(discriminator),
+                "fleet": fleet,
+                "addresses": set(list_ip),
+                "node_id": None,
+                "started_at": time.time(),
+                "connected_at": None,
+                SERVICE_COMMISSIONABLE: None,
+                SERVICE_OPERATIONAL: None}
+            # The advertisement can be seen before the log line is parsed
+            for advertisement in MdnsBrowser.advertisements.values():
+                if (advertisement["targetId"] is None) and (
+                        advertisement["withdrawn_at"] is None) and (
+                        MdnsBrowser.match_device(
+                            MdnsBrowser.devices[targetid], advertisement)):
+                    MdnsBrowser.attach(targetid, advertisement)
+
+    @staticmethod
+    def mark_connected(targetid):
+        """
+        Record that a device printed FLAG_CONNECTED.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+        """
+        with MdnsBrowser.lock:
+            device = MdnsBrowser.devices.get(targetid)
+            if device is not None:
+                device["connected_at"] = time.time()
+
+    @staticmethod
+    def set_node_id(targetid, node_id):
+        """
+        Record the operational node id of a device once it is known.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+            node_id {int} -- the node id of the device
+        """
+        with MdnsBrowser.lock:
+            device = MdnsBrowser.devices.get(targetid)
+            if (device is None) or (device["node_id"] == int(node_id)):
+                return
+            device["node_id"] = int(node_id)
+            for advertisement in MdnsBrowser.advertisements.values():
+                if (advertisement["targetId"] is None) and (
+                        MdnsBrowser.match_device(device, advertisement)):
+                    MdnsBrowser.attach(targetid, advertisement)
+                    break
+
+    @staticmethod
+    def forget_device(targetid):
+        """
+        Stop following a device and drop its recorded latencies.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+        """
+        with MdnsBrowser.lock:
+            device = MdnsBrowser.devices.pop(targetid, None)
+            for advertisement in MdnsBrowser.advertisements.values():
+                if advertisement["targetId"] == targetid:
+                    advertisement["targetId"] = None
+            if device is None:
+                return
+            services = MdnsBrowser.latencies.get(device["fleet"], {})
+            for service, samples in list(services.items()):
+                kept = [sample for sample in samples if sample[0] != targetid]
+                if kept:
+                    services[service] = deque(kept, maxlen=MDNS_LATENCY_SAMPLES)
+                else:
+                    del services[service]
+            if not services:
+                MdnsBrowser.latencies.pop(device["fleet"], None)
+
+    @staticmethod
+    def get_device_advertisements(targetid):
+        """
+        Return the advertisements of a device.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+        Return:
+            A list of advertisement dictionaries
+        """
+        with MdnsBrowser.lock:
+            return [dict(advertisement) for advertisement in
+                    MdnsBrowser.advertisements.values()
+                    if advertisement["targetId"] == targetid]
+
+    @staticmethod
+    def get_latency_report():
+        """
+        Return the advertisement latencies per fleet.
+
+        Return:
+            {fleet: {service: {count, min, avg, p95, max}}} in seconds
+        """
+        report = {}
+        with MdnsBrowser.lock:
+            for fleet, services in MdnsBrowser.latencies.items():
+                report[fleet] = {}
+                for service, samples in services.items():
+                    values = sorted(latency for _, latency in samples)
+                    report[fleet][service] = {
+                        "count": len(values),
+                        "min": values[0],
+                        "avg": sum(values) / len(values),
+                        "p95": values[min(len(values) - 1,
+                                          int(len(values) * 0.95))],
+                        "max": values[-1]}
+        return report
+
+    def start(self):
+        """
+        Join the multicast groups and listen in a background thread.
+        """
+        self.open_sockets()
+        self._stop = False
+        self._thread = threading.Thread(target=self.run, name="MdnsBrowser")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop listening.
+        """
+        self._stop = True
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        for sock in self._sockets:
+            sock.close()
+        self._sockets = []
+
+    def open_sockets(self):
+        """
+        Open the ipv4 and ipv6 multicast sockets on network_if_name.
+        """
+        self._if_index = 0
+        if self.network_if_name is not None:
+            try:
+                self._if_index = socket.if_nametoindex(self.network_if_name)
+            except OSError as err:
+                logging.warning("Unknown interface {}: {}".format(
+                    self.network_if_name, err))
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(("", self.port))
+        try:
+            # struct ip_mreqn: group, any local address, interface index
+            mreqn = socket.inet_aton(self.group) + socket.inet_aton("0.0.0.0") + \
+                struct.pack("@i", self._if_index)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreqn)
+            if self._if_index:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, mreqn)
+        except OSError as err:
+            logging.warning("Fail to join {}: {}".format(self.group, err))
+        self._sockets.append(sock)
+        if self.group_v6 is None:
+            return
+        try:
+            sock = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, "SO_REUSEPORT"):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+            sock.bind(("", self.port))
+            sock.setsockopt(
+                socket.IPPROTO_IPV6, socket.IPV6_JOIN_GROUP,
+                socket.inet_pton(socket.AF_INET6, self.group_v6) +
+                struct.pack("@I", self._if_index))
+            if self._if_index:
+                sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_IF,
+                                struct.pack("@I", self._if_index))
+            self._sockets.append(sock)
+        except OSError as err:
+            logging.warning("Fail to listen mDNS on ipv6: {}".format(err))
+
+    def run(self):
+        """
+        Read the mDNS packets until stop() is called.
+        """
+        while not self._stop:
+            now = time.time()
+            if now - self._last_query >= MDNS_QUERY_INTERVAL:
+                self._last_query = now
+                self.query()
+            self.expire(now)
+            readable, _, _ = select.select(self._sockets, [], [], 1)
+            for sock in readable:
+                try:
+                    data, address = sock.recvfrom(9000)
+                except OSError:
+                    continue
+                self.feed(data, address[0])
+
+    def query(self):
+        """
+        Ask the responders for the Matter services so records are refreshed
+        even without unsolicited announcements.
+        """
+        packet = DNS_HEADER.pack(0, 0, len(SERVICE_TYPES), 0, 0, 0)
+        for service in SERVICE_TYPES:
+            packet += MdnsBrowser.encode_name(service) + struct.pack(
+                "!HH", DNS_TYPE_PTR, DNS_CLASS_IN)
+        for sock in self._sockets:
+            if sock.family == socket.AF_INET:
+                address = (self.group, self.port)
+            else:
+                # ff02::fb is link local, it needs the scope of the interface
+                address = (self.group_v6, self.port, 0, self._if_index)
+            try:
+                sock.sendto(packet, address)
+            except OSError as err:
+                logging.debug("Fail to send mDNS query: {}".format(err))
+
+    def feed(self, data, source, now=None):
+        """
+        Handle one mDNS packet.
+
+        Arguments:
+            data {bytes} -- the udp payload
+            source {str} -- the address of the sender
+            now {float} -- the receive time, the current time by default
+        """
+        if now is None:
+            now = time.time()
+        try:
+            records = MdnsBrowser.parse_packet(data)
+        except DnsParseError as err:
+            logging.debug("Drop mDNS packet from {}: {}".format(source, err))
+            return
+        if records is None:
+            return
+        instances = {}
+        for name, rtype, ttl, rdata in records:
+            lower_name = name.lower()
+            if rtype == DNS_TYPE_PTR:
+                for service, kind in SERVICE_TYPES.items():
+                    if lower_name == service or lower_name.endswith(
+                            "._sub." + service):
+                        instances.setdefault(rdata, {})["service"] = kind
+                        instances[rdata]["ttl"] = ttl
+            elif rtype == DNS_TYPE_TXT:
+                instances.setdefault(name, {})["txt"] = rdata
+                instances[name].setdefault("ttl", ttl)
+            elif rtype == DNS_TYPE_SRV:
+                instances.setdefault(name, {})["host"] = rdata[3]
+                instances[name].setdefault("ttl", ttl)
+        with MdnsBrowser.lock:
+            for instance, info in instances.items():
+                kind = info.get("service") or MdnsBrowser.service_of(instance)
+                if kind is None:
+                    continue
+                self.update_advertisement(
+                    instance, kind, info.get("ttl", 0), info, source, now)
+
+    @staticmethod
+    def service_of(instance):
+        """
+        Return the Matter service kind of an instance name, or None.
+
+        Arguments:
+            instance {str} -- the full instance name
+        """
+        for service, kind in SERVICE_TYPES.items():
+            if instance.lower().endswith("." + service):
+                return kind
+        return None
+
+    def update_advertisement(self, instance, kind, ttl, info, source, now):
+        """
+        Record the appearance, refresh or withdrawal of an advertisement.
+        The caller must hold the lock.
+
+        Arguments:
+            instance {str} -- the full instance name
+            kind {str} -- SERVICE_COMMISSIONABLE or SERVICE_OPERATIONAL
+            ttl {int} -- the ttl of the record, 0 for a goodbye
+            info {dict} -- the txt and host of the instance
+            source {str} -- the address of the sender
+            now {float} -- the receive time
+        """
+        advertisement = MdnsBrowser.advertisements.get(instance)
+        if ttl == 0:
+            if (advertisement is not None) and (
+                    advertisement["withdrawn_at"] is None):
+                advertisement["withdrawn_at"] = now
+                logging.info("mDNS withdrawn {} ({})".format(
+                    instance, advertisement["targetId"]))
+            return
+        if (advertisement is None) or (advertisement["withdrawn_at"] is not None):
+            advertisement = {
+                "instance": instance,
+                "service": kind,
+                "discriminator": None,
+                "source": source,
+                "targetId": None,
+                "first_seen": now,
+                "last_refresh": now,
+                "refresh_count": 0,
+                "ttl": ttl,
+                "withdrawn_at": None}
+            MdnsBrowser.advertisements[instance] = advertisement
+        else:
+            advertisement["last_refresh"] = now
+            advertisement["refresh_count"] += 1
+            advertisement["ttl"] = ttl
+        txt = info.get("txt")
+        if txt is not None and "D" in txt:
+            try:
+                advertisement["discriminator"] = int(txt["D"])
+            except ValueError:
+                pass
+        if advertisement["targetId"] is None:
+            for device in MdnsBrowser.devices.values():
+                if MdnsBrowser.match_device(device, advertisement):
+                    MdnsBrowser.attach(device["targetId"], advertisement)
+                    break
+
+    @staticmethod
+    def match_device(device, advertisement):
+        """
+        Check an advertisement belongs to a device. The caller must hold the
+        lock.
+
+        Arguments:
+            device {dict} -- the device dict
+            advertisement {dict} -- the advertisement dict
+        """
+        if device[advertisement["service"]] is not None:
+            return False
+        if advertisement["service"] == SERVICE_COMMISSIONABLE:
+            return advertisement["discriminator"] == device["discriminator"]
+        if device["connected_at"] is None:
+            return False
+        if device["node_id"] is not None:
+            # Operational instance name is <compressed fabric id>-<node id>
+            label = advertisement["instance"].split(".")[0]
+            return label.upper().endswith("-{:016X}".format(device["node_id"]))
+        return advertisement["source"] in device["addresses"]
+
+    @staticmethod
+    def attach(targetid, advertisement):
+        """
+        Attribute an advertisement to a device and record the latency.
+        The caller must hold the lock.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+            advertisement {dict} -- the advertisement dict
+        """
+        device = MdnsBrowser.devices[targetid]
+        kind = advertisement["service"]
+        advertisement["targetId"] = targetid
+        mark = device["started_at"] if kind == SERVICE_COMMISSIONABLE \
+            else device["connected_at"]
+        latency = max(0.0, advertisement["first_seen"] - mark)
+        device[kind] = latency
+        MdnsBrowser.latencies.setdefault(device["fleet"], {}).setdefault(
+            kind, deque(maxlen=MDNS_LATENCY_SAMPLES)).append((targetid, latency))
+        logging.info("mDNS {} advertisement of {} visible after {:.3f}s".format(
+            kind, targetid, latency))
+
+    def expire(self, now):
+        """
+        Mark the advertisements whose TTL ran out as withdrawn and forget the
+        ones withdrawn more than MDNS_WITHDRAWN_RETENTION seconds ago.
+
+        Arguments:
+            now {float} -- the current time
+        """
+        with MdnsBrowser.lock:
+            for instance, advertisement in list(MdnsBrowser.advertisements.items()):
+                if (advertisement["withdrawn_at"] is None) and (
+                        now > advertisement["last_refresh"] + advertisement["ttl"]):
+                    advertisement["withdrawn_at"] = (
+                        advertisement["last_refresh"] + advertisement["ttl"])
+                if (advertisement["withdrawn_at"] is not None) and (
+                        now - advertisement["withdrawn_at"] > MDNS_WITHDRAWN_RETENTION):
+                    del MdnsBrowser.advertisements[instance]
+
+    @staticmethod
+    def encode_name(name):
+        """
+        Return a domain name in DNS wire format.
+
+        Arguments:
+            name {str} -- the dotted domain name
+        """
+        data = b""
+        for label in name.rstrip(".").split("."):
+            encoded = label.encode()
+            data += bytes([len(encoded)]) + encoded
+        return data + b"\x00"
+
+    @staticmethod
+    def read_name(data, offset):
+        """
+        Read a possibly compressed domain name.
+
+        Arguments:
+            data {bytes} -- the packet
+            offset {int} -- the offset of the name
+        Return:
+            (name, offset after the name)
+        Raises:
+            DnsParseError -- if the name is malformed
+        """
+        labels = []
+        end = None
+        jumps = 0
+        while True:
+            if offset >= len(data):
+                raise DnsParseError("name out of packet")
+            length = data[offset]
+            if length & 0xc0 == 0xc0:
+                if offset + 1 >= len(data):
+                    raise DnsParseError("truncated pointer")
+                if end is None:
+                    end = offset + 2
+                offset = ((length & 0x3f) << 8) | data[offset + 1]
+                jumps += 1
+                if jumps > 32:
+                    raise DnsParseError("pointer loop")
+                continue
+            offset += 1
+            if length == 0:
+                break
+            labels.append(data[offset:offset + length].decode(errors="replace"))
+            offset += length
+        return ".".join(labels), (end if end is not None else offset)
+
+    @staticmethod
+    def parse_txt(rdata):
+        """
+        Return the key/value pairs of a TXT record.
+
+        Arguments:
+            rdata {bytes} -- the record data
+        """
+        txt = {}
+        offset = 0
+        while offset < len(rdata):
+            length = rdata[offset]
+            entry = rdata[offset + 1:offset + 1 + length].decode(errors="replace")
+            offset += 1 + length
+            key, _, value = entry.partition("=")
+            if key:
+                txt[key] = value
+        return txt
+
+    @staticmethod
+    def parse_packet(data):
+        """
+        Return the resource records of a mDNS response, or None for a query.
+
+        Arguments:
+            data {bytes} -- the udp payload
+        Return:
+            A list of (name, type, ttl, rdata). rdata is a name for PTR,
+            a dict for TXT, (priority, weight, port, target) for SRV, an
+            address for A/AAAA and bytes otherwise.
+        Raises:
+            DnsParseError -- if the packet is malformed
+        """
+        if len(data) < DNS_HEADER.size:
+            raise DnsParseError("short header")
+        _, flags, qdcount, ancount, nscount, arcount = DNS_HEADER.unpack_from(data)
+        if not flags & DNS_FLAG_RESPONSE:
+            return None
+        offset = DNS_HEADER.size
+        for _ in range(qdcount):
+            _, offset = MdnsBrowser.read_name(data, offset)
+            offset += 4
+        records = []
+        for _ in range(ancount + nscount + arcount):
+            name, offset = MdnsBrowser.read_name(data, offset)
+            if offset + DNS_RECORD.size > len(data):
+                raise DnsParseError("truncated record")
+            rtype, _, ttl, rdlength = DNS_RECORD.unpack_from(data, offset)
+            offset += DNS_RECORD.size
+            if offset + rdlength > len(data):
+                raise DnsParseError("truncated rdata")
+            rdata = data[offset:offset + rdlength]
+            if rtype == DNS_TYPE_PTR:
+                rdata = MdnsBrowser.read_name(data, offset)[0]
+            elif rtype == DNS_TYPE_SRV and rdlength >= 7:
+                rdata = struct.unpack_from("!HHH", data, offset) + (
+                    MdnsBrowser.read_name(data, offset + 6)[0],)
+            elif rtype == DNS_TYPE_TXT:
+                rdata = MdnsBrowser.parse_txt(rdata)
+            elif rtype == DNS_TYPE_A and rdlength == 4:
+                rdata = socket.inet_ntop(socket.AF_INET, rdata)
+            elif rtype == DNS_TYPE_AAAA and rdlength == 16:
+                rdata = socket.inet_ntop(socket.AF_INET6, rdata)
+            records.append((name, rtype, ttl, rdata))
+            offset += rdlength
+        return records
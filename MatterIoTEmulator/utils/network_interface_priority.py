@@ -15,12 +15,16 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
-import psutil
-import sys
-import os
+import logging
+import threading
+import time
+from utils.interface_state import InterfaceStateCache
 
 WIFI_INTERFACE = "wlan0"
 ETHERNET_INTERFACE = "eth0"
+# Interfaces in priority order, ethernet has priority higher than wifi
+UPLINK_INTERFACES = [ETHERNET_INTERFACE, WIFI_INTERFACE]
+UPLINK_POLL_INTERVAL = 0.5
 
 
 def check_interface_up(interface_check):
@@ -33,33 +37,132 @@ def check_interface_up(interface_check):
         True: if the interface is on up state
         False: if the interface is on down state
     """
-    # Get network interfaces and their statuses
-    network_interfaces = psutil.net_if_stats()
-    list_if_name = network_interfaces.items()
-    for interface, stats in list_if_name:
-        if (interface_check == interface):
-            print(f"Interface: {interface}, isUp: {stats.isup}")
-            os.environ['NETWORK_IF_NAME'] = interface
-            return stats.isup
-    return False
+    return InterfaceStateCache.get_operstate(interface_check) == "UP"
 
 
 def get_network_interface():
     """
-    Return the network interface.
+    Return the first network interface which is up, None if all are down.
     """
-    # Ethernet has priority higher than wifi
     try:
-        if (check_interface_up(ETHERNET_INTERFACE)):
-            return ETHERNET_INTERFACE
-
-        if (check_interface_up(WIFI_INTERFACE)):
-            return WIFI_INTERFACE
+        for interface in UPLINK_INTERFACES:
+            if (check_interface_up(interface)):
+                return interface
     except Exception as e:
-        print("Can not get interface ", str(e))
+        logging.error("Can not get interface {}".format(e))
         return ETHERNET_INTERFACE
-    print("Network Down")
-    sys.exit()
+    logging.warning("Network Down")
+    return None
+
+
+def get_network_if_name():
+    """
+    Return the name of the interface the devices are running on.
+    """
+    return UplinkMonitor.interface
+
+
+class UplinkMonitor():
+    """
+    UplinkMonitor class for following the state of the uplink interface.
+
+    The uplink is the first interface of UPLINK_INTERFACES which is up. When
+    it goes down the monitor fails over to the next interface which is up,
+    and fails back once the preferred one is up again, notifying the
+    listeners so devices can pause and resume their advertisement and move
+    their addresses.
+    """
+    lock = threading.Lock()
+    interface = get_network_interface() or ETHERNET_INTERFACE
+    previous_interface = interface
+    is_up = check_interface_up(interface)
+    changed_at = time.time()
+    listeners = []
+    poll_thread = None
+
+    @staticmethod
+    def start():
+        """
+        Start following the uplink state.
+        """
+        InterfaceStateCache.add_listener(UplinkMonitor.on_interface_changed)
+        InterfaceStateCache.start()
+        with UplinkMonitor.lock:
+            if ((InterfaceStateCache.monitor_thread is None) and (
+                    UplinkMonitor.poll_thread is None)):
+                # No netlink events, fall back to polling
+                UplinkMonitor.poll_thread = threading.Thread(
+                    target=UplinkMonitor.poll, name="UplinkMonitor")
+                UplinkMonitor.poll_thread.daemon = True
+                UplinkMonitor.poll_thread.start()
+
+    @staticmethod
+    def add_listener(callback):
+        """
+        Register a function called with the new state on every change.
+
+        Arguments:
+            callback {function} -- called with the dictionary of get_state()
+        """
+        with UplinkMonitor.lock:
+            if (callback not in UplinkMonitor.listeners):
+                UplinkMonitor.listeners.append(callback)
+
+    @staticmethod
+    def get_state():
+        """
+        Return the uplink state.
+
+        Return:
+            A dictionary of the interface name, previous interface name,
+            up state and the time of the last change
+        """
+        with UplinkMonitor.lock:
+            return {"interface": UplinkMonitor.interface,
+                    "previous_interface": UplinkMonitor.previous_interface,
+                    "is_up": UplinkMonitor.is_up,
+                    "changed_at": UplinkMonitor.changed_at}
+
+    @staticmethod
+    def poll():
+        """
+        Check the uplink state periodically when netlink is not available.
+        """
+        while True:
+            time.sleep(UPLINK_POLL_INTERVAL)
+            UplinkMonitor.on_interface_changed(UplinkMonitor.interface)
 
+    @staticmethod
+    def on_interface_changed(ifname):
+        """
+        Update the uplink state after an interface changed.
 
-NETWORK_IF_NAME = get_network_interface()
+        Arguments:
+            ifname {str} -- the changed interface name
+        """
+        if (ifname not in UPLINK_INTERFACES):
+            return
+        with UplinkMonitor.lock:
+            interface = UplinkMonitor.interface
+            is_up = False
+            for candidate in UPLINK_INTERFACES:
+                if check_interface_up(candidate):
+                    interface = candidate
+                    is_up = True
+                    break
+            if ((interface == UplinkMonitor.interface) and (
+                    is_up == UplinkMonitor.is_up)):
+                return
+            UplinkMonitor.previous_interface = UplinkMonitor.interface
+            UplinkMonitor.interface = interface
+            UplinkMonitor.is_up = is_up
+            UplinkMonitor.changed_at = time.time()
+            listeners = list(UplinkMonitor.listeners)
+        logging.info("Uplink changed: {} -> {}, up: {}".format(
+            UplinkMonitor.previous_interface, interface, is_up))
+        state = UplinkMonitor.get_state()
+        for callback in listeners:
+            try:
+                callback(state)
+            except Exception as e:
+                logging.error("Uplink listener failed: {}".format(e))
@@ -0,0 +1,303 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import functools
+import html
+import io
+import logging
+import os
+import qrcode
+from setup_payload.generate_setup_payload import generate_codes
+from utils.atomic_file import AtomicFile
+from utils.device_registry import DeviceRegistry
+from utils.running_devices import RunningDeviceRegistry
+from constants import *
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:
+    Image = None
+
+SHEET_FORMATS = ["html", "png", "pdf"]
+# A4 in inches
+SHEET_PAGE_SIZE = (8.27, 11.69)
+SHEET_QR_BORDER = 4
+SHEET_LINE_HEIGHT = 14
+
+SHEET_HTML_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Matter onboarding codes</title>
+<style>
+body { font-family: sans-serif; margin: 1em; }
+.sheet { display: grid; grid-template-columns: repeat(COLUMNS, 1fr); gap: 1em; }
+.tile { border: 1px solid #ccc; padding: 0.5em; text-align: center; break-inside: avoid; }
+.tile svg { width: 100%; max-width: 240px; }
+.manual { font-size: 1.3em; font-weight: bold; letter-spacing: 0.05em; }
+.small { font-size: 0.75em; color: #555; word-break: break-all; }
+</style>
+</head>
+<body>
+"""
+
+
+class OnboardingSheet():
+    """
+    OnboardingSheet class for rendering the QR code and manual pairing code
+    of many devices on one sheet, so a commissioner can scan them in a row.
+
+    The devices are the stored ones (provisioned or already started), the
+    running ones are marked. A sheet is an HTML page with inline SVG QR
+    codes, or pages of ONBOARDING_SHEET_COLUMNS x ONBOARDING_SHEET_ROWS tiles
+    written as PNG or PDF when Pillow is installed. The codes and the QR
+    matrices are cached by payload.
+    """
+
+    @staticmethod
+    def get_devices(list_targetid=None):
+        """
+        Return the stored devices with their onboarding codes.
+
+        Arguments:
+            list_targetid {[str]} -- the devices to take (default = all)
+        Return:
+            The list of {targetId, device-type, discriminator, pin-code,
+            qrcode, manual-code, running} dictionaries ordered by create time
+        """
+        DeviceRegistry.sync()
+        running = set(RunningDeviceRegistry.get_devices())
+        devices = []
+        for item in DeviceRegistry.list_devices():
+            if list_targetid and (item['targetId'] not in list_targetid):
+                continue
+            try:
+                identity = (int(item['pin-code']), int(item['discriminator']),
+                            int(item['vendor-id']), int(item['product-id']))
+            except ValueError:
+                logging.warning("Skip {}, invalid identity".format(item['targetId']))
+                continue
+            qrcode_payload, manual_code = generate_codes(*identity)
+            devices.append({
+                'targetId': item['targetId'],
+                'device-type': item['device-type'],
+                'discriminator': identity[1],
+                'pin-code': identity[0],
+                'qrcode': qrcode_payload,
+                'manual-code': manual_code,
+                'running': item['targetId'] in running})
+        return devices
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def get_matrix(qr_payload):
+        """
+        Return the QR code modules of a payload, True for a dark module.
+
+        Arguments:
+            qr_payload {str} -- the QR code payload "MT:..."
+        Return:
+            A tuple of rows, including a SHEET_QR_BORDER module border
+        """
+        qr_instance = qrcode.QRCode(
+            error_correction=qrcode.constants.ERROR_CORRECT_L, border=SHEET_QR_BORDER)
+        qr_instance.add_data(qr_payload)
+        qr_instance.make(fit=True)
+        return tuple(tuple(row) for row in qr_instance.get_matrix())
+
+    @staticmethod
+    def render_image(qr_payload, scale):
+        """
+        Return the QR code of a payload as a grayscale image.
+
+        Arguments:
+            qr_payload {str} -- the QR code payload "MT:..."
+            scale {int} -- pixels per module
+        Raises:
+            ValueError: if Pillow is not installed
+        """
+        if Image is None:
+            raise ValueError("Pillow is required to write QR code images")
+        matrix = OnboardingSheet.get_matrix(qr_payload)
+        size = len(matrix)
+        image = Image.frombytes("L", (size, size), bytes(
+            0 if module else 255 for row in matrix for module in row))
+        return image.resize((size * scale, size * scale), Image.NEAREST)
+
+    @staticmethod
+    def format_manual_code(manual_code):
+        """
+        Return a manual pairing code grouped as printed on devices,
+        e.g. 3497-011-2332.
+
+        Arguments:
+            manual_code {str} -- the 11 or 21 digit code
+        """
+        groups = [manual_code[:4], manual_code[4:7], manual_code[7:11]]
+        groups += [manual_code[offset:offset + 5]
+                   for offset in range(11, len(manual_code), 5)]
+        return "-".join(groups)
+
+    @staticmethod
+    def render_svg(qr_payload):
+        """
+        Return the QR code of a payload as an SVG element, one unit per module.
+
+        Arguments:
+            qr_payload {str} -- the QR code payload "MT:..."
+        """
+        matrix = OnboardingSheet.get_matrix(qr_payload)
+        path = []
+        for y, row in enumerate(matrix):
+            x = 0
+            while x < len(row):
+                if not row[x]:
+                    x += 1
+                    continue
+                start = x
+                while x < len(row) and row[x]:
+                    x += 1
+                path.append("M{} {}h{}v1h-{}z".format(start, y, x - start, x - start))
+        return ('<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {0} {0}" '
+                'shape-rendering="crispEdges"><rect width="{0}" height="{0}" '
+                'fill="#fff"/><path d="{1}" fill="#000"/></svg>').format(
+                    len(matrix), "".join(path))
+
+    @staticmethod
+    def render_html(devices):
+        """
+        Return the sheet as an HTML page.
+
+        Arguments:
+            devices {[dict]} -- the devices from get_devices()
+        """
+        parts = [SHEET_HTML_HEAD.replace("COLUMNS", str(ONBOARDING_SHEET_COLUMNS)),
+                 "<h1>Matter onboarding codes ({} devices)</h1>\n".format(len(devices)),
+                 '<div class="sheet">\n']
+        for device in devices:
+            parts.append(
+                '<div class="tile">{}<div class="manual">{}</div>'
+                '<div>{}{}</div><div class="small">{} - discriminator {}</div>'
+                '<div class="small">{}</div></div>\n'.format(
+                    OnboardingSheet.render_svg(device['qrcode']),
+                    OnboardingSheet.format_manual_code(device['manual-code']),
+                    html.escape(device['targetId']),
+                    " (running)" if device['running'] else "",
+                    html.escape(str(device['device-type'])), device['discriminator'],
+                    html.escape(device['qrcode'])))
+        parts.append("</div>\n</body>\n</html>\n")
+        return "".join(parts)
+
+    @staticmethod
+    def render_pages(devices):
+        """
+        Return the sheet as a list of page images.
+
+        Arguments:
+            devices {[dict]} -- the devices from get_devices()
+        Raises:
+            ValueError: if Pillow is not installed
+        """
+        if Image is None:
+            raise ValueError("Pillow is required to write PNG and PDF sheets")
+        page_width = int(SHEET_PAGE_SIZE[0] * ONBOARDING_SHEET_DPI)
+        page_height = int(SHEET_PAGE_SIZE[1] * ONBOARDING_SHEET_DPI)
+        margin = ONBOARDING_SHEET_DPI // 3
+        tile_width = (page_width - 2 * margin) // ONBOARDING_SHEET_COLUMNS
+        tile_height = (page_height - 2 * margin) // ONBOARDING_SHEET_ROWS
+        font = ImageFont.load_default()
+        per_page = ONBOARDING_SHEET_COLUMNS * ONBOARDING_SHEET_ROWS
+        pages = []
+        for offset in range(0, len(devices), per_page):
+            page = Image.new("L", (page_width, page_height), 255)
+            draw = ImageDraw.Draw(page)
+            for index, device in enumerate(devices[offset:offset + per_page]):
+                left = margin + (index % ONBOARDING_SHEET_COLUMNS) * tile_width
+                top = margin + (index // ONBOARDING_SHEET_COLUMNS) * tile_height
+                size = len(OnboardingSheet.get_matrix(device['qrcode']))
+                scale = max(1, min(tile_width, tile_height - 4 * SHEET_LINE_HEIGHT) // size)
+                image = OnboardingSheet.render_image(device['qrcode'], scale)
+                page.paste(image, (left + (tile_width - size * scale) // 2, top))
+                lines = [OnboardingSheet.format_manual_code(device['manual-code']),
+                         device['targetId'] + (" (running)" if device['running'] else ""),
+                         "{} - discriminator {}".format(
+                             device['device-type'], device['discriminator']),
+                         device['qrcode']]
+                y = top + size * scale
+                for line in lines:
+                    x = left + (tile_width - int(draw.textlength(line, font=font))) // 2
+                    draw.text((x, y), line, fill=0, font=font)
+                    y += SHEET_LINE_HEIGHT
+            pages.append(page)
+        return pages
+
+    @staticmethod
+    def write(path, devices, file_format=None):
+        """
+        Write a sheet.
+
+        Arguments:
+            path {str} -- the output file, a PNG sheet of several pages is
+                          written to <name>-<page>.png
+            devices {[dict]} -- the devices from get_devices()
+            file_format {str} -- "html", "png" or "pdf" (default = extension)
+        Return:
+            The list of written files
+        Raises:
+            ValueError: if the format is not supported or Pillow is missing
+            OSError: if a file can not be written
+        """
+        file_format = (file_format or os.path.splitext(path)[1][1:]).lower()
+        if file_format not in SHEET_FORMATS:
+            raise ValueError("Unsupported sheet format '{}', use {}".format(
+                file_format, ", ".join(SHEET_FORMATS)))
+        if file_format == "html":
+            AtomicFile.write_text(path, OnboardingSheet.render_html(devices))
+            return [path]
+        pages = OnboardingSheet.render_pages(devices) or [
+            Image.new("L", (int(SHEET_PAGE_SIZE[0] * ONBOARDING_SHEET_DPI),
+                            int(SHEET_PAGE_SIZE[1] * ONBOARDING_SHEET_DPI)), 255)]
+        if file_format == "pdf":
+            data = io.BytesIO()
+            pages[0].save(data, "PDF", resolution=ONBOARDING_SHEET_DPI,
+                          save_all=True, append_images=pages[1:])
+            AtomicFile.write_bytes(path, data.getvalue())
+            return [path]
+        paths = [path]
+        if len(pages) > 1:
+            base = os.path.splitext(path)[0]
+            paths = ["{}-{}.png".format(base, number) for number in range(1, len(pages) + 1)]
+        for page_path, page in zip(paths, pages):
+            data = io.BytesIO()
+            page.save(data, "PNG", dpi=(ONBOARDING_SHEET_DPI, ONBOARDING_SHEET_DPI))
+            AtomicFile.write_bytes(page_path, data.getvalue())
+        return paths
+
+    @staticmethod
+    def export(path, list_targetid=None, file_format=None):
+        """
+        Write the sheet of the stored devices.
+
+        Arguments:
+            path {str} -- the output file
+            list_targetid {[str]} -- the devices to take (default = all)
+            file_format {str} -- "html", "png" or "pdf" (default = extension)
+        Return:
+            (the list of written files, the number of devices)
+        """
+        devices = OnboardingSheet.get_devices(list_targetid)
+        return OnboardingSheet.write(path, devices, file_format), len(devices)
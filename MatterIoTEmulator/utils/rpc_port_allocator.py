@@ -0,0 +1,184 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import json
+import logging
+import os
+import socket
+import threading
+from utils.atomic_file import AtomicFile
+from constants import RPC_PORT_RESERVATION_FILE, RPC_PORT_MIN, RPC_PORT_MAX
+
+SOURCE_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+RESERVATION_PATH = os.path.join(SOURCE_PATH, RPC_PORT_RESERVATION_FILE)
+
+
+class RpcPortAllocator():
+    """
+    RpcPortAllocator class for handing out the RPC server port of devices.
+
+    A port is only handed out when it is not reserved by another device,
+    not used by a recover device and can really be bound. Reservations are
+    kept in a file so a restarted device gets its previous port back.
+    """
+    lock = threading.Lock()
+    reservations = None
+    # Ports of the recover devices, HandleRecoverDevices.list_recover_rpc_port
+    recover_ports = []
+
+    @staticmethod
+    def load():
+        """
+        Load the reservations from file. The caller must hold the lock.
+        """
+        if (RpcPortAllocator.reservations is not None):
+            return
+        RpcPortAllocator.reservations = {}
+        try:
+            with open(RESERVATION_PATH, 'r') as file:
+                data = json.load(file)
+            RpcPortAllocator.reservations = {
+                int(port): targetid for port, targetid in data.items()}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as err:
+            logging.error("Fail to read rpc port reservations: {}".format(err))
+
+    @staticmethod
+    def save():
+        """
+        Write the reservations to file. The caller must hold the lock.
+        """
+        try:
+            AtomicFile.write_json(RESERVATION_PATH, {
+                str(port): targetid for port, targetid in
+                RpcPortAllocator.reservations.items()})
+        except OSError as err:
+            logging.error(
+                "Fail to write rpc port reservations: {}".format(err))
+
+    @staticmethod
+    def is_port_free(port):
+        """
+        Check a port can be bound by the RPC server of a device.
+
+        Arguments:
+            port {int} -- the port number
+        Return:
+            True: if the port can be bound
+            False: if the port is used by another process
+        """
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind(("", port))
+            except OSError:
+                return False
+        return True
+
+    @staticmethod
+    def allocate(targetid, start_port=RPC_PORT_MIN):
+        """
+        Reserve a free RPC port for a device and return it.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+            start_port {int} -- the first port to try
+        Return:
+            The reserved port number, or None if no port is free
+        """
+        with RpcPortAllocator.lock:
+            RpcPortAllocator.load()
+            # Give back the port reserved for this device if still usable
+            for port, owner in RpcPortAllocator.reservations.items():
+                if (owner == targetid and port >= start_port and
+                        RpcPortAllocator.is_port_free(port)):
+                    return port
+            for port in range(start_port, RPC_PORT_MAX + 1):
+                owner = RpcPortAllocator.reservations.get(port)
+                if ((owner is not None and owner != targetid) or (
+                        port in RpcPortAllocator.recover_ports)):
+                    continue
+                if (not RpcPortAllocator.is_port_free(port)):
+                    logging.info("Rpc port {} is in use, skip it".format(port))
+                    continue
+                for reserved_port, reserved_owner in list(
+                        RpcPortAllocator.reservations.items()):
+                    if (reserved_owner == targetid):
+                        del RpcPortAllocator.reservations[reserved_port]
+                RpcPortAllocator.reservations[port] = targetid
+                RpcPortAllocator.save()
+                return port
+        logging.error("No free rpc port from {}".format(start_port))
+        return None
+
+    @staticmethod
+    def reserve(targetid, port):
+        """
+        Record a port which was already given to a device (recover device).
+
+        Arguments:
+            targetid {str} -- the target id of the device
+            port {int} -- the port number
+        """
+        with RpcPortAllocator.lock:
+            RpcPortAllocator.load()
+            if (RpcPortAllocator.reservations.get(port) != targetid):
+                RpcPortAllocator.reservations[port] = targetid
+                RpcPortAllocator.save()
+
+    @staticmethod
+    def get_owner(port):
+        """
+        Return the target id which reserved a port, or None.
+
+        Arguments:
+            port {int} -- the port number
+        """
+        with RpcPortAllocator.lock:
+            RpcPortAllocator.load()
+            return RpcPortAllocator.reservations.get(int(port))
+
+    @staticmethod
+    def release_device(targetid):
+        """
+        Give back every port reserved by a device whose folder is removed.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+        """
+        with RpcPortAllocator.lock:
+            RpcPortAllocator.load()
+            ports = [port for port, owner in RpcPortAllocator.reservations.items()
+                     if owner == targetid]
+            for port in ports:
+                del RpcPortAllocator.reservations[port]
+            if ports:
+                RpcPortAllocator.save()
+
+    @staticmethod
+    def release(port):
+        """
+        Give back the port of a stopped device.
+
+        Arguments:
+            port {int} -- the port number
+        """
+        with RpcPortAllocator.lock:
+            RpcPortAllocator.load()
+            if (RpcPortAllocator.reservations.pop(int(port), None) is not None):
+                RpcPortAllocator.save()
@@ -0,0 +1,157 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import logging
+import os
+import threading
+from utils.atomic_file import AtomicFile
+from constants import DEVICE_LIST_FILE, DEVICE_LIST_FLUSH_DELAY
+
+SOURCE_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEVICE_LIST_PATH = os.path.join(SOURCE_PATH, DEVICE_LIST_FILE)
+
+
+class RunningDeviceRegistry():
+    """
+    RunningDeviceRegistry class for tracking the target id of running devices.
+
+    The set is shared by every tab (and any headless front-end) of the
+    process. Changes are written to deviceList.dat in the background, a
+    burst of changes results in one atomic write.
+    """
+    lock = threading.Lock()
+    devices = set()
+    serials = {}
+    flush_timer = None
+
+    @staticmethod
+    def get_serial(targetid):
+        """
+        Return the serial number part (hex) of a target id.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+        """
+        return targetid.split('-')[-1]
+
+    @staticmethod
+    def add(targetid):
+        """
+        Add a running device.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+        Return:
+            True: if the device was added
+            False: if the device is already running
+        """
+        if (targetid == ""):
+            return False
+        with RunningDeviceRegistry.lock:
+            if (targetid in RunningDeviceRegistry.devices):
+                return False
+            RunningDeviceRegistry.devices.add(targetid)
+            serial = RunningDeviceRegistry.get_serial(targetid)
+            RunningDeviceRegistry.serials[serial] = \
+                RunningDeviceRegistry.serials.get(serial, 0) + 1
+            RunningDeviceRegistry.schedule_flush()
+        return True
+
+    @staticmethod
+    def remove(targetid):
+        """
+        Remove a stopped device.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+        """
+        with RunningDeviceRegistry.lock:
+            if (targetid not in RunningDeviceRegistry.devices):
+                return
+            RunningDeviceRegistry.devices.discard(targetid)
+            serial = RunningDeviceRegistry.get_serial(targetid)
+            RunningDeviceRegistry.serials[serial] -= 1
+            if (RunningDeviceRegistry.serials[serial] == 0):
+                del RunningDeviceRegistry.serials[serial]
+            RunningDeviceRegistry.schedule_flush()
+
+    @staticmethod
+    def contains(targetid):
+        """
+        Check a device is running.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+        """
+        return targetid in RunningDeviceRegistry.devices
+
+    @staticmethod
+    def has_serial(serial):
+        """
+        Check a serial number is used by a running device.
+
+        Arguments:
+            serial {int} -- the serial number
+        """
+        return hex(int(serial))[2:] in RunningDeviceRegistry.serials
+
+    @staticmethod
+    def get_devices():
+        """
+        Return the target id of the running devices.
+        """
+        with RunningDeviceRegistry.lock:
+            return list(RunningDeviceRegistry.devices)
+
+    @staticmethod
+    def clear():
+        """
+        Forget all devices and empty deviceList.dat immediately.
+        """
+        with RunningDeviceRegistry.lock:
+            RunningDeviceRegistry.devices.clear()
+            RunningDeviceRegistry.serials.clear()
+        RunningDeviceRegistry.flush()
+
+    @staticmethod
+    def schedule_flush():
+        """
+        Write deviceList.dat after DEVICE_LIST_FLUSH_DELAY unless a write is
+        already pending. The caller must hold the lock.
+        """
+        if (RunningDeviceRegistry.flush_timer is not None):
+            return
+        RunningDeviceRegistry.flush_timer = threading.Timer(
+            DEVICE_LIST_FLUSH_DELAY, RunningDeviceRegistry.flush)
+        RunningDeviceRegistry.flush_timer.daemon = True
+        RunningDeviceRegistry.flush_timer.start()
+
+    @staticmethod
+    def flush():
+        """
+        Write the running devices to deviceList.dat.
+        """
+        with RunningDeviceRegistry.lock:
+            if (RunningDeviceRegistry.flush_timer is not None):
+                RunningDeviceRegistry.flush_timer.cancel()
+                RunningDeviceRegistry.flush_timer = None
+            device_list = ":".join(sorted(RunningDeviceRegistry.devices))
+            try:
+                AtomicFile.write_text(DEVICE_LIST_PATH, device_list)
+            except OSError as err:
+                logging.error(
+                    "Fail to write device list to file: {}".format(err))
@@ -0,0 +1,252 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import json
+import logging
+import os
+import threading
+import time
+from utils.atomic_file import AtomicFile
+from utils.device_registry import DeviceRegistry, REQUIRED_OPTIONS
+from utils.rpc_port_allocator import RpcPortAllocator
+from utils.running_devices import RunningDeviceRegistry
+from constants import *
+
+SOURCE_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+CURRENT_TEMP_DIR = SOURCE_PATH + TEMP_PATH
+QUARANTINE_DIR = os.path.join(SOURCE_PATH, STORAGE_QUARANTINE_PATH)
+CHECK_STATE_PATH = os.path.join(SOURCE_PATH, STORAGE_CHECK_STATE_FILE)
+
+
+class StorageConsistencyChecker():
+    """
+    StorageConsistencyChecker class for finding broken device folders in
+    temp/ and moving them to quarantine/ instead of deleting them.
+
+    A folder is broken when its chip_factory.ini is missing or lacks a
+    required option, or when a commissioned device lacks its address or one
+    of its NUMBER_STORAGE_FILE storage files. Only the folders which changed since
+    they were last found consistent are read: a pass lists temp/ once and
+    compares the mtime of each folder and of its chip_factory.ini with the
+    state saved in STORAGE_CHECK_STATE_FILE. Folders of running devices and
+    folders modified less than STORAGE_CHECK_GRACE seconds ago are left
+    for a later pass, so a folder being written is never moved.
+    """
+    lock = threading.Lock()
+    dirty = set()
+    checked = None
+    last_report = None
+
+    def __init__(self, interval=STORAGE_CHECK_INTERVAL):
+        """
+        Initialize a StorageConsistencyChecker instance.
+
+        Arguments:
+            interval {int} -- seconds between two background passes
+        """
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def mark_dirty(targetid):
+        """
+        Ask the next pass to check a folder even if it looks unchanged.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+        """
+        with StorageConsistencyChecker.lock:
+            StorageConsistencyChecker.dirty.add(targetid)
+
+    @staticmethod
+    def load_state():
+        """
+        Load the signatures of the consistent folders. The caller must hold
+        the lock.
+        """
+        if StorageConsistencyChecker.checked is not None:
+            return
+        try:
+            with open(CHECK_STATE_PATH) as file:
+                StorageConsistencyChecker.checked = {
+                    key: tuple(value) for key, value in json.load(file).items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            StorageConsistencyChecker.checked = {}
+
+    @staticmethod
+    def get_signature(path):
+        """
+        Return the (folder mtime, chip_factory.ini mtime) of a device folder.
+
+        Adding, removing or atomically replacing a file changes the folder
+        mtime, writing chip_factory.ini in place changes its own mtime.
+
+        Arguments:
+            path {str} -- the device folder
+        """
+        try:
+            ini_mtime = os.stat(os.path.join(path, CHIP_FACTORY_FILE)).st_mtime_ns
+        except OSError:
+            ini_mtime = 0
+        return (os.stat(path).st_mtime_ns, ini_mtime)
+
+    @staticmethod
+    def check_folder(path):
+        """
+        Return what is wrong with a device folder, or "" if it is consistent.
+
+        Arguments:
+            path {str} -- the device folder
+        """
+        config_file = os.path.join(path, CHIP_FACTORY_FILE)
+        if (not os.path.isfile(config_file)):
+            return "missing " + CHIP_FACTORY_FILE
+        dict_config = DeviceRegistry.parse_config_file(config_file)
+        if dict_config is None:
+            return "{} lacks one of {}".format(
+                CHIP_FACTORY_FILE, ", ".join(REQUIRED_OPTIONS))
+        if (dict_config.get('is_recover') == "1"):
+            for option in ('device-type', 'ipv4', 'ipv6', 'create-time'):
+                if (dict_config.get(option) == ""):
+                    return "commissioned device has no " + option
+            file_count = sum(entry.is_file() for entry in os.scandir(path))
+            if (file_count < NUMBER_STORAGE_FILE):
+                return "commissioned device has {} of {} storage files".format(
+                    file_count, NUMBER_STORAGE_FILE)
+        return ""
+
+    @staticmethod
+    def quarantine(targetid, reason):
+        """
+        Move a device folder to quarantine/ with a note of the reason.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+            reason {str} -- why the folder is moved
+        Return:
+            The new folder path
+        """
+        os.makedirs(QUARANTINE_DIR, exist_ok=True)
+        target_path = os.path.join(QUARANTINE_DIR, "{}-{}".format(
+            targetid, time.strftime("%Y%m%d-%H%M%S")))
+        suffix = 1
+        while os.path.exists(target_path):
+            suffix += 1
+            target_path = target_path.rsplit("~", 1)[0] + "~{}".format(suffix)
+        os.rename(CURRENT_TEMP_DIR + targetid, target_path)
+        AtomicFile.write_text(os.path.join(target_path, "reason.txt"), reason + "\n")
+        DeviceRegistry.delete(targetid)
+        RpcPortAllocator.release_device(targetid)
+        logging.warning("Quarantine temp folder {} to {}, reason {}".format(
+            targetid, target_path, reason))
+        return target_path
+
+    @staticmethod
+    def run_pass(now=None):
+        """
+        Check the changed and dirty folders once.
+
+        Arguments:
+            now {float} -- the current time (default = time.time())
+        Return:
+            The report {folders, checked, deferred, quarantined} of the pass,
+            quarantined is a list of (target id, reason)
+        """
+        now = time.time() if now is None else now
+        report = {"folders": 0, "checked": 0, "deferred": 0, "quarantined": []}
+        try:
+            entries = [entry for entry in os.scandir(CURRENT_TEMP_DIR)
+                       if entry.is_dir()]
+        except OSError as err:
+            logging.error("Fail to get path of storage folder: {}".format(err))
+            return report
+        with StorageConsistencyChecker.lock:
+            StorageConsistencyChecker.load_state()
+            checked = StorageConsistencyChecker.checked
+            dirty = StorageConsistencyChecker.dirty
+            StorageConsistencyChecker.dirty = set()
+            present = set()
+            for entry in entries:
+                targetid = entry.name
+                present.add(targetid)
+                try:
+                    signature = StorageConsistencyChecker.get_signature(entry.path)
+                except OSError:
+                    continue
+                if (targetid not in dirty) and (checked.get(targetid) == signature):
+                    continue
+                if (RunningDeviceRegistry.contains(targetid) or (
+                        now - max(signature) / 1e9 < STORAGE_CHECK_GRACE)):
+                    # Being written, check it again in the next pass
+                    StorageConsistencyChecker.dirty.add(targetid)
+                    report["deferred"] += 1
+                    continue
+                report["checked"] += 1
+                reason = StorageConsistencyChecker.check_folder(entry.path)
+                if reason:
+                    try:
+                        StorageConsistencyChecker.quarantine(targetid, reason)
+                    except OSError as err:
+                        logging.error("Fail to quarantine {}: {}".format(
+                            entry.path, err))
+                        continue
+                    checked.pop(targetid, None)
+                    present.discard(targetid)
+                    report["quarantined"].append((targetid, reason))
+                else:
+                    checked[targetid] = signature
+            for targetid in set(checked) - present:
+                del checked[targetid]
+            report["folders"] = len(present)
+            try:
+                AtomicFile.write_json(CHECK_STATE_PATH, checked, indent=None)
+            except OSError as err:
+                logging.error("Fail to save storage check state: {}".format(err))
+            StorageConsistencyChecker.last_report = report
+        return report
+
+    def start(self):
+        """
+        Run a pass every interval seconds in a background thread.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run, name="StorageConsistencyChecker")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread after the current pass.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def run(self):
+        """
+        Run a pass now, then every interval seconds until stop() is called.
+        """
+        while True:
+            report = StorageConsistencyChecker.run_pass()
+            if report["quarantined"]:
+                logging.warning("Quarantine storage folders: {}".format(
+                    report["quarantined"]))
+            if self._stop.wait(self.interval):
+                break
@@ -0,0 +1,508 @@
+# Copyright (c) 2024 LG Electronics, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import ctypes
+import logging
+import os
+import socket
+import struct
+import subprocess
+import threading
+import time
+from collections import OrderedDict, deque
+from constants import *
+
+ETH_P_ALL = 0x0003
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86dd
+ETH_HEADER_LEN = 14
+IPPROTO_UDP = 17
+SO_ATTACH_FILTER = 26
+SNAPLEN = 65535
+PCAP_LINKTYPE_ETHERNET = 1
+PCAP_GLOBAL_HEADER = struct.Struct("=IHHiIII")
+PCAP_RECORD_HEADER = struct.Struct("=IIII")
+PCAP_MAGIC = 0xa1b2c3d4
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+SOURCE_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# Classic BPF of "udp port 5540 or udp port 5353" on ethernet frames
+ACCEPT = (0x06, 0, 0, SNAPLEN)
+REJECT = (0x06, 0, 0, 0)
+CAPTURE_BPF_FILTER = [
+    (0x28, 0, 0, 12),                   # ldh [12] (ether type)
+    (0x15, 0, 8, ETH_P_IPV6),           # ipv6 ? : goto ipv4
+    (0x30, 0, 0, 20),                   # ldb [20] (next header)
+    (0x15, 0, 19, IPPROTO_UDP),
+    (0x28, 0, 0, 54),                   # ldh [54] (source port)
+    (0x15, 16, 0, MATTER_UDP_PORT),
+    (0x15, 15, 0, MDNS_UDP_PORT),
+    (0x28, 0, 0, 56),                   # ldh [56] (destination port)
+    (0x15, 13, 0, MATTER_UDP_PORT),
+    (0x15, 12, 13, MDNS_UDP_PORT),
+    (0x15, 0, 12, ETH_P_IP),            # ipv4 ? : reject
+    (0x30, 0, 0, 23),                   # ldb [23] (protocol)
+    (0x15, 0, 10, IPPROTO_UDP),
+    (0x28, 0, 0, 20),                   # ldh [20] (fragment offset)
+    (0x45, 8, 0, 0x1fff),
+    (0xb1, 0, 0, 14),                   # ldxb 4*([14]&0xf)
+    (0x48, 0, 0, 14),                   # ldh [x + 14] (source port)
+    (0x15, 4, 0, MATTER_UDP_PORT),
+    (0x15, 3, 0, MDNS_UDP_PORT),
+    (0x48, 0, 0, 16),                   # ldh [x + 16] (destination port)
+    (0x15, 1, 0, MATTER_UDP_PORT),
+    (0x15, 0, 1, MDNS_UDP_PORT),
+    ACCEPT,
+    REJECT]
+
+
+class DeviceTrafficCounter:
+    """
+    DeviceTrafficCounter class for counting the traffic of one device.
+    """
+
+    def __init__(self, targetid):
+        """
+        Initialize a DeviceTrafficCounter instance.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+        """
+        self.targetId = targetid
+        self.rx_packets = 0
+        self.tx_packets = 0
+        self.bytes = 0
+        self.mdns_packets = 0
+        self.retransmits = 0
+        self.last_seen = 0
+        # [second, packets, bytes] of the last CAPTURE_RATE_WINDOW seconds
+        self.buckets = deque()
+        # (session id, message counter) of the last sent Matter messages
+        self.recent_messages = OrderedDict()
+
+    def add_packet(self, now, length, is_tx, is_mdns, message_key):
+        """
+        Count a packet of the device.
+
+        Arguments:
+            now {float} -- the capture time
+            length {int} -- the frame length
+            is_tx {boolean} -- True if the device sent the packet
+            is_mdns {boolean} -- True if it is a mDNS packet
+            message_key {tuple} -- (session id, message counter) or None
+        """
+        if is_tx:
+            self.tx_packets += 1
+        else:
+            self.rx_packets += 1
+        if is_mdns:
+            self.mdns_packets += 1
+        self.bytes += length
+        self.last_seen = now
+        second = int(now)
+        if (len(self.buckets) > 0) and (self.buckets[-1][0] == second):
+            self.buckets[-1][1] += 1
+            self.buckets[-1][2] += length
+        else:
+            self.buckets.append([second, 1, length])
+        self.trim(now)
+        if (message_key is not None):
+            # MRP resends a message with the same counter
+            if (message_key in self.recent_messages):
+                self.retransmits += 1
+                self.recent_messages.move_to_end(message_key)
+            else:
+                self.recent_messages[message_key] = now
+                if (len(self.recent_messages) > CAPTURE_RETRANSMIT_HISTORY):
+                    self.recent_messages.popitem(last=False)
+
+    def trim(self, now):
+        """
+        Drop the buckets older than the rate window.
+
+        Arguments:
+            now {float} -- the current time
+        """
+        while (len(self.buckets) > 0) and (
+                self.buckets[0][0] <= now - CAPTURE_RATE_WINDOW):
+            self.buckets.popleft()
+
+    def get_counters(self, now):
+        """
+        Return the counters of the device as a dictionary.
+
+        Arguments:
+            now {float} -- the current time
+        """
+        self.trim(now)
+        packets = sum(bucket[1] for bucket in self.buckets)
+        length = sum(bucket[2] for bucket in self.buckets)
+        return {
+            "targetId": self.targetId,
+            "rx_packets": self.rx_packets,
+            "tx_packets": self.tx_packets,
+            "bytes": self.bytes,
+            "mdns_packets": self.mdns_packets,
+            "retransmits": self.retransmits,
+            "packets_per_second": packets / CAPTURE_RATE_WINDOW,
+            "bytes_per_second": length / CAPTURE_RATE_WINDOW,
+            "last_seen": self.last_seen}
+
+
+class PcapRingWriter:
+    """
+    PcapRingWriter class for writing packets to a ring of pcap files.
+    """
+
+    def __init__(self, directory, file_size, file_count):
+        """
+        Initialize a PcapRingWriter instance.
+
+        Arguments:
+            directory {str} -- the folder of the pcap files
+            file_size {int} -- the maximum size of one file in bytes
+            file_count {int} -- the number of files in the ring
+        """
+        self.directory = directory
+        self.file_size = file_size
+        self.file_count = file_count
+        self.index = -1
+        self.file = None
+        self.written = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def next_file(self):
+        """
+        Close the current file and start overwriting the next one.
+        """
+        self.close()
+        self.index = (self.index + 1) % self.file_count
+        path = os.path.join(
+            self.directory, "matter-{}.pcap".format(self.index))
+        self.file = open(path, "wb")
+        self.file.write(PCAP_GLOBAL_HEADER.pack(
+            PCAP_MAGIC, 2, 4, 0, 0, SNAPLEN, PCAP_LINKTYPE_ETHERNET))
+        self.written = PCAP_GLOBAL_HEADER.size
+
+    def write(self, timestamp, frame, orig_len):
+        """
+        Append a packet to the current file.
+
+        Arguments:
+            timestamp {float} -- the capture time
+            frame {bytes} -- the captured frame
+            orig_len {int} -- the length of the frame on the wire
+        """
+        if (self.file is None) or (self.written >= self.file_size):
+            self.next_file()
+        seconds = int(timestamp)
+        self.file.write(PCAP_RECORD_HEADER.pack(
+            seconds, int((timestamp - seconds) * 1000000), len(frame),
+            orig_len))
+        self.file.write(frame)
+        self.written += PCAP_RECORD_HEADER.size + len(frame)
+
+    def close(self):
+        """
+        Close the current file.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class TrafficCapture:
+    """
+    TrafficCapture class for capturing the Matter (udp 5540) and mDNS
+    (udp 5353) traffic of an interface and counting it per device.
+
+    Packets are read from an AF_PACKET socket with a BPF filter. If the
+    application is not allowed to open it, the packets are read from the
+    pcap output of `sudo tcpdump` instead.
+    """
+    lock = threading.Lock()
+    device_by_ip = {}
+    counters = {}
+
+    def __init__(self, network_if_name, pcap_enabled=CAPTURE_PCAP_ENABLED):
+        """
+        Initialize a TrafficCapture instance.
+
+        Arguments:
+            network_if_name {str} -- the interface to capture
+            pcap_enabled {boolean} -- write the packets to pcap files
+        """
+        self.network_if_name = network_if_name
+        self.pcap_writer = None
+        if pcap_enabled:
+            self.pcap_writer = PcapRingWriter(
+                os.path.join(SOURCE_PATH, CAPTURE_PCAP_PATH),
+                CAPTURE_PCAP_FILE_SIZE, CAPTURE_PCAP_FILE_COUNT)
+        self._socket = None
+        self._process = None
+        self._thread = None
+        self._stop = False
+        self._last_report = time.time()
+
+    @staticmethod
+    def register_device(targetid, list_ip):
+        """
+        Attribute the traffic of some ip addresses to a device.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+            list_ip {[str]} -- the ipv4 and ipv6 address of the device
+        """
+        with TrafficCapture.lock:
+            for ip in list_ip:
+                if ip:
+                    TrafficCapture.device_by_ip[
+                        TrafficCapture.normalize_ip(ip)] = targetid
+            if (targetid not in TrafficCapture.counters):
+                TrafficCapture.counters[targetid] = DeviceTrafficCounter(targetid)
+
+    @staticmethod
+    def normalize_ip(ip):
+        """
+        Return an ip address in the format of the captured packets.
+
+        Arguments:
+            ip {str} -- the ipv4 or ipv6 address
+        """
+        family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+        try:
+            return socket.inet_ntop(family, socket.inet_pton(family, ip))
+        except OSError:
+            return ip
+
+    @staticmethod
+    def unregister_device(targetid):
+        """
+        Stop counting the traffic of a device.
+
+        Arguments:
+            targetid {str} -- the target id of the device
+        """
+        with TrafficCapture.lock:
+            for ip in [ip for ip, owner in TrafficCapture.device_by_ip.items()
+                       if owner == targetid]:
+                del TrafficCapture.device_by_ip[ip]
+            TrafficCapture.counters.pop(targetid, None)
+
+    @staticmethod
+    def get_device_counters(targetid=None):
+        """
+        Return the counters of one device, or of all devices.
+
+        Arguments:
+            targetid {str} -- the target id of the device, None for all
+        """
+        now = time.time()
+        with TrafficCapture.lock:
+            if targetid is not None:
+                counter = TrafficCapture.counters.get(targetid)
+                return counter.get_counters(now) if counter else None
+            return [counter.get_counters(now) for counter in
+                    TrafficCapture.counters.values()]
+
+    def start(self):
+        """
+        Start capturing in a background thread.
+        """
+        self._stop = False
+        self._thread = threading.Thread(target=self.run, name="TrafficCapture")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop capturing.
+        """
+        self._stop = True
+        if self._process is not None:
+            try:
+                self._process.terminate()
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self.pcap_writer is not None:
+            self.pcap_writer.close()
+
+    def run(self):
+        """
+        Read the packets until stop() is called.
+        """
+        try:
+            self.open_socket()
+            logging.info(
+                "Capture Matter traffic on {} with AF_PACKET".format(
+                    self.network_if_name))
+            self.read_socket()
+        except PermissionError:
+            logging.info(
+                "Capture Matter traffic on {} with tcpdump".format(
+                    self.network_if_name))
+            self.read_tcpdump()
+        except OSError as err:
+            logging.error("Fail to capture traffic: {}".format(err))
+        finally:
+            if self._socket is not None:
+                self._socket.close()
+
+    def open_socket(self):
+        """
+        Open the AF_PACKET socket and attach the BPF filter.
+        """
+        self._socket = socket.socket(
+            socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        program = b"".join(struct.pack("HBBI", *instruction)
+                           for instruction in CAPTURE_BPF_FILTER)
+        buffer = ctypes.create_string_buffer(program)
+        fprog = struct.pack("HL", len(CAPTURE_BPF_FILTER),
+                            ctypes.addressof(buffer))
+        self._socket.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+        self._socket.bind((self.network_if_name, ETH_P_ALL))
+        self._socket.settimeout(1)
+
+    def read_socket(self):
+        """
+        Read the packets from the AF_PACKET socket.
+        """
+        while not self._stop:
+            try:
+                frame = self._socket.recv(SNAPLEN)
+                self.handle_frame(time.time(), frame, len(frame))
+            except socket.timeout:
+                pass
+            self.report()
+
+    def read_tcpdump(self):
+        """
+        Read the packets from the pcap stream of a tcpdump process.
+        """
+        cmd = ["sudo", "tcpdump", "-i", self.network_if_name, "-n", "-U",
+               "-s", str(SNAPLEN), "-w", "-",
+               "udp port {} or udp port {}".format(MATTER_UDP_PORT, MDNS_UDP_PORT)]
+        self._process = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        stream = self._process.stdout
+        header = stream.read(PCAP_GLOBAL_HEADER.size)
+        if len(header) < PCAP_GLOBAL_HEADER.size:
+            logging.error("tcpdump exited without output")
+            return
+        magic = PCAP_GLOBAL_HEADER.unpack(header)[0]
+        divisor = 1000000000 if magic == PCAP_MAGIC_NSEC else 1000000
+        while not self._stop:
+            record = stream.read(PCAP_RECORD_HEADER.size)
+            if len(record) < PCAP_RECORD_HEADER.size:
+                break
+            seconds, fraction, incl_len, orig_len = PCAP_RECORD_HEADER.unpack(
+                record)
+            frame = stream.read(incl_len)
+            self.handle_frame(seconds + fraction / divisor, frame, orig_len)
+            self.report()
+
+    def handle_frame(self, timestamp, frame, orig_len):
+        """
+        Count a captured ethernet frame.
+
+        Arguments:
+            timestamp {float} -- the capture time
+            frame {bytes} -- the captured frame
+            orig_len {int} -- the length of the frame on the wire
+        """
+        packet = TrafficCapture.parse_frame(frame)
+        if packet is None:
+            return
+        if self.pcap_writer is not None:
+            self.pcap_writer.write(timestamp, frame, orig_len)
+        src_ip, dst_ip, src_port, dst_port, payload = packet
+        is_mdns = MDNS_UDP_PORT in (src_port, dst_port)
+        message_key = None
+        if (not is_mdns) and (len(payload) >= 8):
+            # Matter message header: flags, session id, security flags, counter
+            message_key = (src_ip, struct.unpack_from("<HxI", payload, 1))
+        with TrafficCapture.lock:
+            for ip, is_tx in ((src_ip, True), (dst_ip, False)):
+                targetid = TrafficCapture.device_by_ip.get(ip)
+                if targetid is not None:
+                    TrafficCapture.counters[targetid].add_packet(
+                        timestamp, orig_len, is_tx, is_mdns,
+                        message_key if is_tx else None)
+
+    @staticmethod
+    def parse_frame(frame):
+        """
+        Return (src ip, dst ip, src port, dst port, payload) of an ethernet
+        frame carrying a Matter or mDNS udp packet, or None.
+
+        Arguments:
+            frame {bytes} -- the ethernet frame
+        """
+        if len(frame) < ETH_HEADER_LEN + 20:
+            return None
+        ether_type = struct.unpack_from("!H", frame, 12)[0]
+        if ether_type == ETH_P_IP:
+            header_len = (frame[ETH_HEADER_LEN] & 0x0f) * 4
+            if frame[ETH_HEADER_LEN + 9] != IPPROTO_UDP:
+                return None
+            src_ip = socket.inet_ntop(
+                socket.AF_INET, frame[ETH_HEADER_LEN + 12:ETH_HEADER_LEN + 16])
+            dst_ip = socket.inet_ntop(
+                socket.AF_INET, frame[ETH_HEADER_LEN + 16:ETH_HEADER_LEN + 20])
+            udp_offset = ETH_HEADER_LEN + header_len
+        elif ether_type == ETH_P_IPV6:
+            if len(frame) < ETH_HEADER_LEN + 48 or \
+                    frame[ETH_HEADER_LEN + 6] != IPPROTO_UDP:
+                return None
+            src_ip = socket.inet_ntop(
+                socket.AF_INET6, frame[ETH_HEADER_LEN + 8:ETH_HEADER_LEN + 24])
+            dst_ip = socket.inet_ntop(
+                socket.AF_INET6, frame[ETH_HEADER_LEN + 24:ETH_HEADER_LEN + 40])
+            udp_offset = ETH_HEADER_LEN + 40
+        else:
+            return None
+        if len(frame) < udp_offset + 8:
+            return None
+        src_port, dst_port = struct.unpack_from("!HH", frame, udp_offset)
+        if not ({src_port, dst_port} & {MATTER_UDP_PORT, MDNS_UDP_PORT}):
+            return None
+        return src_ip, dst_ip, src_port, dst_port, frame[udp_offset + 8:]
+
+    def report(self):
+        """
+        Log the busiest and the silent devices every CAPTURE_REPORT_INTERVAL.
+        """
+        now = time.time()
+        if now - self._last_report < CAPTURE_REPORT_INTERVAL:
+            return
+        self._last_report = now
+        list_counters = TrafficCapture.get_device_counters()
+        if len(list_counters) == 0:
+            return
+        list_counters.sort(key=lambda item: item["packets_per_second"],
+                           reverse=True)
+        busiest = list_counters[0]
+        logging.info(
+            "Traffic: busiest {} {:.1f} pkt/s {:.0f} B/s {} retransmits".format(
+                busiest["targetId"], busiest["packets_per_second"],
+                busiest["bytes_per_second"], busiest["retransmits"]))
+        silent = [item["targetId"] for item in list_counters
+                  if now - item["last_seen"] > CAPTURE_REPORT_INTERVAL]
+        if len(silent) > 0:
+            logging.warning("Traffic: no packets from {}".format(silent))